@@ -0,0 +1,143 @@
+import faiss
+import numpy as np
+
+# Named index types accepted by VectorDB(index_type=...). Any other value is passed to
+# FAISS as a raw index factory string (e.g. "IVF1024,PQ32x8").
+INDEX_PRESETS = {
+    "flat": "Flat",                      # exact brute-force search, the baseline
+    "hnsw": "HNSW{hnsw_m}",              # graph index, no training, tuned with ef_search
+    "ivf_flat": "IVF{nlist},Flat",       # inverted lists over full vectors, tuned with nprobe
+    "ivf_sq8": "IVF{nlist},SQ8",         # inverted lists over int8 scalar-quantized vectors (4x smaller)
+    "ivf_pq": "IVF{nlist},PQ{pq_m}",     # inverted lists over product-quantized codes (pq_m bytes per vector)
+    # Compact exhaustive indexes, for stores where float32 vectors dominate disk and RSS.
+    "sq_fp16": "SQfp16",                 # float16 vectors (2x smaller), no training, scores within ~1e-3
+    "sq8": "SQ8",                        # int8 scalar-quantized vectors (4x smaller)
+    "sq8_refine": "SQ8,Refine(SQfp16)",  # int8 search, the k * k_factor best rescored on float16 copies
+    "ivf_pq_refine": "IVF{nlist},PQ{pq_m},Refine(SQ8)",  # PQ candidates rescored on int8 vectors
+}
+
+
+def resolve_factory_string(index_type: str, nlist: int = 256, hnsw_m: int = 32, pq_m: int = 48) -> str:
+    """
+    Turn an index type into a FAISS index factory string.
+
+    Args:
+        index_type (str): A key of INDEX_PRESETS or a raw FAISS factory string.
+        nlist (int): Number of inverted lists (IVF cells) for IVF indexes.
+        hnsw_m (int): Number of neighbours per node for HNSW indexes.
+        pq_m (int): Number of sub-quantizers (bytes per vector) for PQ indexes. It must
+                    divide the embedding dimension (384 for MiniLM: 48 gives 8 dims each).
+
+    Returns:
+        str: The factory string to pass to FAISSDocumentStore.
+    """
+    template = INDEX_PRESETS.get(index_type.lower(), index_type)
+    return template.format(nlist=nlist, hnsw_m=hnsw_m, pq_m=pq_m)
+
+
+def set_search_params(index, nprobe=None, ef_search=None, k_factor=None):
+    """
+    Set the query-time parameters of a FAISS index. Parameters that do not apply to the
+    index type (nprobe on HNSW, ef_search on IVF, k_factor without Refine) are ignored.
+
+    Args:
+        index (faiss.Index): The index to tune.
+        nprobe (int, optional): Number of IVF cells visited per query. Higher is more
+                                accurate and slower.
+        ef_search (int, optional): Size of the HNSW candidate list. Higher is more
+                                   accurate and slower.
+        k_factor (float, optional): With a Refine index, candidates rescored per result
+                                    wanted. Higher is more accurate and slower.
+    """
+    space = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search), ("k_factor_rf", k_factor)):
+        if value is None:
+            continue
+        try:
+            space.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # not a parameter of this index type
+
+
+def index_memory_bytes(index) -> int:
+    """
+    Size of a FAISS index once serialized, a good proxy for the memory it takes when loaded.
+    """
+    return len(faiss.serialize_index(index))
+
+
+def reconstruct_vectors(index, vector_ids: np.ndarray) -> np.ndarray:
+    """
+    Return the stored vectors of some ids (decoded, so approximate for SQ/PQ codes).
+
+    IVF indexes need a direct map from ids to their inverted lists. A hash table map is
+    (re)built when missing or stale: it stays valid across remove_ids, unlike the array map.
+    """
+    try:
+        return index.reconstruct_batch(vector_ids)
+    except RuntimeError:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is None:
+            raise
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index.reconstruct_batch(vector_ids)
+
+
+def selector_search_params(index, selector, nprobe=None, ef_search=None):
+    """
+    Search parameters restricting a search to the ids accepted by selector, with the
+    nprobe / efSearch matching the index type.
+    """
+    refine = faiss.downcast_index(index)
+    if isinstance(refine, faiss.IndexRefine):
+        # The selector applies to the candidates of the base index; rescoring keeps their ids.
+        base_params = selector_search_params(refine.base_index, selector, nprobe, ef_search)
+        return faiss.IndexRefineSearchParameters(k_factor=refine.k_factor, base_index_params=base_params)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe or ivf.nprobe)
+    hnsw = faiss.downcast_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search or hnsw.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def filtered_search(index, queries: np.ndarray, top_k: int, vector_ids: np.ndarray,
+                    brute_force_max: int = 4096, nprobe=None, ef_search=None):
+    """
+    Search only among vector_ids.
+
+    Small selections are searched exactly over their reconstructed vectors, which costs
+    less the more selective the filter is and, unlike IVF or HNSW with a selector, never
+    misses hits because the few allowed vectors are outside the visited cells or graph
+    neighbourhoods. Larger selections are searched in the index with an IDSelectorBatch.
+
+    Args:
+        index (faiss.Index): The index to search.
+        queries (np.ndarray): float32 query vectors, shape (num_queries, d).
+        top_k (int): Number of results per query.
+        vector_ids (np.ndarray): The ids allowed in the results.
+        brute_force_max (int): Largest selection searched exactly.
+        nprobe (int, optional): IVF cells visited when searching with a selector.
+        ef_search (int, optional): HNSW candidate list size when searching with a selector.
+
+    Returns:
+        tuple: (scores, ids) arrays of shape (num_queries, top_k), padded with id -1, as
+               returned by index.search.
+    """
+    num_queries = len(queries)
+    scores = np.full((num_queries, top_k), -np.inf if index.metric_type == faiss.METRIC_INNER_PRODUCT else np.inf,
+                     dtype=np.float32)
+    ids = np.full((num_queries, top_k), -1, dtype=np.int64)
+    if len(vector_ids) == 0:
+        return scores, ids
+    if len(vector_ids) <= brute_force_max:
+        vectors = reconstruct_vectors(index, vector_ids)
+        k = min(top_k, len(vector_ids))
+        found_scores, positions = faiss.knn(queries, vectors, k, metric=index.metric_type)
+        scores[:, :k] = found_scores
+        ids[:, :k] = np.where(positions >= 0, vector_ids[positions], -1)
+        return scores, ids
+    params = selector_search_params(index, faiss.IDSelectorBatch(vector_ids), nprobe, ef_search)
+    return index.search(queries, top_k, params=params)
@@ -0,0 +1,138 @@
+import json
+
+READ_CHUNK_SIZE = 1 << 16  # characters read from disk at a time
+
+
+def iter_json_array(json_file_path: str):
+    """
+    Stream the elements of a JSON file containing a single top-level array (such as an
+    articles.json written by scripts/article_splitter.py --output articles.json) without
+    loading the whole file in memory.
+
+    Args:
+        json_file_path (str): Path to the JSON file.
+
+    Yields:
+        The elements of the array, in file order.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_file_path, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+        started = False
+
+        while True:
+            # Skip whitespace and separators, reading more data when the buffer runs out.
+            while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ",")):
+                pos += 1
+            if pos >= len(buffer):
+                buffer = "" if eof else f.read(READ_CHUNK_SIZE)
+                pos = 0
+                if not buffer:
+                    raise ValueError(f"Unexpected end of JSON array in {json_file_path}")
+                continue
+
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"{json_file_path} does not contain a JSON array")
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                return
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                element, end = None, None
+            # Only trust a decoded element once the separator after it has been read: a
+            # number cut by a read would otherwise decode "successfully" ("2." of "2.5").
+            after = end
+            while after is not None and after < len(buffer) and buffer[after].isspace():
+                after += 1
+            if end is None or after >= len(buffer) or buffer[after] not in ",]":
+                if eof:
+                    raise ValueError(f"Malformed JSON array in {json_file_path}")
+                more = f.read(READ_CHUNK_SIZE)
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+
+            yield element
+            pos = end
+            if pos > READ_CHUNK_SIZE:
+                # Drop the consumed part of the buffer so it does not grow with the file.
+                buffer = buffer[pos:]
+                pos = 0
+
+
+def iter_jsonl(jsonl_file_path: str):
+    """
+    Stream the records of a JSON Lines file (one JSON object per line, as written by
+    write_articles), skipping blank lines.
+
+    Args:
+        jsonl_file_path (str): Path to the JSONL file.
+
+    Yields:
+        The records, in file order.
+    """
+    with open(jsonl_file_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Malformed JSON on line {line_number} of {jsonl_file_path}: {e}")
+
+
+def is_jsonl(file_path: str) -> bool:
+    return file_path.lower().endswith((".jsonl", ".ndjson"))
+
+
+def iter_articles_file(file_path: str):
+    """
+    Stream the articles of a file: JSON Lines for .jsonl / .ndjson files, a JSON array
+    otherwise. Either way the file is never held in memory as a whole.
+    """
+    return iter_jsonl(file_path) if is_jsonl(file_path) else iter_json_array(file_path)
+
+
+def write_articles(file_path: str, articles, append: bool = False) -> int:
+    """
+    Write a stream of articles to a file as they come, one JSON object per line for
+    .jsonl / .ndjson files, or as a JSON array otherwise.
+
+    Each JSONL line is a complete record, so a run that stops midway leaves a readable
+    file and appending resumes it; a JSON array is only valid once closed and cannot be
+    appended to.
+
+    Args:
+        file_path (str): The file to write.
+        articles (iterable): Dictionaries with "article_number" and "text".
+        append (bool): Add to the end of an existing JSONL file instead of replacing it.
+
+    Returns:
+        int: The number of articles written.
+    """
+    jsonl = is_jsonl(file_path)
+    if append and not jsonl:
+        raise ValueError(f"Only JSON Lines files can be appended to, not {file_path}")
+    count = 0
+    with open(file_path, "a" if append else "w", encoding="utf-8") as f:
+        if not jsonl:
+            f.write("[")
+        for article in articles:
+            record = json.dumps(article, ensure_ascii=False)
+            if jsonl:
+                f.write(record + "\n")
+            else:
+                f.write(("," if count else "") + "\n  " + record)
+            count += 1
+        if not jsonl:
+            f.write("\n]\n")
+    return count
@@ -1,7 +1,104 @@
 # article_splitter.py
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
 import pytesseract
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
+from modules.metrics import default_metrics
+from modules.parallel import completed_future, default_workers, iter_results_in_order
+from modules.pdf_text import extract_page_text, has_usable_text
+
+# Use a PSM mode that may work better for multi-column text.
+# Try '--psm 1' (Automatic page segmentation with OSD) or experiment with '--psm 4' (Assume a single column).
+OCR_CONFIG = r'--oem 3 --psm 1'
+OCR_DPI = 200  # Rendering resolution of the page images fed to Tesseract.
+
+
+def ocr_page_range(pdf_path: str, first_page: int, last_page: int, config: str = OCR_CONFIG) -> list:
+    """
+    Rasterize and OCR a contiguous range of PDF pages.
+
+    This runs inside the worker processes of ArticleSplitter.iter_pages: only the page
+    numbers are sent to the worker and only the extracted text comes back, so the page
+    images never leave the process that rendered them.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        first_page (int): First page to process (1-based, inclusive).
+        last_page (int): Last page to process (1-based, inclusive).
+        config (str): Tesseract configuration string.
+
+    Returns:
+        list: The text of each page in the range, in page order.
+    """
+    images = convert_from_path(pdf_path, dpi=OCR_DPI, first_page=first_page, last_page=last_page)
+    return [pytesseract.image_to_string(image, config=config) for image in images]
+
+
+def compile_alternation(patterns):
+    """
+    Compile a list of regex patterns into a single alternation, so that a line is tested
+    against all of them in one match call.
+
+    A global inline flag at the start of a pattern (e.g. "(?i)^capo ...") is turned into a
+    scoped group, since global flags are only allowed at the start of the whole expression.
+
+    Args:
+        patterns (list): Regex patterns meant to be used with re.match.
+
+    Returns:
+        re.Pattern: A pattern that matches wherever any of the input patterns matches.
+    """
+    groups = []
+    for pattern in patterns:
+        flags = re.match(r"^\(\?([aiLmsux]+)\)", pattern)
+        if flags:
+            groups.append(f"(?{flags.group(1)}:{pattern[flags.end():]})")
+        else:
+            groups.append(f"(?:{pattern})")
+    return re.compile("|".join(groups))
+
+
+# PDF readers opened by this process, keyed by path and modification time, so that a worker
+# parses the cross-reference table of a PDF once and not once per task.
+_readers = {}
+
+
+def _get_reader(pdf_path: str):
+    key = (pdf_path, os.path.getmtime(pdf_path))
+    if key not in _readers:
+        _readers.clear()
+        _readers[key] = PyPDF2.PdfReader(pdf_path)
+    return _readers[key]
+
+
+def extract_page_range(pdf_path: str, first_page: int, last_page: int, use_text_layer: bool = True) -> list:
+    """
+    Extract the text of a contiguous range of PDF pages, reading the embedded text layer
+    where it is usable and falling back to OCR for scanned pages.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        first_page (int): First page to process (1-based, inclusive).
+        last_page (int): Last page to process (1-based, inclusive).
+        use_text_layer (bool): If False, every page is OCRed.
+
+    Returns:
+        list: The text of each page in the range, in page order.
+    """
+    if not use_text_layer:
+        return ocr_page_range(pdf_path, first_page, last_page)
+
+    reader = _get_reader(pdf_path)
+    texts = []
+    for page_number in range(first_page, last_page + 1):
+        text = extract_page_text(reader.pages[page_number - 1])
+        if not has_usable_text(text):
+            text = ocr_page_range(pdf_path, page_number, page_number)[0]
+        texts.append(text)
+    return texts
+
 
 class ArticleSplitter:
     """
@@ -9,14 +106,30 @@ class ArticleSplitter:
     Each article is returned as a dictionary with 'article_number' and 'text' keys.
     """
 
-    def __init__(self, skip_patterns=None):
+    def __init__(self, skip_patterns=None, max_workers=None, pages_per_task=2, ocr_cache=None,
+                 use_text_layer=True, metrics=None):
         """
         Initialize the ArticleSplitter with optional skip patterns.
 
         Args:
             skip_patterns (list): A list of regex patterns. Lines matching any of these
                                   will be ignored (e.g., headers, footers).
+            max_workers (int, optional): Number of OCR worker processes. Defaults to the
+                                         number of CPU cores; 1 disables the process pool.
+            pages_per_task (int): Number of pages each worker rasterizes and OCRs per task.
+            ocr_cache (OCRCache, optional): Cache of already OCRed pages. Cached pages are not
+                                            OCRed again and new pages are stored as they complete.
+            use_text_layer (bool): Read the embedded text layer of born-digital pages instead
+                                   of OCRing them. Scanned pages are always OCRed.
+            metrics (Metrics, optional): Where stage timings are recorded; defaults to
+                                         modules.metrics.default_metrics.
         """
+        self.max_workers = max_workers or default_workers()
+        self.pages_per_task = pages_per_task
+        self.ocr_cache = ocr_cache
+        self.use_text_layer = use_text_layer
+        self.metrics = metrics or default_metrics
+
         # Default skip patterns include:
         # - Empty lines
         # - Repeated header/footer text (e.g., publisher info)
@@ -38,17 +151,105 @@ class ArticleSplitter:
             r"(?i)^\s*titolo\s+(\d+|[IVXLC]+)\b.*",  # Skip lines starting with "titolo" followed by a number or Roman numeral
          ]
 
+        # All skip patterns compiled into one alternation, so each line costs a single match call.
+        self.skip_regex = compile_alternation(self.skip_patterns)
+
         # Regex to match article headings.
         # This pattern handles variations like "Art. 7", "Art 7.", or uppercase "ART. 7."
         self.article_pattern = re.compile(r"^\s*Art\.?\s*(\d+)\s*\.?")
 
 
+    def _plan_page_tasks(self, pdf_path: str) -> list:
+        """
+        Group the pages of a PDF into the units of work consumed by iter_pages.
+
+        Each task is a (first_page, last_page, page_keys, cached_texts) tuple. Runs of
+        uncached pages are grouped into ranges of up to pages_per_task pages; a cached page
+        becomes its own task carrying its text, so the page order is preserved.
+        """
+        if self.ocr_cache is None:
+            total_pages = pdfinfo_from_path(pdf_path)["Pages"]
+            return [
+                (first, min(first + self.pages_per_task - 1, total_pages), None, None)
+                for first in range(1, total_pages + 1, self.pages_per_task)
+            ]
+
+        settings = f"{OCR_CONFIG}|dpi={OCR_DPI}|text_layer={self.use_text_layer}"
+        keys = self.ocr_cache.page_keys(pdf_path, settings)
+        cached = self.ocr_cache.get_many(keys)
+        tasks = []
+        run = []  # page numbers of the current run of uncached pages
+        for page_number, key in enumerate(keys, start=1):
+            if key in cached:
+                if run:
+                    tasks.append((run[0], run[-1], keys[run[0] - 1:run[-1]], None))
+                    run = []
+                tasks.append((page_number, page_number, [key], [cached[key]]))
+                continue
+            run.append(page_number)
+            if len(run) == self.pages_per_task:
+                tasks.append((run[0], run[-1], keys[run[0] - 1:run[-1]], None))
+                run = []
+        if run:
+            tasks.append((run[0], run[-1], keys[run[0] - 1:run[-1]], None))
+        return tasks
+
+    def iter_pages(self, pdf_path: str):
+        """
+        Extract the text of the provided PDF file page by page.
+
+        Pages with a usable embedded text layer are read directly (in column order for
+        two-column layouts); the others are rasterized and OCRed. Pages are processed in
+        small batches on a process pool sized to the number of cores. At most two batches
+        per worker are in flight at any time, so memory stays bounded regardless of the
+        length of the PDF, and the page texts are yielded in page order as soon as they
+        are ready.
+
+        When an OCR cache is configured, pages already in the cache are not OCRed again
+        and every completed batch is written to the cache immediately, so an interrupted
+        run resumes where it stopped.
+
+        Args:
+            pdf_path (str): Path to the PDF file.
+
+        Yields:
+            str: The text of each page, in page order.
+        """
+        tasks = self._plan_page_tasks(pdf_path)
+        executor = ProcessPoolExecutor(max_workers=self.max_workers) if self.max_workers > 1 else None
+
+        def submit(task):
+            first, last, _, cached_texts = task
+            if cached_texts is not None:
+                return completed_future(cached_texts)
+            if executor is None:
+                # No pool: extract the batch in this process when the consumer asks for it.
+                return completed_future(extract_page_range(pdf_path, first, last, self.use_text_layer))
+            return executor.submit(extract_page_range, pdf_path, first, last, self.use_text_layer)
+
+        max_pending = 2 * self.max_workers if executor is not None else 1
+        try:
+            with self.metrics.stage("extract_text_from_pdf") as stage:
+                results = iter_results_in_order((submit(task) for task in tasks), max_pending=max_pending)
+                for (_, _, keys, cached_texts), texts in zip(tasks, results):
+                    if self.ocr_cache is not None and cached_texts is None:
+                        self.ocr_cache.put_many(zip(keys, texts))
+                    if cached_texts is not None:
+                        self.metrics.count("ocr_cache_hits", len(texts))
+                    stage.items += len(texts)
+                    yield from texts
+        finally:
+            if executor is not None:
+                # Do not keep OCRing pages nobody will read if the consumer stops early.
+                executor.shutdown(wait=True, cancel_futures=True)
+
     def extract_text_from_pdf(self, pdf_path: str) -> str: #using ocr 
         """
         Extract text from the provided PDF file using OCR to better handle multi-column layouts.
         
         This function converts each PDF page to an image, then uses Tesseract OCR with a page segmentation
-        mode that works better for multi-column layouts.
+        mode that works better for multi-column layouts. Pages that already carry a usable text layer are
+        read directly instead. See iter_pages to consume the pages as a stream.
         
         Args:
             pdf_path (str): Path to the PDF file.
@@ -56,23 +257,7 @@ class ArticleSplitter:
         Returns:
             str: The extracted text from the PDF.
         """
-        # Convert PDF to a list of PIL images.
-        pages = convert_from_path(pdf_path)
-        full_text = ""
-        
-        # Use a PSM mode that may work better for multi-column text.
-        # Try '--psm 1' (Automatic page segmentation with OSD) or experiment with '--psm 4' (Assume a single column).
-        custom_config = r'--oem 3 --psm 1'
-        
-        for page in pages:
-            # Extract text from the image using Tesseract.
-            text = pytesseract.image_to_string(page, config=custom_config)
-            full_text += text + "\n\n"
-        
-        return full_text
-
-
-        
+        return "".join(text + "\n\n" for text in self.iter_pages(pdf_path))
 
     def skip_line(self, line: str) -> bool:
         """
@@ -84,67 +269,85 @@ class ArticleSplitter:
         Returns:
             bool: True if the line should be skipped, False otherwise.
         """
-        for pattern in self.skip_patterns:
-            if re.match(pattern, line.strip()):
-                return True
-        return False
+        return self.skip_regex.match(line.strip()) is not None
 
-    def split_articles(self, text: str): 
+    def iter_articles(self, chunks, preamble=None):
         """
-        Split the raw text into a list of article dictionaries.
-        
+        Split a stream of text into article dictionaries, yielding each article as soon as
+        the heading of the next one is found.
+
+        The input can be an iterator of lines or of whole pages (for example iter_pages), so
+        splitting can run while the rest of the PDF is still being extracted. Each chunk is
+        assumed to end on a line boundary.
+
         Args:
-            text (str): The entire PDF text extracted as a single string.
-        
-        Returns:
-            list: A list of dictionaries, each with "article_number" and "text".
+            chunks (iterable): Strings containing one or more lines of text.
+            preamble (list, optional): Collects the lines found before the first article
+                                       heading, which are otherwise dropped. When the text
+                                       is one shard of a PDF, they are the end of the last
+                                       article of the previous shard (see modules.pdf_split).
+
+        Yields:
+            dict: A dictionary with "article_number" and "text" for each article.
         """
-        articles = []  # List to store all parsed articles
+        skip_match = self.skip_regex.match
+        article_match = self.article_pattern.match
         current_article_number = None  # Variable to keep track of the current article number
         current_text_lines = []  # List to accumulate text lines for the current article
 
-        # Iterate over each line from the extracted text
-        for line in text.splitlines():
-            # Remove any leading or trailing whitespace from the line
-            line = line.strip()
+        for chunk in chunks:
+            for line in chunk.splitlines():
+                # Remove any leading or trailing whitespace from the line (only once)
+                line = line.strip()
 
-            # Skip lines that match unwanted patterns (headers, footers, page numbers, "Libro" headers, etc.)
-            if self.skip_line(line):
-                continue
+                # Skip lines that match unwanted patterns (headers, footers, page numbers, "Libro" headers, etc.)
+                if skip_match(line):
+                    continue
+
+                # Check if the current line matches the article heading pattern (e.g., "Art. 7")
+                match = article_match(line)
+                if match:
+                    # If we have been collecting an article, emit it before starting a new one
+                    if current_article_number is not None:
+                        yield {
+                            "article_number": current_article_number,
+                            "text": " ".join(current_text_lines).strip()  # Join all lines into one text block
+                        }
+                        current_text_lines = []  # Reset the accumulator for the next article
 
-            # Check if the current line matches the article heading pattern (e.g., "Art. 7")
-            match = self.article_pattern.match(line)
-            if match:
-                # If we have been collecting an article, save it before starting a new one
-                if current_article_number is not None:
-                    articles.append({
-                        "article_number": current_article_number,
-                        "text": " ".join(current_text_lines).strip()  # Join all lines into one text block
-                    })
-                    current_text_lines = []  # Reset the accumulator for the next article
-
-                # Update the current article number using the captured group from the regex match
-                current_article_number = match.group(1)
-
-                # Remove the matched article header from the line
-                # If there's remaining text on the same line, add it to the current article's text
-                remaining_text = line[match.end():].strip()
-                if remaining_text:
-                    current_text_lines.append(remaining_text)
-            else:
-                # If the line does not start a new article heading, and we are in the middle of an article,
-                # accumulate the line into the current article's text.
-                if current_article_number is not None:
+                    # Update the current article number using the captured group from the regex match
+                    current_article_number = match.group(1)
+
+                    # If there's remaining text on the same line as the heading, add it to the article's text
+                    remaining_text = line[match.end():].strip()
+                    if remaining_text:
+                        current_text_lines.append(remaining_text)
+                elif current_article_number is not None:
+                    # Accumulate the line into the current article's text; text before the first
+                    # article heading (preamble) is ignored unless the caller collects it.
                     current_text_lines.append(line)
-                # Optionally, if no article has started yet, you could handle preamble text here.
+                elif preamble is not None:
+                    preamble.append(line)
 
-        # After processing all lines, if an article was being built, add it to the articles list
+        # After processing all lines, if an article was being built, emit it
         if current_article_number is not None:
-            articles.append({
+            yield {
                 "article_number": current_article_number,
                 "text": " ".join(current_text_lines).strip()
-            })
+            }
 
-        # Return the list of article dictionaries
+    def split_articles(self, text: str): 
+        """
+        Split the raw text into a list of article dictionaries.
+        
+        Args:
+            text (str): The entire PDF text extracted as a single string.
+        
+        Returns:
+            list: A list of dictionaries, each with "article_number" and "text".
+        """
+        with self.metrics.stage("split_articles") as stage:
+            articles = list(self.iter_articles([text]))
+            stage.items = len(articles)
         return articles
     
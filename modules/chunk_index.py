@@ -0,0 +1,110 @@
+import hashlib
+import sqlite3
+import numpy as np
+from modules.sqlite_utils import execute_in_batches
+
+
+def content_hash(text: str) -> str:
+    """
+    Hash of a chunk text, used to tell whether a chunk changed between two ingests.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ChunkIndex:
+    """
+    ChunkIndex keeps, next to the articles table, what was indexed by the last ingest:
+
+    - a manifest with the content hash of every chunk, per law_name, article_number and
+      chunk_number, used to find the chunks that were added, removed or changed;
+    - the embedding of every chunk text ever indexed, keyed by model and content hash, so
+      unchanged chunks never go through the embedding model again.
+    """
+    def __init__(self, sql_path: str):
+        """
+        Args:
+            sql_path (str): Path to the SQLite database file (the one holding the articles).
+        """
+        self.sql_path = sql_path
+        with sqlite3.connect(self.sql_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_manifest (
+                    law_name TEXT,
+                    article_number TEXT,
+                    chunk_number INTEGER,
+                    content_hash TEXT,
+                    PRIMARY KEY (law_name, article_number, chunk_number)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_embeddings (
+                    model TEXT,
+                    content_hash TEXT,
+                    embedding BLOB,
+                    PRIMARY KEY (model, content_hash)
+                )
+            """)
+            conn.commit()
+
+    def load_manifest(self, law_name: str) -> dict:
+        """
+        Returns:
+            dict: (article_number, chunk_number) -> content hash of the last indexed chunks.
+        """
+        with sqlite3.connect(self.sql_path) as conn:
+            rows = conn.execute(
+                "SELECT article_number, chunk_number, content_hash FROM chunk_manifest WHERE law_name = ?",
+                (law_name,)
+            )
+            return {(article_number, chunk_number): digest for article_number, chunk_number, digest in rows}
+
+    def replace_manifest(self, law_name: str, manifest: dict):
+        """
+        Replace the manifest of a law with the chunks that are now in the index.
+
+        Args:
+            law_name (str): The law the chunks belong to.
+            manifest (dict): (article_number, chunk_number) -> content hash.
+        """
+        with sqlite3.connect(self.sql_path) as conn:
+            conn.execute("DELETE FROM chunk_manifest WHERE law_name = ?", (law_name,))
+            conn.executemany(
+                "INSERT INTO chunk_manifest (law_name, article_number, chunk_number, content_hash) VALUES (?, ?, ?, ?)",
+                ((law_name, article_number, chunk_number, digest)
+                 for (article_number, chunk_number), digest in manifest.items())
+            )
+            conn.commit()
+
+    def get_embeddings(self, model: str, hashes) -> dict:
+        """
+        Look up stored embeddings.
+
+        Returns:
+            dict: content hash -> float32 vector, for the hashes that are stored.
+        """
+        hashes = list(set(hashes))
+        found = {}
+        with sqlite3.connect(self.sql_path) as conn:
+            rows = execute_in_batches(
+                conn,
+                "SELECT content_hash, embedding FROM chunk_embeddings WHERE model = ? AND content_hash IN ({placeholders})",
+                hashes, (model,)
+            )
+            for digest, blob in rows:
+                found[digest] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_embeddings(self, model: str, embeddings: dict):
+        """
+        Store embeddings.
+
+        Args:
+            model (str): Name of the model that computed them.
+            embeddings (dict): content hash -> vector.
+        """
+        with sqlite3.connect(self.sql_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_embeddings (model, content_hash, embedding) VALUES (?, ?, ?)",
+                ((model, digest, np.asarray(vector, dtype=np.float32).tobytes()) for digest, vector in embeddings.items())
+            )
+            conn.commit()
@@ -0,0 +1,291 @@
+import logging
+import os
+import numpy as np
+from transformers import AutoTokenizer
+
+# The ONNX backend needs the optional "onnx" extra of the project.
+ONNX_MISSING = "The ONNX encoder needs onnxruntime and onnx: install them with poetry install --extras onnx"
+
+# Same defaults as haystack's DensePassageRetriever, so embeddings stay comparable.
+MAX_SEQ_LEN_QUERY = 64
+MAX_SEQ_LEN_PASSAGE = 256
+
+
+def normalize_question(question: str) -> str:
+    """
+    Drop one trailing "?" from a query, as haystack's TextSimilarityProcessor does before
+    DensePassageRetriever embeds it.
+    """
+    return question[:-1] if question.endswith("?") else question
+
+
+def pool(hidden_states: np.ndarray, attention_mask: np.ndarray, pooling: str) -> np.ndarray:
+    """
+    Turn token embeddings into one embedding per text.
+
+    Args:
+        hidden_states (np.ndarray): Last hidden states, shape (batch, tokens, dim).
+        attention_mask (np.ndarray): 1 for real tokens, 0 for padding, shape (batch, tokens).
+        pooling (str): "cls" takes the first token, which is what DensePassageRetriever
+                       returns (the DPR pooler output); "mean" averages the real tokens, as
+                       sentence-transformers does.
+
+    Returns:
+        np.ndarray: Embeddings of shape (batch, dim).
+    """
+    if pooling == "cls":
+        return hidden_states[:, 0]
+    if pooling == "mean":
+        mask = attention_mask[..., None].astype(hidden_states.dtype)
+        return (hidden_states * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    raise ValueError(f"Unknown pooling '{pooling}', use 'cls' or 'mean'")
+
+
+def length_buckets(lengths, batch_size: int, max_batch_tokens: int) -> list:
+    """
+    Group texts of similar length into batches, so that little compute is spent on padding.
+
+    Texts are sorted by token length and cut into batches of at most batch_size texts
+    whose padded size (texts x longest text) stays below max_batch_tokens.
+
+    Args:
+        lengths (list): Token length of each text.
+        batch_size (int): Maximum number of texts per batch.
+        max_batch_tokens (int): Maximum padded tokens per batch.
+
+    Returns:
+        list: Batches of indexes into lengths.
+    """
+    batches = []
+    batch = []
+    for index in np.argsort(lengths, kind="stable"):
+        longest = max(lengths[index], 1)  # sorted, so the newest text is the longest
+        if batch and (len(batch) >= batch_size or (len(batch) + 1) * longest > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(int(index))
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class BucketedEncoder:
+    """
+    BucketedEncoder holds what the encoders below share: tokenization, length-bucketed
+    dynamic batching, pooling, and the embed_queries / embed_documents methods of
+    haystack's DensePassageRetriever, so that an encoder can replace the retriever for
+    query encoding and for FAISSDocumentStore.update_embeddings.
+
+    Subclasses implement _forward, which runs the model on one padded batch.
+    """
+    def __init__(self,
+                 model_name: str,
+                 pooling: str = "cls",
+                 batch_size: int = 64,
+                 max_batch_tokens: int = 8192,
+                 max_seq_len_query: int = MAX_SEQ_LEN_QUERY,
+                 max_seq_len_passage: int = MAX_SEQ_LEN_PASSAGE):
+        self.model_name = model_name
+        self.pooling = pooling
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_seq_len_query = max_seq_len_query
+        self.max_seq_len_passage = max_seq_len_passage
+        # The tokenizer options of DensePassageRetriever.
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, do_lower_case=True)
+
+    def _forward(self, feed: dict) -> np.ndarray:
+        """
+        Run the model on input_ids, attention_mask and token_type_ids (int64 arrays of
+        shape (batch, tokens)) and return the last hidden states.
+        """
+        raise NotImplementedError
+
+    def encode(self, texts, max_length: int, titles=None) -> np.ndarray:
+        """
+        Embed texts with length-bucketed dynamic batching.
+
+        Args:
+            texts (list): The texts to embed.
+            max_length (int): Truncation length in tokens.
+            titles (list, optional): Tokenize each text as the pair (title, text), as
+                                     DensePassageRetriever does for passages (embed_title).
+
+        Returns:
+            np.ndarray: float32 embeddings, shape (len(texts), dim), in input order.
+        """
+        if titles is None:
+            encoded = self.tokenizer(list(texts), truncation=True, max_length=max_length)
+        else:
+            encoded = self.tokenizer(list(titles), list(texts), truncation=True, max_length=max_length)
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        embeddings = None
+        for batch in length_buckets(lengths, self.batch_size, self.max_batch_tokens):
+            # Pad only up to the longest text of this batch.
+            input_ids = np.full((len(batch), max(lengths[i] for i in batch)), self.tokenizer.pad_token_id, dtype=np.int64)
+            attention_mask = np.zeros_like(input_ids)
+            for row, i in enumerate(batch):
+                input_ids[row, :lengths[i]] = encoded["input_ids"][i]
+                attention_mask[row, :lengths[i]] = 1
+            feed = {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids),
+            }
+            hidden_states = self._forward(feed)
+            pooled = pool(hidden_states, feed["attention_mask"], self.pooling)
+            if embeddings is None:
+                embeddings = np.empty((len(lengths), pooled.shape[1]), dtype=np.float32)
+            embeddings[batch] = pooled
+        if embeddings is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return embeddings
+
+    def embed_queries(self, queries) -> np.ndarray:
+        """
+        Embed queries, like DensePassageRetriever.embed_queries: a trailing "?" is dropped.
+        """
+        return self.encode([normalize_question(query) for query in queries], self.max_seq_len_query)
+
+    def embed_documents(self, documents) -> np.ndarray:
+        """
+        Embed haystack Documents, like DensePassageRetriever.embed_documents: each passage
+        is paired with its meta["name"] as title, or "" without one.
+        """
+        titles = [(document.meta or {}).get("name") or "" for document in documents]
+        return self.encode([document.content for document in documents], self.max_seq_len_passage, titles)
+
+
+class OnnxEncoder(BucketedEncoder):
+    """
+    OnnxEncoder runs the embedding model with ONNX Runtime on CPU, optionally with weights
+    dynamically quantized to int8.
+
+    The model is exported to ONNX once and the exported files are reused afterwards.
+    """
+    def __init__(self,
+                 model_name: str,
+                 model_dir: str = os.getenv("ONNX_MODEL_DIR", "models/onnx"),
+                 quantize: bool = False,
+                 num_threads: int = int(os.getenv("ONNX_THREADS", 0)), # 0 lets ONNX Runtime decide
+                 pooling: str = "cls",
+                 batch_size: int = 64,
+                 max_batch_tokens: int = 8192,
+                 max_seq_len_query: int = MAX_SEQ_LEN_QUERY,
+                 max_seq_len_passage: int = MAX_SEQ_LEN_PASSAGE):
+        """
+        Load (exporting it first if needed) the ONNX model.
+
+        Args:
+            model_name (str): Hugging Face model name or local path.
+            model_dir (str): Folder the exported ONNX models are kept in.
+            quantize (bool): Use int8 dynamically quantized weights.
+            num_threads (int): Intra-op threads of ONNX Runtime.
+            pooling (str): "cls" to match DensePassageRetriever, "mean" for sentence-transformers.
+            batch_size (int): Maximum number of texts per forward pass.
+            max_batch_tokens (int): Maximum padded tokens per forward pass.
+            max_seq_len_query (int): Truncation length of queries.
+            max_seq_len_passage (int): Truncation length of passages.
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(ONNX_MISSING) from e
+
+        super().__init__(model_name, pooling, batch_size, max_batch_tokens, max_seq_len_query, max_seq_len_passage)
+        self.quantize = quantize
+
+        export_dir = os.path.join(model_dir, model_name.replace("/", "__"))
+        self.model_path = self._export(export_dir)
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _forward(self, feed: dict) -> np.ndarray:
+        feed = {name: value for name, value in feed.items() if name in self._input_names}
+        return self.session.run(None, feed)[0]
+
+    def _export(self, export_dir: str) -> str:
+        """
+        Export the model to ONNX (and quantize it) unless it was already done.
+
+        Returns:
+            str: Path to the ONNX model to load.
+        """
+        fp32_path = os.path.join(export_dir, "model.onnx")
+        if not os.path.exists(fp32_path):
+            import torch
+            from transformers import AutoModel
+
+            logging.info(f"Exporting {self.model_name} to {fp32_path}.")
+            os.makedirs(export_dir, exist_ok=True)
+            model = AutoModel.from_pretrained(self.model_name).eval()
+            sample = self.tokenizer(["esempio"], return_tensors="pt")
+            inputs = (sample["input_ids"], sample["attention_mask"], torch.zeros_like(sample["input_ids"]))
+            dynamic_axes = {name: {0: "batch", 1: "tokens"} for name in
+                            ("input_ids", "attention_mask", "token_type_ids", "last_hidden_state")}
+            export_args = dict(
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+            with torch.no_grad():
+                try:
+                    torch.onnx.export(model, inputs, fp32_path, dynamo=False, **export_args)
+                except TypeError:  # torch versions without the dynamo exporter switch
+                    torch.onnx.export(model, inputs, fp32_path, **export_args)
+
+        if not self.quantize:
+            return fp32_path
+
+        int8_path = os.path.join(export_dir, "model.int8.onnx")
+        if not os.path.exists(int8_path):
+            try:
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+            except ImportError as e:  # the quantizer also needs the onnx package
+                raise ImportError(ONNX_MISSING) from e
+
+            logging.info(f"Quantizing {fp32_path} to int8.")
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        return int8_path
+
+
+class TorchEncoder(BucketedEncoder):
+    """
+    TorchEncoder runs the embedding model with PyTorch. Unlike DensePassageRetriever, which
+    always loads a query and a passage model, it loads the model once, which is all a
+    process that only encodes queries needs. With CLS pooling its embeddings are the ones
+    of DensePassageRetriever.
+    """
+    def __init__(self,
+                 model_name: str,
+                 num_threads: int = 0, # 0 keeps PyTorch's default
+                 pooling: str = "cls",
+                 batch_size: int = 64,
+                 max_batch_tokens: int = 8192,
+                 max_seq_len_query: int = MAX_SEQ_LEN_QUERY,
+                 max_seq_len_passage: int = MAX_SEQ_LEN_PASSAGE):
+        """
+        Args:
+            model_name (str): Hugging Face model name or local path.
+            num_threads (int): Intra-op threads of PyTorch.
+            See OnnxEncoder for the other arguments.
+        """
+        import torch
+        from transformers import AutoModel
+
+        super().__init__(model_name, pooling, batch_size, max_batch_tokens, max_seq_len_query, max_seq_len_passage)
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self._torch = torch
+        self.model = AutoModel.from_pretrained(model_name).eval()
+
+    def _forward(self, feed: dict) -> np.ndarray:
+        with self._torch.inference_mode():
+            outputs = self.model(**{name: self._torch.from_numpy(value) for name, value in feed.items()})
+        return outputs.last_hidden_state.numpy()
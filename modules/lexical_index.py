@@ -0,0 +1,184 @@
+import re
+import sqlite3
+import threading
+from modules.sqlite_utils import execute_in_batches
+
+# "art. 2043", "Art 2043", "articolo 2043", "artt. 2043 e 2059", "articoli 1341, 1342".
+ARTICLE_REFERENCE = re.compile(
+    r"\bart(?:t|icol[oi])?\b\.?\s*(\d+(?:\s*(?:,|e|ed|and)\s*\d+)*)",
+    re.IGNORECASE
+)
+# Words that may surround an article reference without asking for anything else.
+REFERENCE_FILLER = {"c", "cc", "cod", "civ", "codice", "civile", "del", "dell", "della", "il", "l", "di", "and"}
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def find_article_references(query: str) -> list:
+    """
+    Return the article numbers the query refers to explicitly, in order of appearance.
+    """
+    numbers = []
+    for match in ARTICLE_REFERENCE.finditer(query):
+        numbers.extend(int(number) for number in re.findall(r"\d+", match.group(1)))
+    return list(dict.fromkeys(numbers))
+
+
+def is_reference_query(query: str) -> bool:
+    """
+    Whether the query asks only for specific articles ("art. 2043 c.c."), so it can be
+    answered by looking them up, without any search.
+    """
+    if not ARTICLE_REFERENCE.search(query):
+        return False
+    rest = ARTICLE_REFERENCE.sub(" ", query)
+    return all(word.lower() in REFERENCE_FILLER for word in WORD.findall(rest))
+
+
+def fts_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word is quoted, so punctuation and FTS5
+    operators in user input are taken literally, and words are OR-ed so that BM25 ranks
+    articles by how many (and how rare) of the words they contain.
+    """
+    words = [word for word in WORD.findall(query.lower()) if len(word) > 1]
+    return " OR ".join(f'"{word}"' for word in dict.fromkeys(words))
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60) -> list:
+    """
+    Merge ranked lists with reciprocal rank fusion: an item scores the sum of
+    1 / (k + rank) over the lists it appears in, ranks starting at 1.
+
+    Args:
+        rankings (list): Lists of hashable items, best first.
+        k (int): Damping constant; 60 is the value of the original paper.
+
+    Returns:
+        list: (item, score) pairs, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    LexicalIndex is a BM25 full-text index over the articles table, kept in the same
+    SQLite database as an FTS5 external-content table.
+
+    Triggers keep it in sync with every insert, update and delete on articles, so it is
+    built while the articles are loaded and never needs a separate indexing pass.
+    """
+    def __init__(self, sql_path: str):
+        """
+        Create the full-text index and its triggers if they do not exist, indexing the
+        articles that are already stored.
+
+        Args:
+            sql_path (str): Path to the SQLite database file holding the articles table.
+        """
+        self.sql_path = sql_path
+        self._local = threading.local()
+        with sqlite3.connect(self.sql_path) as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articles_fts'"
+            ).fetchone()
+            conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                    text,
+                    content='articles',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+                    INSERT INTO articles_fts (rowid, text) VALUES (new.id, new.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+                    INSERT INTO articles_fts (articles_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS articles_fts_update AFTER UPDATE OF text ON articles BEGIN
+                    INSERT INTO articles_fts (articles_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                    INSERT INTO articles_fts (rowid, text) VALUES (new.id, new.text);
+                END;
+            """)
+            if not exists:
+                self.rebuild(conn)
+
+    def rebuild(self, conn=None):
+        """
+        Re-index every article from scratch.
+        """
+        if conn is None:
+            with sqlite3.connect(self.sql_path) as conn:
+                self.rebuild(conn)
+            return
+        conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.sql_path)
+        return conn
+
+    def search(self, query: str, top_k: int = 10, law_name: str = None) -> list:
+        """
+        Rank articles against the query with BM25.
+
+        Args:
+            query (str): Free text.
+            top_k (int): Number of articles to return.
+            law_name (str, optional): Only return articles of this law.
+
+        Returns:
+            list: (law_name, article_number, score) tuples, best first; higher scores are better.
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = """
+            SELECT a.law_name, a.article_number, -bm25(articles_fts) AS score
+            FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid
+            WHERE articles_fts MATCH ?
+        """
+        params = [match]
+        if law_name is not None:
+            sql += " AND a.law_name = ?"
+            params.append(law_name)
+        sql += " ORDER BY bm25(articles_fts) LIMIT ?"
+        params.append(top_k)
+        try:
+            return self._connection().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"SQLite error: {e}")
+            return []
+
+    def lookup(self, article_numbers, law_name: str = None) -> list:
+        """
+        Return the (law_name, article_number) of the stored articles among article_numbers,
+        in the order they were given.
+
+        Args:
+            article_numbers (iterable): The article numbers to look up.
+            law_name (str, optional): Only return articles of this law.
+        """
+        article_numbers = list(article_numbers)
+        sql = "SELECT law_name, article_number FROM articles WHERE article_number IN ({placeholders})"
+        params = ()
+        if law_name is not None:
+            sql = "SELECT law_name, article_number FROM articles WHERE law_name = ? AND article_number IN ({placeholders})"
+            params = (law_name,)
+        rows = list(execute_in_batches(self._connection(), sql, article_numbers, params))
+        order = {number: i for i, number in enumerate(article_numbers)}
+        return sorted(rows, key=lambda row: order.get(row[1], len(order)))
+
+    def close(self):
+        """
+        Close the connection opened by the calling thread.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,265 @@
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the duration histogram buckets, from sub-millisecond query
+# steps to multi-minute ingestion stages.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+PREFIX = "raglaw"
+
+
+def _env_set(name: str) -> set:
+    return {stage.strip() for stage in os.getenv(name, "").split(",") if stage.strip()}
+
+
+class StageTimer:
+    """
+    Handle of a running stage, to report the units it processed when they are only known
+    at the end (e.g. the chunks produced, or the pages of a stream).
+    """
+    def __init__(self, items: int = 0):
+        self.items = items
+
+
+class Metrics:
+    """
+    Metrics collects per-stage timings, item counts and counters of the ingest and query
+    pipeline, and exports them as Prometheus text or JSON.
+
+    Every stage keeps a duration histogram, so query steps (query_encode, query_search,
+    query_hydrate) give latency percentiles and ingestion stages give items per second
+    (pages, articles, chunks, embeddings). Stages can be profiled on demand: with cProfile
+    (one cumulative profile per stage, written as .prof files) or tracemalloc (peak Python
+    memory per stage). Both are off unless asked for, as they slow the stages down.
+    """
+    def __init__(self,
+                 enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true",
+                 profile_stages: set = None,
+                 trace_memory_stages: set = None,
+                 profile_dir: str = os.getenv("METRICS_PROFILE_DIR", "data/profiles"),
+                 export_path: str = os.getenv("METRICS_PATH")):
+        """
+        Args:
+            enabled (bool): Record anything at all; when False stages run untouched.
+            profile_stages (set, optional): Stages run under cProfile ("*" for all); by
+                                            default the comma-separated METRICS_PROFILE.
+            trace_memory_stages (set, optional): Stages whose peak memory is traced ("*"
+                                                 for all); by default METRICS_TRACE_MEMORY.
+            profile_dir (str): Folder the .prof files are written to by dump_profiles.
+            export_path (str, optional): File written by export() without a path; ".json"
+                                         files get JSON, others Prometheus text.
+        """
+        self.enabled = enabled
+        self.profile_stages = _env_set("METRICS_PROFILE") if profile_stages is None else set(profile_stages)
+        self.trace_memory_stages = _env_set("METRICS_TRACE_MEMORY") if trace_memory_stages is None else set(trace_memory_stages)
+        self.profile_dir = profile_dir
+        self.export_path = export_path
+        self._lock = threading.Lock()
+        self._stages = {}  # name -> {"count", "seconds", "items", "buckets", "peak_bytes"}
+        self._counters = {}
+        self._profiles = {}  # name -> cProfile.Profile, accumulated over every run of the stage
+        self._profiling = False  # a single profiler can be active at a time
+
+    def _wants(self, stages: set, name: str) -> bool:
+        return "*" in stages or name in stages
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0):
+        """
+        Time a stage, with the number of units it processes. Around a generator, the
+        stage spans the whole stream, including the time its consumer takes. Traced peak
+        memory is process-wide, so stages running concurrently share it.
+
+        Usage:
+            with metrics.stage("preprocess_articles") as stage:
+                chunks = ...
+                stage.items = len(chunks)
+        """
+        timer = StageTimer(items)
+        if not self.enabled:
+            yield timer
+            return
+
+        profile = None
+        if self._wants(self.profile_stages, name):
+            with self._lock:
+                # Nested or concurrent stages are not profiled separately: they show up
+                # inside the profile of the outer stage, if it runs in the same thread.
+                if not self._profiling:
+                    profile = self._profiles.setdefault(name, cProfile.Profile())
+                    self._profiling = True
+            if profile is not None:
+                profile.enable()
+        started_tracing = False
+        if self._wants(self.trace_memory_stages, name):
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            seconds = time.perf_counter() - start
+            peak = None
+            if self._wants(self.trace_memory_stages, name):
+                peak = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            if profile is not None:
+                profile.disable()
+                with self._lock:
+                    self._profiling = False
+            self.observe(name, seconds, timer.items, peak)
+
+    def observe(self, name: str, seconds: float, items: int = 0, peak_bytes: int = None):
+        """
+        Record one run of a stage timed elsewhere.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {"count": 0, "seconds": 0.0, "items": 0,
+                                              "buckets": [0] * len(BUCKETS), "peak_bytes": None}
+            stage["count"] += 1
+            stage["seconds"] += seconds
+            stage["items"] += items
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stage["buckets"][i] += 1
+                    break
+            if peak_bytes is not None:
+                stage["peak_bytes"] = max(stage["peak_bytes"] or 0, peak_bytes)
+
+    def count(self, name: str, value: int = 1):
+        """
+        Add value to a counter (cache hits, queries, rejected requests, ...).
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._profiles.clear()
+
+    @staticmethod
+    def _quantile(buckets, count, q):
+        # Upper bound of the bucket holding the q-th observation, as Prometheus estimates it.
+        rank = q * count
+        seen = 0
+        for bound, observed in zip(BUCKETS, buckets):
+            seen += observed
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        """
+        Current values: per stage its runs, total seconds, items, items per second,
+        estimated p50/p95/p99 seconds and traced peak memory; and the counters.
+        """
+        with self._lock:
+            stages = {}
+            for name, stage in self._stages.items():
+                stages[name] = {
+                    "count": stage["count"],
+                    "seconds": stage["seconds"],
+                    "items": stage["items"],
+                    "items_per_sec": stage["items"] / stage["seconds"] if stage["items"] and stage["seconds"] else None,
+                    "mean_seconds": stage["seconds"] / stage["count"],
+                    "p50_seconds": self._quantile(stage["buckets"], stage["count"], 0.50),
+                    "p95_seconds": self._quantile(stage["buckets"], stage["count"], 0.95),
+                    "p99_seconds": self._quantile(stage["buckets"], stage["count"], 0.99),
+                    "peak_bytes": stage["peak_bytes"],
+                }
+            return {"stages": stages, "counters": dict(self._counters)}
+
+    def to_prometheus(self) -> str:
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            stages = {name: dict(stage, buckets=list(stage["buckets"])) for name, stage in self._stages.items()}
+            counters = dict(self._counters)
+        lines = [f"# HELP {PREFIX}_stage_seconds Duration of pipeline stages.",
+                 f"# TYPE {PREFIX}_stage_seconds histogram"]
+        for name, stage in stages.items():
+            cumulative = 0
+            for bound, observed in zip(BUCKETS, stage["buckets"]):
+                cumulative += observed
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stage["count"]}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{name}"}} {stage["seconds"]}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+        lines += [f"# HELP {PREFIX}_stage_items_total Units (pages, articles, chunks, queries) processed by pipeline stages.",
+                  f"# TYPE {PREFIX}_stage_items_total counter"]
+        lines += [f'{PREFIX}_stage_items_total{{stage="{name}"}} {stage["items"]}' for name, stage in stages.items()]
+        traced = {name: stage["peak_bytes"] for name, stage in stages.items() if stage["peak_bytes"] is not None}
+        if traced:
+            lines += [f"# HELP {PREFIX}_stage_peak_bytes Peak traced Python memory of pipeline stages.",
+                      f"# TYPE {PREFIX}_stage_peak_bytes gauge"]
+            lines += [f'{PREFIX}_stage_peak_bytes{{stage="{name}"}} {peak}' for name, peak in traced.items()]
+        lines += [f"# HELP {PREFIX}_events_total Pipeline event counters.",
+                  f"# TYPE {PREFIX}_events_total counter"]
+        lines += [f'{PREFIX}_events_total{{event="{name}"}} {value}' for name, value in counters.items()]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str = None):
+        """
+        Write the metrics to a file, atomically: JSON for ".json" files, Prometheus text
+        otherwise (e.g. a .prom file read by the node exporter's textfile collector).
+
+        Args:
+            path (str, optional): The file; defaults to export_path. Nothing is written if
+                                  neither is set.
+        """
+        path = path or self.export_path
+        if not path:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                json.dump(self.snapshot(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def dump_profiles(self) -> list:
+        """
+        Write the cProfile data of every profiled stage to profile_dir/<stage>.prof, to be
+        read with pstats or snakeviz.
+
+        Returns:
+            list: The files written.
+        """
+        with self._lock:
+            profiles = dict(self._profiles)
+        if not profiles:
+            return []
+        os.makedirs(self.profile_dir, exist_ok=True)
+        paths = []
+        for name, profile in profiles.items():
+            path = os.path.join(self.profile_dir, f"{name}.prof")
+            profile.dump_stats(path)
+            paths.append(path)
+        logging.info(f"Wrote {len(paths)} stage profiles to {self.profile_dir}.")
+        return paths
+
+
+# Shared by the pipeline classes unless they are given their own.
+default_metrics = Metrics()
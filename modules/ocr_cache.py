@@ -0,0 +1,139 @@
+import hashlib
+import sqlite3
+import PyPDF2
+from modules.sqlite_utils import execute_in_batches
+
+# Bump this when a change to the OCR pipeline makes previously cached text stale.
+CACHE_VERSION = 1
+
+
+def _stream_bytes(obj) -> bytes:
+    """
+    Return the raw bytes of a PDF stream object without decoding images.
+    """
+    data = getattr(obj, "_data", None)
+    if data is None:
+        data = obj.get_data()
+    return data if isinstance(data, bytes) else str(data).encode("utf-8")
+
+
+def _hash_xobjects(hasher, resources, depth=0):
+    """
+    Feed the images and forms drawn on a page into the hash. Scanned PDFs usually share the
+    same content stream on every page ("draw image /Im0"), so the image data is what
+    actually tells two pages apart.
+    """
+    if resources is None or depth > 3:
+        return
+    resources = resources.get_object()
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return
+    xobjects = xobjects.get_object()
+    for name in sorted(xobjects.keys()):
+        xobject = xobjects[name].get_object()
+        hasher.update(name.encode("utf-8"))
+        hasher.update(_stream_bytes(xobject))
+        if xobject.get("/Subtype") == "/Form":
+            _hash_xobjects(hasher, xobject.get("/Resources"), depth + 1)
+
+
+def page_fingerprint(page) -> str:
+    """
+    Compute a content hash of a PDF page: its content stream, geometry and the
+    images it draws.
+
+    Args:
+        page (PyPDF2.PageObject): The page to fingerprint.
+
+    Returns:
+        str: Hex digest identifying the rendered content of the page.
+    """
+    hasher = hashlib.sha256()
+    contents = page.get_contents()
+    if contents is not None:
+        hasher.update(contents.get_data())
+    hasher.update(repr(list(page.mediabox)).encode("utf-8"))
+    hasher.update(repr(page.get("/Rotate", 0)).encode("utf-8"))
+    _hash_xobjects(hasher, page.get("/Resources"))
+    return hasher.hexdigest()
+
+
+class OCRCache:
+    """
+    OCRCache stores the OCR text of single PDF pages in a SQLite file, keyed by the content
+    hash of the page and the OCR settings used to read it. The key does not depend on the
+    file name or the page position, so renamed or re-split PDFs still hit the cache.
+    """
+    def __init__(self, cache_path: str):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            cache_path (str): Path to the SQLite file holding the cached page texts.
+        """
+        self.cache_path = cache_path
+        self.conn = sqlite3.connect(cache_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_pages (
+                page_key TEXT PRIMARY KEY,
+                text TEXT
+            )
+        """)
+        self.conn.commit()
+
+    def page_keys(self, pdf_path: str, settings: str) -> list:
+        """
+        Compute the cache key of every page of a PDF.
+
+        Args:
+            pdf_path (str): Path to the PDF file.
+            settings (str): Everything else that influences the OCR output (Tesseract
+                            config, rendering resolution).
+
+        Returns:
+            list: One key per page, in page order.
+        """
+        keys = []
+        with open(pdf_path, "rb") as infile:
+            reader = PyPDF2.PdfReader(infile)
+            for page in reader.pages:
+                hasher = hashlib.sha256()
+                hasher.update(f"v{CACHE_VERSION}|{settings}|".encode("utf-8"))
+                hasher.update(page_fingerprint(page).encode("utf-8"))
+                keys.append(hasher.hexdigest())
+        return keys
+
+    def get_many(self, keys) -> dict:
+        """
+        Look up the cached text of several pages.
+
+        Args:
+            keys (list): Page keys as returned by page_keys.
+
+        Returns:
+            dict: Mapping from key to text for the keys that are cached.
+        """
+        return dict(execute_in_batches(
+            self.conn, "SELECT page_key, text FROM ocr_pages WHERE page_key IN ({placeholders})", set(keys)
+        ))
+
+    def put_many(self, items):
+        """
+        Store the text of several pages and commit immediately, so that an interrupted
+        run keeps every page it completed.
+
+        Args:
+            items (iterable): (key, text) pairs.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO ocr_pages (page_key, text) VALUES (?, ?)", items
+            )
+
+    def close(self):
+        """
+        Close the underlying database connection.
+        """
+        self.conn.close()
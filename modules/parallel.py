@@ -0,0 +1,44 @@
+from collections import deque
+from concurrent.futures import Future
+import os
+
+
+def default_workers() -> int:
+    """
+    Number of worker processes to use when the caller does not specify one.
+    """
+    return os.cpu_count() or 1
+
+
+def completed_future(value) -> Future:
+    """
+    Wrap an already available value in a finished Future, so that it can be queued
+    together with the futures of work that is still running.
+    """
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def iter_results_in_order(futures, max_pending: int):
+    """
+    Yield the results of an iterator of futures in submission order.
+
+    The iterator is consumed lazily: a new future is only pulled (and therefore only
+    submitted by the producer) while fewer than max_pending results are waiting to be
+    yielded. This keeps memory bounded no matter how long the input is.
+
+    Args:
+        futures (iterator): An iterator producing concurrent.futures.Future objects.
+        max_pending (int): Maximum number of futures kept in flight.
+
+    Yields:
+        The result of each future, in the order the futures were produced.
+    """
+    pending = deque()
+    for future in futures:
+        pending.append(future)
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -1,63 +1,265 @@
+import argparse
+import logging
+import math
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 import PyPDF2
+from modules.articles_split import OCR_CONFIG, OCR_DPI, ArticleSplitter, extract_page_range
+from modules.parallel import completed_future, iter_results_in_order
+
+PAGES_PER_SHARD = int(os.getenv("PAGES_PER_SHARD", 50))
+
+# Outline entries opening a book of the code, e.g. "Libro IV - Delle obbligazioni" or "LIBRO PRIMO".
+LIBRO_PATTERN = re.compile(r"(?i)^\s*libro\s+([IVX]+|primo|secondo|terzo|quarto|quinto|sesto)\b")
+
+
+def _iter_outline(reader, outline):
+    for item in outline:
+        if isinstance(item, list):
+            yield from _iter_outline(reader, item)
+        else:
+            yield item.title or "", reader.get_destination_page_number(item) + 1
+
+
+def libro_start_pages(pdf_path: str) -> list:
+    """
+    Find the first page of every Libro of a code from the bookmarks (outline) of its PDF,
+    without extracting any text.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+
+    Returns:
+        list: The sorted 1-based page numbers where a Libro starts; empty if the PDF has no
+              Libro bookmarks.
+    """
+    reader = PyPDF2.PdfReader(pdf_path)
+    try:
+        entries = list(_iter_outline(reader, reader.outline))
+    except Exception as e:  # broken outlines are common and only cost us the Libro boundaries
+        logging.warning(f"Could not read the outline of {pdf_path}: {e}")
+        return []
+    return sorted({page for title, page in entries if LIBRO_PATTERN.match(title)})
+
+
+def plan_shards(total_pages: int, boundaries=(), pages_per_shard: int = None, num_shards: int = None) -> list:
+    """
+    Cut the pages of a PDF into contiguous page ranges.
+
+    The pages are first cut at every boundary (e.g. the first page of each Libro), then each
+    part longer than pages_per_shard is divided into equal ranges of at most that many pages.
+
+    Args:
+        total_pages (int): Number of pages of the PDF.
+        boundaries (iterable): 1-based pages that must start a shard.
+        pages_per_shard (int, optional): Maximum pages per shard; defaults to PAGES_PER_SHARD.
+        num_shards (int, optional): Aim for this many shards instead, setting pages_per_shard
+                                    to total_pages / num_shards.
+
+    Returns:
+        list: (first_page, last_page) tuples, 1-based and inclusive, in page order.
+    """
+    if num_shards:
+        pages_per_shard = math.ceil(total_pages / num_shards)
+    pages_per_shard = max(pages_per_shard or PAGES_PER_SHARD, 1)
+    starts = sorted({1} | {page for page in boundaries if 1 < page <= total_pages})
+    shards = []
+    for first, end in zip(starts, starts[1:] + [total_pages + 1]):
+        pages = end - first
+        parts = math.ceil(pages / pages_per_shard)
+        for part in range(parts):
+            shards.append((first + pages * part // parts, first + pages * (part + 1) // parts - 1))
+    return shards
+
+
+def write_shards(pdf_path: str, shards, output_dir: str = None, name_format: str = "{stem}_{index:03d}.pdf",
+                 names=None) -> list:
+    """
+    Write page ranges of a PDF to separate files, e.g. to process them on other machines.
+
+    The source is parsed once and every shard is written by a single PdfWriter appending
+    its whole page range.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        shards (list): (first_page, last_page) tuples, 1-based and inclusive.
+        output_dir (str, optional): Folder of the shard files; defaults to the folder of the PDF.
+        name_format (str): File name of each shard, formatted with stem (the PDF name
+                           without extension), index (from 1), first and last.
+        names (list, optional): The file name of each shard, instead of name_format.
+
+    Returns:
+        list: The paths written, in shard order.
+    """
+    output_dir = output_dir or os.path.dirname(pdf_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    reader = PyPDF2.PdfReader(pdf_path)
+    total_pages = len(reader.pages)
+    paths = []
+    for index, (first, last) in enumerate(shards, start=1):
+        # An empty range (first == last + 1) gives a PDF without pages.
+        if not 1 <= first <= last + 1 <= total_pages + 1:
+            raise ValueError(f"Invalid page range {first}-{last} for a PDF of {total_pages} pages")
+        writer = PyPDF2.PdfWriter()
+        if first <= last:
+            writer.append(reader, pages=(first - 1, last), import_outline=False)
+        name = names[index - 1] if names else name_format.format(stem=stem, index=index, first=first, last=last)
+        path = os.path.join(output_dir, name)
+        with open(path, "wb") as out:
+            writer.write(out)
+        paths.append(path)
+    return paths
 
 
 def split_pdf(pdf_path, split_page, part1_name, part2_name):
     """"
     Splits a PDF file into two parts at the specified page number.
     """
-    # Open the PDF file in read-binary mode.
-    with open(pdf_path, 'rb') as infile:
-        reader = PyPDF2.PdfReader(infile)
-        total_pages = len(reader.pages)
-        
-        # Validate the split page number.
-        if split_page < 1 or split_page > total_pages:
-            raise ValueError(f"split_page must be between 1 and the total number of pages ({total_pages})")
-        
-        # Create PDF writers for the two parts.
-        writer1 = PyPDF2.PdfWriter()
-        writer2 = PyPDF2.PdfWriter()
-        
-        # Pages 0 to split_page-1 go to the first part.
-        for i in range(split_page):
-            writer1.add_page(reader.pages[i])
-        
-        # Pages split_page to end go to the second part.
-        for i in range(split_page, total_pages):
-            writer2.add_page(reader.pages[i])
-        
-        # Save the new PDFs in the same directory as the input PDF.
-        directory = os.path.dirname(pdf_path)
-        output1 = os.path.join(directory, part1_name)
-        output2 = os.path.join(directory, part2_name)
-        
-        with open(output1, 'wb') as out1:
-            writer1.write(out1)
-        with open(output2, 'wb') as out2:
-            writer2.write(out2)
-        
-        print("PDF split successfully!")
-        print(f"First part saved as: {output1}")
-        print(f"Second part saved as: {output2}")
+    # Validate the split page number.
+    total_pages = len(PyPDF2.PdfReader(pdf_path).pages)
+    if split_page < 1 or split_page > total_pages:
+        raise ValueError(f"split_page must be between 1 and the total number of pages ({total_pages})")
 
-if __name__ == '__main__': # This block is executed when the script is run directly.
-    # User inputs.
-    pdf_path = input("Enter the PDF file path: ").strip()
-    
+    # Pages 1 to split_page go to the first part, the rest to the second one; both are saved
+    # in the same directory as the input PDF.
+    output1, output2 = write_shards(pdf_path, [(1, split_page), (split_page + 1, total_pages)],
+                                    names=[part1_name, part2_name])
+
+    print("PDF split successfully!")
+    print(f"First part saved as: {output1}")
+    print(f"Second part saved as: {output2}")
+
+
+def split_shard(pdf_path: str, first_page: int, last_page: int, skip_patterns=None,
+                use_text_layer: bool = True, cached_texts=None) -> tuple:
+    """
+    Extract the text of a page range and split it into articles, in a worker process.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        first_page (int): First page of the shard (1-based, inclusive).
+        last_page (int): Last page of the shard (1-based, inclusive).
+        skip_patterns (list, optional): The skip patterns of the ArticleSplitter.
+        use_text_layer (bool): See ArticleSplitter.
+        cached_texts (dict, optional): Page number -> text of pages already in the OCR cache.
+
+    Returns:
+        tuple: (lines before the first article heading, which continue the last article of
+               the previous shard; the articles; page number -> text of the pages extracted)
+    """
+    cached_texts = cached_texts or {}
+    extracted = {}
+
+    def pages():
+        for page_number in range(first_page, last_page + 1):
+            if page_number in cached_texts:
+                yield cached_texts[page_number]
+            else:
+                extracted[page_number] = extract_page_range(pdf_path, page_number, page_number, use_text_layer)[0]
+                yield extracted[page_number]
+
+    splitter = ArticleSplitter(skip_patterns=skip_patterns, max_workers=1, use_text_layer=use_text_layer)
+    preamble = []
+    articles = list(splitter.iter_articles(pages(), preamble))
+    return preamble, articles, extracted
+
+
+def iter_articles_sharded(splitter: ArticleSplitter, pdf_path: str, shards=None, by_libro: bool = True,
+                          pages_per_shard: int = None):
+    """
+    Split a PDF into articles, one page-range shard per task on a pool of
+    splitter.max_workers processes.
+
+    Each worker extracts and splits its whole shard, so only the articles come back to this
+    process. Shards are merged in page order: the lines a shard holds before its first
+    article heading are appended to the last article of the shards before it, so an
+    article crossing a shard boundary comes out as one article, exactly as with
+    splitter.iter_articles(splitter.iter_pages(pdf_path)). At most two shards per worker
+    are in flight. Pages in splitter.ocr_cache are not extracted again, and the pages
+    extracted by each shard are stored in it as the shard completes.
+
+    Args:
+        splitter (ArticleSplitter): Provides the skip patterns, workers, text layer
+                                    setting, OCR cache and metrics.
+        pdf_path (str): Path to the PDF file.
+        shards (list, optional): (first_page, last_page) tuples; planned with plan_shards
+                                 by default.
+        by_libro (bool): When planning, also cut at the Libro bookmarks of the PDF.
+        pages_per_shard (int, optional): When planning, the maximum pages per shard.
+
+    Yields:
+        dict: A dictionary with "article_number" and "text" for each article, in order.
+    """
+    if shards is None:
+        total_pages = len(PyPDF2.PdfReader(pdf_path).pages)
+        boundaries = libro_start_pages(pdf_path) if by_libro else []
+        shards = plan_shards(total_pages, boundaries, pages_per_shard)
+        logging.info(f"Split {total_pages} pages into {len(shards)} shards ({len(boundaries)} Libro boundaries).")
+
+    keys = cached = None
+    if splitter.ocr_cache is not None:
+        settings = f"{OCR_CONFIG}|dpi={OCR_DPI}|text_layer={splitter.use_text_layer}"
+        keys = splitter.ocr_cache.page_keys(pdf_path, settings)
+        cached = splitter.ocr_cache.get_many(keys)
+
+    def cached_texts(first, last):
+        if keys is None:
+            return None
+        return {page: cached[keys[page - 1]] for page in range(first, last + 1) if keys[page - 1] in cached}
+
+    executor = ProcessPoolExecutor(max_workers=splitter.max_workers) if splitter.max_workers > 1 else None
+
+    def submit(shard):
+        args = (pdf_path, *shard, splitter.skip_patterns, splitter.use_text_layer, cached_texts(*shard))
+        if executor is None:
+            return completed_future(split_shard(*args))
+        return executor.submit(split_shard, *args)
+
+    max_pending = 2 * splitter.max_workers if executor is not None else 1
+    last_article = None  # held back until the next shard has had the chance to continue it
     try:
-        # The split_page is the first page of the second PDF.
-        split_page = int(input("Enter the page number where to split (first page of second PDF): ").strip())
-    except ValueError:
-        print("Invalid page number.")
-        exit(1)
-    
-    part1_name = input("Enter the name for the first part (e.g., part1.pdf): ").strip()
-    part2_name = input("Enter the name for the second part (e.g., part2.pdf): ").strip()
-    
+        with splitter.metrics.stage("extract_text_from_pdf") as stage:
+            results = iter_results_in_order((submit(shard) for shard in shards), max_pending=max_pending)
+            for (first, last), (preamble, articles, extracted) in zip(shards, results):
+                if splitter.ocr_cache is not None and extracted:
+                    splitter.ocr_cache.put_many((keys[page - 1], text) for page, text in extracted.items())
+                if keys is not None:
+                    splitter.metrics.count("ocr_cache_hits", last - first + 1 - len(extracted))
+                stage.items += last - first + 1
+                if preamble and last_article is not None:
+                    last_article["text"] = " ".join([last_article["text"], *preamble]).strip()
+                if articles:
+                    if last_article is not None:
+                        yield last_article
+                    yield from articles[:-1]
+                    last_article = articles[-1]
+            if last_article is not None:
+                yield last_article
+    finally:
+        if executor is not None:
+            # Do not keep extracting shards nobody will read if the consumer stops early.
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+if __name__ == '__main__': # This block is executed when the script is run directly.
+    # run with "poetry run python -m modules.pdf_split codes/cod_civ/libri.pdf --pages-per-shard 100"
+    parser = argparse.ArgumentParser(description="Split a PDF into page-range shards.")
+    parser.add_argument("pdf_path", type=str, help="The PDF file to split")
+    parser.add_argument("--pages-per-shard", type=int, default=PAGES_PER_SHARD,
+                        help=f"Maximum pages per shard (default: {PAGES_PER_SHARD})")
+    parser.add_argument("--shards", type=int, default=None, help="Number of shards, instead of --pages-per-shard")
+    parser.add_argument("--no-libro", action="store_true", help="Do not cut at the Libro bookmarks")
+    parser.add_argument("--output-dir", type=str, default=None, help="Folder of the shards (default: the folder of the PDF)")
+    args = parser.parse_args()
+
     try:
-        split_pdf(pdf_path, split_page, part1_name, part2_name)
+        total_pages = len(PyPDF2.PdfReader(args.pdf_path).pages)
+        boundaries = [] if args.no_libro else libro_start_pages(args.pdf_path)
+        shards = plan_shards(total_pages, boundaries, args.pages_per_shard, args.shards)
+        for (first, last), path in zip(shards, write_shards(args.pdf_path, shards, args.output_dir)):
+            print(f"Pages {first}-{last} saved as: {path}")
     except Exception as e:
         print(f"An error occurred: {e}")
-
-
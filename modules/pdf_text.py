@@ -0,0 +1,283 @@
+import logging
+import math
+from PyPDF2._cmap import build_char_map
+from PyPDF2.generic import ContentStream
+
+# A page needs at least this many letters before its text layer is trusted. Below it we
+# assume a scanned page (or one carrying only a page number) and fall back to OCR.
+MIN_LETTERS = 40
+
+# Share of characters that must be letters, digits, whitespace or common punctuation.
+# Text layers with broken font encodings produce mostly symbols and fail this check.
+MIN_CLEAN_RATIO = 0.85
+
+# Resolution of the horizontal coverage profile used to detect column gutters.
+PROFILE_BINS = 100
+
+# Rough average glyph width as a fraction of the font size, used when a font does not
+# list the widths of its glyphs (the standard 14 fonts, most composite fonts).
+AVG_GLYPH_WIDTH = 0.5
+
+# A TJ adjustment at least this large (thousandths of the font size) separates two words.
+TJ_SPACE = 250
+
+_PUNCTUATION = set(".,;:!?'\"()[]-–—/%°«»’‘“”§&*+=")
+
+
+def has_usable_text(text: str) -> bool:
+    """
+    Check whether text extracted from a PDF text layer is good enough to skip OCR.
+
+    Args:
+        text (str): Text extracted from a single page.
+
+    Returns:
+        bool: True if the page has enough readable text, False otherwise.
+    """
+    if not text:
+        return False
+    letters = sum(1 for char in text if char.isalpha())
+    if letters < MIN_LETTERS:
+        return False
+    clean = sum(1 for char in text if char.isalnum() or char.isspace() or char in _PUNCTUATION)
+    return clean / len(text) >= MIN_CLEAN_RATIO
+
+
+def _mult(m, n):
+    # Product of two PDF matrices [a b c d e f] (row vectors, as in the PDF specification).
+    return [
+        m[0] * n[0] + m[1] * n[2],
+        m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2],
+        m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4],
+        m[4] * n[1] + m[5] * n[3] + n[5],
+    ]
+
+
+def _decode(raw, encoding, to_unicode: dict) -> str:
+    # The decoding PyPDF2's own text extraction applies to the operand of Tj.
+    if isinstance(raw, str):
+        text = raw
+    elif isinstance(encoding, str):
+        try:
+            text = raw.decode(encoding, "surrogatepass")
+        except Exception:
+            text = raw.decode("utf-16-be" if encoding == "charmap" else "charmap", "surrogatepass")
+    else:
+        text = "".join(encoding.get(code, chr(code)) for code in raw)
+    return "".join(to_unicode.get(char, char) for char in text)
+
+
+class _Font:
+    """
+    Decoding and glyph widths of a font resource of a page.
+    """
+    def __init__(self, name: str, page):
+        font_type, _, self.encoding, self.to_unicode, font = build_char_map(name, 200.0, page)
+        self.single_byte = font_type != "/Type0"
+        self.widths = {}
+        if self.single_byte and "/Widths" in font:
+            first = int(font.get("/FirstChar", 0))
+            self.widths = {first + i: float(width) for i, width in enumerate(font["/Widths"].get_object())}
+
+    def show(self, raw):
+        """
+        Returns:
+            tuple: (decoded text, [(glyph width in thousandths of the font size, is a space)]).
+        """
+        text = _decode(raw, self.encoding, self.to_unicode)
+        if self.single_byte and self.widths and not isinstance(raw, str):
+            glyphs = [(self.widths.get(code, 1000 * AVG_GLYPH_WIDTH), code == 32) for code in raw]
+        else:
+            glyphs = [(1000 * AVG_GLYPH_WIDTH, char == " ") for char in text]
+        return text, glyphs
+
+
+def _text_fragments(page):
+    """
+    Walk the content stream of a page and return where each text-showing operator puts
+    its text.
+
+    Text placed by form XObjects is not followed.
+
+    Returns:
+        list or None: (x, y, width, font size, text) in page space, one per Tj, TJ, ' or "
+                      operator in content-stream order; None if the page draws forms.
+    """
+    if "/Contents" not in page:
+        return []
+    # Indexing (unlike .get) resolves indirect objects.
+    resources = page["/Resources"] if "/Resources" in page else {}
+    font_names = list(resources["/Font"]) if "/Font" in resources else []
+    fonts = {}
+    xobjects = resources["/XObject"] if "/XObject" in resources else {}
+    content = ContentStream(page["/Contents"].get_object(), page.pdf, "bytes")
+
+    fragments = []
+    cm, stack = [1.0, 0.0, 0.0, 1.0, 0.0, 0.0], []
+    tm = tlm = [1.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+    font, size, char_spacing, word_spacing, scaling, leading = None, 12.0, 0.0, 0.0, 1.0, 0.0
+
+    def next_line(tx, ty):
+        nonlocal tm, tlm
+        tm = tlm = _mult([1.0, 0.0, 0.0, 1.0, tx, ty], tlm)
+
+    def show(elements):
+        # One fragment per operator; TJ arrays mix strings and position adjustments.
+        nonlocal tm
+        start = _mult(tm, cm)
+        text = ""
+        for element in elements:
+            if isinstance(element, (str, bytes)):
+                if font is None:
+                    continue
+                shown, glyphs = font.show(element)
+                text += shown
+                advance = sum(width / 1000 * size + char_spacing + (word_spacing if space and font.single_byte else 0)
+                              for width, space in glyphs)
+            else:
+                adjustment = float(element)
+                if adjustment <= -TJ_SPACE and text and not text.endswith(" "):
+                    text += " "
+                advance = -adjustment / 1000 * size
+            tm = _mult([1.0, 0.0, 0.0, 1.0, advance * scaling, 0.0], tm)
+        end = _mult(tm, cm)
+        if text:
+            font_size = size * (math.hypot(start[2], start[3]) or 1.0)
+            fragments.append((start[4], start[5], end[4] - start[4], font_size, text))
+
+    for operands, operator in content.operations:
+        if operator == b"q":
+            stack.append(cm)
+        elif operator == b"Q":
+            cm = stack.pop() if stack else cm
+        elif operator == b"cm":
+            cm = _mult([float(value) for value in operands], cm)
+        elif operator == b"BT":
+            tm = tlm = [1.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+        elif operator == b"Tm":
+            tm = tlm = [float(value) for value in operands]
+        elif operator == b"Td":
+            next_line(float(operands[0]), float(operands[1]))
+        elif operator == b"TD":
+            leading = -float(operands[1])
+            next_line(float(operands[0]), float(operands[1]))
+        elif operator == b"T*":
+            next_line(0.0, -leading)
+        elif operator == b"TL":
+            leading = float(operands[0])
+        elif operator == b"Tc":
+            char_spacing = float(operands[0])
+        elif operator == b"Tw":
+            word_spacing = float(operands[0])
+        elif operator == b"Tz":
+            scaling = float(operands[0]) / 100
+        elif operator == b"Tf":
+            if operands[0] not in fonts:
+                fonts[operands[0]] = _Font(operands[0], page) if operands[0] in font_names else None
+            font, size = fonts[operands[0]], float(operands[1])
+        elif operator == b"Tj":
+            show(operands[:1])
+        elif operator == b"TJ":
+            show(operands[0])
+        elif operator == b"'":
+            next_line(0.0, -leading)
+            show(operands[:1])
+        elif operator == b'"':
+            word_spacing, char_spacing = float(operands[0]), float(operands[1])
+            next_line(0.0, -leading)
+            show(operands[2:3])
+        elif operator == b"Do":
+            if operands[0] in xobjects and xobjects[operands[0]]["/Subtype"] == "/Form":
+                return None
+    return fragments
+
+
+def _join_lines(fragments) -> str:
+    """
+    Put the fragments of one column together line by line, top to bottom, each line left
+    to right. Fragments whose baselines are within half a font size share a line.
+    """
+    lines = []
+    for fragment in sorted(fragments, key=lambda fragment: -fragment[1]):
+        if lines and abs(lines[-1][0][1] - fragment[1]) <= 0.5 * fragment[3]:
+            lines[-1].append(fragment)
+        else:
+            lines.append([fragment])
+    texts = []
+    for line in lines:
+        line.sort(key=lambda fragment: fragment[0])
+        text = line[0][4]
+        for previous, fragment in zip(line, line[1:]):
+            gap = fragment[0] - (previous[0] + previous[2])
+            if gap > 0.15 * fragment[3] and not text.endswith(" ") and not fragment[4].startswith(" "):
+                text += " "
+            text += fragment[4]
+        texts.append(text.strip())
+    return "\n".join(texts)
+
+
+def _find_gutter(fragments, page_left: float, page_width: float):
+    """
+    Look for a vertical gutter separating two text columns.
+
+    Builds a horizontal coverage profile of the page (how much text crosses each vertical
+    strip) and looks for an almost empty strip in the middle of the page while both halves
+    carry text.
+
+    Returns:
+        float or None: The x coordinate of the gutter, or None for single-column pages.
+    """
+    coverage = [0.0] * PROFILE_BINS
+    for x, _, width, _, _ in fragments:
+        start = int((x - page_left) / page_width * PROFILE_BINS)
+        end = int((x + width - page_left) / page_width * PROFILE_BINS)
+        for index in range(max(start, 0), min(end, PROFILE_BINS - 1) + 1):
+            coverage[index] += 1
+
+    body = sorted(coverage[10:90])
+    typical = body[len(body) // 2]
+    if typical == 0:
+        return None
+
+    middle = range(35, 66)
+    gutter = min(middle, key=lambda index: (coverage[index], abs(index - PROFILE_BINS // 2)))
+    left_text = sum(coverage[10:gutter])
+    right_text = sum(coverage[gutter + 1:90])
+    if coverage[gutter] > 0.05 * typical or min(left_text, right_text) < 0.2 * (left_text + right_text):
+        return None
+    return page_left + (gutter + 0.5) / PROFILE_BINS * page_width
+
+
+def extract_page_text(page) -> str:
+    """
+    Extract the text layer of a PDF page in reading order.
+
+    Two-column pages are detected from the position of each text-showing operator of the
+    content stream; their text is returned column by column (left column first), line by
+    line, instead of in the order the operators appear, which often interleaves the lines
+    of both columns. Other pages are extracted by PyPDF2 as they are.
+
+    Args:
+        page (PyPDF2.PageObject): The page to read.
+
+    Returns:
+        str: The text of the page.
+    """
+    try:
+        fragments = _text_fragments(page)
+    except Exception as e:  # a content stream we cannot follow only costs us the column detection
+        logging.warning(f"Could not locate the text of a page: {e}")
+        fragments = None
+    page_left = float(page.mediabox.left)
+    page_width = float(page.mediabox.width)
+    visible = [fragment for fragment in fragments or [] if fragment[4].strip()]
+    gutter = _find_gutter(visible, page_left, page_width) if visible and page_width > 0 else None
+    if gutter is None:
+        return page.extract_text()
+
+    columns = ([], [])
+    for fragment in visible:
+        columns[0 if fragment[0] < gutter else 1].append(fragment)
+    return "\n".join(_join_lines(column) for column in columns)
@@ -0,0 +1,153 @@
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query before using it as a cache key: Unicode NFC form and collapsed
+    whitespace. Case is kept, since the embedding model is case sensitive.
+    """
+    return unicodedata.normalize("NFC", " ".join(query.split()))
+
+
+class LRUCache:
+    """
+    LRUCache is a thread-safe, bounded mapping that evicts the least recently used entry
+    when full and counts hits and misses.
+    """
+    def __init__(self, max_size: int):
+        """
+        Args:
+            max_size (int): Maximum number of entries. 0 disables the cache.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Return the value stored for key and mark it as recently used, or default if absent.
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entries if the cache is full.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove every entry. Hit and miss counters are kept.
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: Number of entries, hits, misses and hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class EmbeddingCache(LRUCache):
+    """
+    EmbeddingCache is an LRUCache of query embeddings (string key to float32 vector) that
+    can be saved to and reloaded from a .npz file, so it survives restarts.
+    """
+    def __init__(self, max_size: int, persist_path: str = None):
+        """
+        Args:
+            max_size (int): Maximum number of embeddings kept.
+            persist_path (str, optional): .npz file the cache is loaded from (if it exists)
+                                          and saved to by save().
+        """
+        super().__init__(max_size)
+        self.persist_path = persist_path
+        if persist_path and os.path.exists(persist_path):
+            self.load(persist_path)
+
+    def load(self, path: str):
+        """
+        Load the entries of a file written by save(), in their least-recently-used order.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            for key, vector in zip(data["keys"].tolist(), data["vectors"]):
+                self.put(key, vector)
+
+    def save(self, path: str = None):
+        """
+        Write the cache to a .npz file (defaults to persist_path).
+        """
+        path = path or self.persist_path
+        if not path:
+            return
+        with self._lock:
+            keys = list(self._data.keys())
+            vectors = list(self._data.values())
+        if not keys:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first, so a crash never leaves a truncated cache behind.
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys), vectors=np.stack(vectors).astype(np.float32))
+        os.replace(tmp_path, path)
+
+
+def embed_queries_cached(encoder, cache: EmbeddingCache, encoder_key: str, queries) -> np.ndarray:
+    """
+    Encode queries, serving repeated queries from cache.
+
+    Queries are normalized (see normalize_query) and all cache misses are encoded together
+    in one batched forward pass.
+
+    Args:
+        encoder: Anything with an embed_queries method (DensePassageRetriever, modules.encoders).
+        cache (EmbeddingCache): The query embedding cache.
+        encoder_key (str): Name of the model and backend, part of the cache keys.
+        queries (list): The query strings.
+
+    Returns:
+        np.ndarray: The query embeddings, shape (len(queries), embedding_dim).
+    """
+    keys = [f"{encoder_key}|{normalize_query(query)}" for query in queries]
+    embeddings = [cache.get(key) for key in keys]
+    missing = list(dict.fromkeys(
+        normalize_query(query) for query, embedding in zip(queries, embeddings) if embedding is None
+    ))
+    if missing:
+        encoded = dict(zip(missing, np.asarray(encoder.embed_queries(missing), dtype=np.float32)))
+        for i, query in enumerate(queries):
+            if embeddings[i] is None:
+                embeddings[i] = encoded[normalize_query(query)]
+                cache.put(keys[i], embeddings[i])
+    return np.stack(embeddings).astype(np.float32)
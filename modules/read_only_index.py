@@ -0,0 +1,312 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from itertools import islice
+import faiss
+import numpy as np
+from modules.ann_index import set_search_params
+from modules.metrics import Metrics, default_metrics
+from modules.query_cache import EmbeddingCache, LRUCache, embed_queries_cached, normalize_query
+from modules.sqlite_utils import fetch_articles
+
+# Files of a read-only index folder.
+INDEX_FILE = "index.faiss"
+MANIFEST_FILE = "manifest.json"
+# Chunk metadata, one .npy column per field, row i describing FAISS vector i.
+COLUMNS = ("article_number", "law_code", "chunk_number", "text_offsets", "text_bytes")
+
+
+def export_read_only_index(document_store, out_dir: str, model_name: str, batch_size: int = 10000,
+                           resolve_documents=None):
+    """
+    Write a FAISS document store as a read-only index folder: the FAISS index file, and
+    the chunk texts and metadata as memory-mappable columns instead of SQL rows.
+
+    Only the fields query_legal_code returns are kept: article_number, law_name,
+    chunk_number and the chunk text (the preprocessor's _split_* bookkeeping is dropped).
+
+    Args:
+        document_store (FAISSDocumentStore): The document store, with embeddings.
+        out_dir (str): Folder to write, created if needed.
+        model_name (str): Embedding model the vectors were computed with.
+        batch_size (int): Documents read from the document store at a time.
+        resolve_documents (callable, optional): Restores the text of a batch of documents
+                                                in place, for stores of compact chunks
+                                                (see VectorDB.resolve_documents).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    index = document_store.faiss_indexes[document_store.index]
+    num_vectors = index.ntotal
+    faiss.write_index(index, os.path.join(out_dir, INDEX_FILE))
+
+    # Vector ids without a document (there should be none) keep law_code -1.
+    article_numbers = [""] * num_vectors
+    law_codes = np.full(num_vectors, -1, dtype=np.int16)
+    chunk_numbers = np.zeros(num_vectors, dtype=np.int32)
+    texts = [b""] * num_vectors
+    laws = {}
+    documents = document_store.get_all_documents_generator(return_embedding=False, batch_size=batch_size)
+    for batch in iter(lambda: list(islice(documents, batch_size)), []):
+        if resolve_documents is not None:
+            resolve_documents(batch)
+        for document in batch:
+            vector_id = int(document.meta["vector_id"])
+            article_numbers[vector_id] = str(document.meta.get("article_number"))
+            law_codes[vector_id] = laws.setdefault(document.meta.get("law_name"), len(laws))
+            chunk_numbers[vector_id] = document.meta.get("chunk_number") or 0
+            texts[vector_id] = document.content.encode("utf-8")
+
+    offsets = np.zeros(num_vectors + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in texts], out=offsets[1:])
+    columns = {
+        "article_number": np.array(article_numbers, dtype=str),
+        "law_code": law_codes,
+        "chunk_number": chunk_numbers,
+        "text_offsets": offsets,
+        "text_bytes": np.frombuffer(b"".join(texts), dtype=np.uint8),
+    }
+    for name, column in columns.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), column)
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "similarity": document_store.similarity,
+            "embedding_dim": index.d,
+            "num_vectors": num_vectors,
+            "laws": list(laws),
+        }, f, ensure_ascii=False, indent=2)
+    logging.info(f"Exported a read-only index of {num_vectors} vectors to {out_dir}.")
+
+
+def _is_mapped(path: str) -> bool:
+    """
+    Whether a file is memory-mapped by this process, from /proc/self/maps. False where
+    this cannot be checked (outside Linux).
+    """
+    path = os.path.realpath(path)
+    try:
+        with open("/proc/self/maps") as f:
+            return any(line.split(maxsplit=5)[5:] == [path] for line in f.read().splitlines())
+    except OSError:
+        return False
+
+
+class ReadOnlyIndex:
+    """
+    ReadOnlyIndex serves queries from a folder written by export_read_only_index, for
+    processes that only search:
+
+    - the FAISS index is memory-mapped read-only, so worker processes share its pages
+      through the OS page cache instead of each reading a private copy;
+    - chunk texts and metadata are memory-mapped .npy columns, no document store is opened;
+    - only the query encoder is loaded, once (DensePassageRetriever loads a query and a
+      passage model);
+    - articles are read from SQLite through a read-only connection.
+
+    It offers the query methods of VectorDB: query_legal_code, query_legal_code_batch and
+    fetch_articles, with the same result format.
+    """
+    def __init__(self,
+                 index_dir: str = os.getenv("READ_ONLY_INDEX_DIR", "data/read_only_index"),
+                 sql_path: str = os.getenv("SQL_PATH", "data\\sqlite.db"),
+                 encoder = None,
+                 encoder_backend: str = os.getenv("ENCODER_BACKEND", "torch"), # "torch" or "onnx"
+                 encoder_quantize: bool = os.getenv("ENCODER_QUANTIZE", "false").lower() == "true",
+                 encoder_threads: int = int(os.getenv("ENCODER_THREADS", 0)),
+                 mmap: bool = True,
+                 nprobe: int = int(os.getenv("IVF_NPROBE", 16)),
+                 ef_search: int = int(os.getenv("HNSW_EF_SEARCH", 64)),
+                 refine_k_factor: float = float(os.getenv("REFINE_K_FACTOR", 4)),
+                 article_cache_size: int = int(os.getenv("ARTICLE_CACHE_SIZE", 1024)),
+                 query_cache_size: int = int(os.getenv("QUERY_CACHE_SIZE", 4096)),
+                 query_cache_path: str = os.getenv("QUERY_CACHE_PATH"),
+                 result_cache_size: int = int(os.getenv("RESULT_CACHE_SIZE", 1024)),
+                 metrics: Metrics = None):
+        """
+        Open a read-only index.
+
+        Args:
+            index_dir (str): Folder written by export_read_only_index.
+            sql_path (str): SQLite database with the articles.
+            encoder (optional): A query encoder with an embed_queries method; by default one
+                                is created from encoder_backend.
+            encoder_backend (str): "torch" (modules.encoders.TorchEncoder) or "onnx"
+                                   (modules.encoders.OnnxEncoder).
+            encoder_quantize (bool): With the "onnx" backend, use int8 quantized weights.
+            encoder_threads (int): Intra-op threads of the encoder (0: library default).
+            mmap (bool): Memory-map the FAISS index; indexes FAISS cannot map are read into
+                         memory. mmapped tells whether the file really is mapped, so that
+                         worker processes share its pages through the page cache.
+            nprobe (int): Number of IVF cells visited per query.
+            ef_search (int): Size of the HNSW candidate list at query time.
+            refine_k_factor (float): Candidates rescored per hit by Refine indexes.
+            article_cache_size (int): Number of article texts kept in the LRU cache.
+            query_cache_size (int): Number of query embeddings kept in the LRU cache.
+            query_cache_path (str, optional): File the query embedding cache is loaded from and saved to.
+            result_cache_size (int): Number of top-k result lists kept in the LRU cache.
+            metrics (Metrics, optional): Where query timings are recorded; defaults to
+                                         modules.metrics.default_metrics.
+        """
+        self.index_dir = index_dir
+        self.sql_path = sql_path
+        with open(os.path.join(index_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.similarity = self.manifest["similarity"]
+        self.laws = self.manifest["laws"]
+
+        index_path = os.path.join(index_dir, INDEX_FILE)
+        self.index = None
+        self.mmapped = False
+        if mmap:
+            try:
+                # IO_FLAG_MMAP_IFC maps the codes of flat-code indexes (Flat, HNSW storage, SQ,
+                # PQ, Refine) as well as IVF inverted lists; IO_FLAG_MMAP alone maps the latter only.
+                self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError as e:
+                logging.warning(f"Cannot memory-map {index_path} ({e}), reading it into memory.")
+            else:
+                self.mmapped = _is_mapped(index_path)
+                if not self.mmapped:
+                    logging.warning(f"FAISS read {index_path} into memory instead of mapping it.")
+        if self.index is None:
+            self.index = faiss.read_index(index_path)
+        set_search_params(self.index, nprobe=nprobe, ef_search=ef_search, k_factor=refine_k_factor)
+
+        self.columns = {
+            name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+            for name in COLUMNS
+        }
+
+        self.encoder_backend = encoder_backend
+        self.encoder_quantize = encoder_quantize
+        self.encoder = encoder or self._load_encoder(encoder_threads)
+        # Like VectorDB.encoder_key; TorchEncoder gets its own key as well, so its embeddings
+        # never share a persistent cache with DensePassageRetriever's.
+        self.encoder_key = f"{self.manifest['model_name']}|{encoder_backend}{'-int8' if encoder_quantize else ''}"
+
+        self._local = threading.local()
+        self.article_cache = LRUCache(article_cache_size)
+        self.query_embedding_cache = EmbeddingCache(query_cache_size, query_cache_path)
+        self.result_cache = LRUCache(result_cache_size)
+        self.metrics = metrics or default_metrics
+
+    def _load_encoder(self, num_threads: int):
+        from modules.encoders import OnnxEncoder, TorchEncoder
+
+        if self.encoder_backend == "torch":
+            return TorchEncoder(self.manifest["model_name"], num_threads=num_threads)
+        if self.encoder_backend == "onnx":
+            return OnnxEncoder(self.manifest["model_name"], quantize=self.encoder_quantize, num_threads=num_threads)
+        raise ValueError(f"Unknown encoder backend '{self.encoder_backend}', use 'torch' or 'onnx'")
+
+    def _scale_score(self, score: float) -> float:
+        # The scaling of haystack's FAISSDocumentStore, so scores match VectorDB's.
+        if self.similarity == "cosine":
+            return (score + 1) / 2
+        return float(1 / (1 + np.exp(-score / 100)))
+
+    def _chunk(self, vector_id: int, score: float) -> dict:
+        columns = self.columns
+        start, end = columns["text_offsets"][vector_id], columns["text_offsets"][vector_id + 1]
+        return {
+            "chunk_content": columns["text_bytes"][start:end].tobytes().decode("utf-8"),
+            "metadata": {
+                "vector_id": str(vector_id),
+                "article_number": str(columns["article_number"][vector_id]),
+                "law_name": self.laws[columns["law_code"][vector_id]],
+                "chunk_number": int(columns["chunk_number"][vector_id]),
+            },
+            "score": score,
+        }
+
+    def embed_queries(self, queries):
+        """
+        Encode queries, serving repeated queries from the query embedding cache.
+        """
+        with self.metrics.stage("query_encode", len(queries)):
+            return embed_queries_cached(self.encoder, self.query_embedding_cache, self.encoder_key, queries)
+
+    def query_legal_code_batch(self, queries, top_k=10):
+        """
+        Retrieve document chunks relevant to each of several queries, like
+        VectorDB.query_legal_code_batch.
+        """
+        if not queries:
+            return []
+        keys = [(top_k, normalize_query(query)) for query in queries]
+        responses = [self.result_cache.get(key) for key in keys]
+        pending = {}
+        for i, response in enumerate(responses):
+            if response is None:
+                pending.setdefault(keys[i], []).append(i)
+        self.metrics.count("queries", len(queries))
+        self.metrics.count("result_cache_hits", len(queries) - sum(len(positions) for positions in pending.values()))
+        if pending:
+            embeddings = self.embed_queries([queries[positions[0]] for positions in pending.values()])
+            if self.similarity == "cosine":
+                faiss.normalize_L2(embeddings)
+            with self.metrics.stage("query_search", len(embeddings)):
+                scores, vector_ids = self.index.search(embeddings, top_k)
+            with self.metrics.stage("query_hydrate", len(embeddings)):
+                for (key, positions), row_scores, row_ids in zip(pending.items(), scores, vector_ids):
+                    response = [
+                        self._chunk(int(vector_id), self._scale_score(float(score)))
+                        for score, vector_id in zip(row_scores, row_ids)
+                        if vector_id != -1 and self.columns["law_code"][vector_id] >= 0
+                    ]
+                    self.result_cache.put(key, response)
+                    for i in positions:
+                        responses[i] = response
+        return [list(response) for response in responses]
+
+    def query_legal_code(self, query, top_k=10):
+        """
+        Retrieve document chunks relevant to the input query, like VectorDB.query_legal_code.
+        """
+        return self.query_legal_code_batch([query], top_k)[0]
+
+    def _get_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Read-only: serving processes can never write to the database by mistake.
+            conn = self._local.conn = sqlite3.connect(f"file:{self.sql_path}?mode=ro", uri=True)
+        return conn
+
+    def fetch_articles(self, keys) -> dict:
+        """
+        Retrieve the full text of several articles in one round trip, like
+        VectorDB.fetch_articles.
+
+        Args:
+            keys (iterable): (law_name, article_number) pairs to look up. A bare article
+                             number stands for that article in the only law of the index.
+
+        Returns:
+            dict: Mapping from each requested key (as given) to its text, or None if the
+                  article is not in the database.
+        """
+        default_law = self.laws[0] if len(self.laws) == 1 else None
+        return fetch_articles(self._get_connection, self.article_cache, keys,
+                              default_law=default_law, metrics=self.metrics)
+
+    def cache_stats(self) -> dict:
+        """
+        Returns:
+            dict: Size, hits, misses and hit rate of the query embedding, result and article caches.
+        """
+        return {
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "results": self.result_cache.stats(),
+            "articles": self.article_cache.stats(),
+        }
+
+    def close(self):
+        """
+        Close the SQLite connection opened by the calling thread.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
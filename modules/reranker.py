@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+from modules.chunk_index import content_hash
+from modules.metrics import default_metrics
+from modules.query_cache import LRUCache, normalize_query
+
+# Small multilingual cross-encoder (MiniLM, 12 layers, 384 dims) trained on mMARCO, which
+# includes Italian.
+RERANKER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+class CrossEncoderReranker:
+    """
+    CrossEncoderReranker reorders the chunks found by the dense search with a cross-encoder,
+    which reads the query and the chunk together and scores their relevance much more
+    precisely than the distance between their separate embeddings.
+
+    The top candidates of a query are scored in batches on a thread pool (PyTorch releases
+    the GIL during the forward pass). Reranking has a latency budget per query: if some
+    batches are not scored in time, the dense order is returned instead. Scores are cached
+    per (query, chunk text), including the ones of batches that finish after the budget
+    ran out, so a repeated query is reranked without running the model.
+    """
+    def __init__(self,
+                 model_name: str = os.getenv("RERANKER_MODEL", RERANKER_MODEL),
+                 candidates: int = int(os.getenv("RERANK_CANDIDATES", 30)),
+                 batch_size: int = int(os.getenv("RERANK_BATCH_SIZE", 8)),
+                 budget_ms: float = float(os.getenv("RERANK_BUDGET_MS", 200)),
+                 max_workers: int = int(os.getenv("RERANK_WORKERS", 2)),
+                 cache_size: int = int(os.getenv("RERANK_CACHE_SIZE", 20000)),
+                 max_seq_len: int = 256,
+                 num_threads: int = 0, # 0 keeps PyTorch's default
+                 metrics=None):
+        """
+        Load the cross-encoder.
+
+        Args:
+            model_name (str): Hugging Face name or local path of a sequence classification
+                              model scoring (query, passage) pairs.
+            candidates (int): Dense hits reranked per query (the N of top-N).
+            batch_size (int): Pairs scored per forward pass.
+            budget_ms (float): Time allowed for reranking one query before falling back to
+                               the dense order; 0 waits for every batch.
+            max_workers (int): Threads scoring batches concurrently.
+            cache_size (int): Number of (query, chunk) scores kept in the LRU cache (0 disables it).
+            max_seq_len (int): Truncation length of a (query, chunk) pair in tokens.
+            num_threads (int): Intra-op threads of PyTorch.
+            metrics (Metrics, optional): Where timings and counters are recorded; defaults
+                                         to modules.metrics.default_metrics.
+        """
+        self.model_name = model_name
+        self.candidates = candidates
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.max_workers = max_workers
+        self.max_seq_len = max_seq_len
+        self.score_cache = LRUCache(cache_size)
+        self.metrics = metrics or default_metrics
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._load_model(num_threads)
+
+    def _load_model(self, num_threads: int):
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name).eval()
+
+    def score(self, query: str, texts) -> np.ndarray:
+        """
+        Score (query, text) pairs in one forward pass.
+
+        Returns:
+            np.ndarray: float32 relevance scores, higher is more relevant, in input order.
+        """
+        features = self.tokenizer([query] * len(texts), list(texts), truncation="only_second",
+                                  max_length=self.max_seq_len, padding=True, return_tensors="pt")
+        with self._torch.inference_mode():
+            logits = self.model(**features).logits
+        # Single-logit models give the relevance directly; two-class ones have it last.
+        return logits[:, -1].float().numpy()
+
+    def _score_batch(self, query: str, keys, texts):
+        scores = self.score(query, texts)
+        for key, score in zip(keys, scores):
+            self.score_cache.put(key, float(score))
+        return scores
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def rerank(self, query: str, hits, top_k: int) -> list:
+        """
+        Rerank the dense hits of a query.
+
+        Args:
+            query (str): The query string.
+            hits (list): Chunk dictionaries in dense order, as query_legal_code returns them.
+                         The first `candidates` are reranked.
+            top_k (int): The number of chunks to return.
+
+        Returns:
+            list: Up to top_k chunk dictionaries. When reranked they are ordered by the
+                  cross-encoder, which gives each a "rerank_score" ("score" stays the dense
+                  similarity); past the budget they are the dense hits unchanged.
+        """
+        start = time.perf_counter()
+        candidates = hits[:self.candidates]
+        if not candidates:
+            return list(hits[:top_k])
+        normalized = normalize_query(query)
+        keys = [(normalized, content_hash(hit["chunk_content"] or "")) for hit in candidates]
+        scores = [self.score_cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        self.metrics.count("rerank_cache_hits", len(candidates) - len(missing))
+
+        if missing:
+            executor = self._get_executor()
+            batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            futures = {
+                executor.submit(self._score_batch, query, [keys[i] for i in batch],
+                                [candidates[i]["chunk_content"] or "" for i in batch]): batch
+                for batch in batches
+            }
+            timeout = self.budget_ms / 1000 - (time.perf_counter() - start) if self.budget_ms else None
+            done, not_done = wait(futures, timeout=max(timeout, 0) if timeout is not None else None)
+            for future in not_done:
+                # Batches already running finish in the background and fill the cache.
+                future.cancel()
+            if not_done:
+                self.metrics.count("rerank_timeouts")
+                self.metrics.observe("rerank", time.perf_counter() - start, len(candidates))
+                return list(hits[:top_k])
+            for future in done:
+                for i, score in zip(futures[future], future.result()):
+                    scores[i] = float(score)
+
+        order = sorted(range(len(candidates)), key=lambda i: -scores[i])
+        reranked = [dict(candidates[i], rerank_score=scores[i]) for i in order]
+        # Hits past the candidates keep their dense order after the reranked ones.
+        reranked += hits[len(candidates):top_k]
+        self.metrics.observe("rerank", time.perf_counter() - start, len(candidates))
+        return reranked[:top_k]
+
+    def rerank_batch(self, queries, hits, top_k: int) -> list:
+        """
+        Rerank the dense hits of several queries, each within its own budget.
+        """
+        return [self.rerank(query, query_hits, top_k) for query, query_hits in zip(queries, hits)]
+
+    def close(self):
+        """
+        Stop the scoring threads.
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,117 @@
+import json
+import os
+import re
+import numpy as np
+
+# Article ranges of the six books (Libri) of the Italian codice civile.
+CODICE_CIVILE_LIBRI = {
+    "I": (1, 455),       # Delle persone e della famiglia
+    "II": (456, 809),    # Delle successioni
+    "III": (810, 1172),  # Della proprietà
+    "IV": (1173, 2059),  # Delle obbligazioni
+    "V": (2060, 2642),   # Del lavoro
+    "VI": (2643, 2969),  # Della tutela dei diritti
+}
+ROMAN_NUMERALS = {str(i): numeral for i, numeral in enumerate(CODICE_CIVILE_LIBRI, start=1)}
+# law_name values of the codice civile, compared case-insensitively; "libro" only selects its articles.
+# Index the codice civile under one of these names (LAW_NAME), or set CODICE_CIVILE_LAW_NAME to its law_name.
+CODICE_CIVILE_NAMES = {"codice civile", "cod. civ.", "c.c.", "cod_civ", os.getenv("CODICE_CIVILE_LAW_NAME", "Codice Civile").lower()}
+FILTER_KEYS = ("article_range", "libro", "article_numbers", "law_name")
+
+
+def article_number_value(article_number) -> int:
+    """
+    Article number as an integer ("2043" -> 2043), -1 if it is not a plain number.
+    """
+    try:
+        return int(article_number)
+    except (TypeError, ValueError):
+        return -1
+
+
+def parse_article_range(article_range) -> tuple:
+    """
+    Accept (1173, 2059), [1173, 2059] or "1173-2059" (any dash) and return (1173, 2059).
+    """
+    if isinstance(article_range, str):
+        bounds = re.findall(r"\d+", article_range)
+        if len(bounds) != 2:
+            raise ValueError(f"Invalid article range '{article_range}', expected e.g. '1173-2059'")
+        article_range = bounds
+    low, high = (int(bound) for bound in article_range)
+    return min(low, high), max(low, high)
+
+
+def libro_range(libro) -> tuple:
+    """
+    Article range of a Libro of the codice civile, given as "IV", "libro iv" or 4.
+    """
+    name = str(libro).strip().upper().replace("LIBRO", "").strip()
+    name = ROMAN_NUMERALS.get(name, name)
+    if name not in CODICE_CIVILE_LIBRI:
+        raise ValueError(f"Unknown Libro '{libro}', expected one of {list(CODICE_CIVILE_LIBRI)}")
+    return CODICE_CIVILE_LIBRI[name]
+
+
+def is_codice_civile(law_name) -> bool:
+    """
+    Whether a law_name is the codice civile, the only law the "libro" filter applies to.
+    """
+    return isinstance(law_name, str) and " ".join(law_name.lower().split()) in CODICE_CIVILE_NAMES
+
+
+def no_codice_civile_message(laws) -> str:
+    return (f"The libro filter applies to the codice civile only, and none of the laws {list(laws)} is it: "
+            f"set CODICE_CIVILE_LAW_NAME to its law_name (known names: {sorted(CODICE_CIVILE_NAMES)})")
+
+
+def filter_key(filters) -> str:
+    """
+    Canonical text of a filter, usable in cache keys.
+    """
+    return json.dumps(filters, sort_keys=True, ensure_ascii=False, default=list) if filters else ""
+
+
+def select_vector_ids(filters: dict, article_numbers: np.ndarray, law_codes: np.ndarray, laws: list) -> np.ndarray:
+    """
+    Return the vector ids of the chunks matching every condition of a filter.
+
+    Args:
+        filters (dict): Any of
+            - "article_range": (first, last) article, inclusive, or "first-last";
+            - "libro": a Libro of the codice civile ("I" to "VI"); chunks of other laws
+              never match it, and it is an error if no law is the codice civile;
+            - "article_numbers": a list of article numbers;
+            - "law_name": a law name or a list of law names.
+        article_numbers (np.ndarray): Article number of each vector id (-1 if not numeric).
+        law_codes (np.ndarray): Index into laws of each vector id (-1 for unused ids).
+        laws (list): The law names.
+
+    Returns:
+        np.ndarray: Sorted int64 vector ids.
+
+    Raises:
+        ValueError: On unknown filters, or a "libro" filter when none of laws is the
+                    codice civile (see is_codice_civile).
+    """
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filters {sorted(unknown)}, expected some of {list(FILTER_KEYS)}")
+    mask = law_codes >= 0
+    if "article_range" in filters:
+        low, high = parse_article_range(filters["article_range"])
+        mask &= (article_numbers >= low) & (article_numbers <= high)
+    if "libro" in filters:
+        low, high = libro_range(filters["libro"])
+        codice_civile = [code for code, law_name in enumerate(laws) if is_codice_civile(law_name)]
+        if laws and not codice_civile:
+            raise ValueError(no_codice_civile_message(laws))
+        mask &= np.isin(law_codes, codice_civile) & (article_numbers >= low) & (article_numbers <= high)
+    if "article_numbers" in filters:
+        wanted = [article_number_value(number) for number in filters["article_numbers"]]
+        mask &= np.isin(article_numbers, wanted)
+    if "law_name" in filters:
+        names = filters["law_name"]
+        names = [names] if isinstance(names, str) else list(names)
+        mask &= np.isin(law_codes, [laws.index(name) for name in names if name in laws])
+    return np.flatnonzero(mask).astype(np.int64)
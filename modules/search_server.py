@@ -0,0 +1,285 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+from modules.metrics import default_metrics
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+                500: "Internal Server Error", 503: "Service Unavailable"}
+MAX_BODY_BYTES = 1 << 16
+
+
+class Overloaded(Exception):
+    """
+    Raised when the search queue is full; the server answers 503 so clients back off.
+    """
+
+
+def group_by_article(chunks, texts: dict) -> list:
+    """
+    Group retrieved chunks by article, in the order of each article's best chunk.
+
+    Args:
+        chunks (list): Chunk results of query_legal_code, best first.
+        texts (dict): (law_name, article_number) -> full text, as returned by fetch_articles.
+
+    Returns:
+        list: Dictionaries with article_number, law_name, the full text and the matching chunks.
+    """
+    articles = {}
+    for chunk in chunks:
+        metadata = chunk["metadata"]
+        key = (metadata.get("law_name"), metadata.get("article_number"))
+        if key not in articles:
+            articles[key] = {
+                "article_number": metadata.get("article_number"),
+                "law_name": metadata.get("law_name"),
+                "text": texts.get(key),
+                "chunks": [],
+            }
+        articles[key]["chunks"].append(chunk)
+    return list(articles.values())
+
+
+class MicroBatcher:
+    """
+    MicroBatcher collects the queries of concurrent requests for up to max_wait_ms (or
+    until max_batch_size queries are waiting) and answers them together: one encoder
+    pass and one FAISS search through query_legal_code_batch, then one fetch_articles
+    call for the articles of the whole batch.
+
+    The searcher runs on a single background thread, so the event loop keeps accepting
+    requests while a batch is being searched. At most max_pending queries wait; beyond
+    that, submit raises Overloaded.
+    """
+    def __init__(self, searcher, max_batch_size: int = 32, max_wait_ms: float = 5.0, max_pending: int = 256):
+        """
+        Args:
+            searcher: A VectorDB or a ReadOnlyIndex (anything with query_legal_code_batch
+                      and fetch_articles).
+            max_batch_size (int): Maximum number of queries searched together.
+            max_wait_ms (float): How long the first query of a batch waits for others.
+            max_pending (int): Maximum number of queries waiting to be searched.
+        """
+        self.searcher = searcher
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_pending = max_pending
+        self._queue = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._task = None
+        self.batches = 0
+        self.queries = 0
+        self.rejected = 0
+
+    def start(self):
+        """
+        Start the batching loop; call from a running event loop.
+        """
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, query: str, top_k: int) -> list:
+        """
+        Queue a query and wait for its articles.
+
+        Raises:
+            Overloaded: If max_pending queries are already waiting.
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((query, top_k, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise Overloaded()
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Clients that went away while waiting need no answer.
+            batch = [request for request in batch if not request[2].done()]
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(self._executor, self._search, batch)
+            except Exception as e:
+                logging.exception("Search batch failed")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.queries += len(batch)
+            for (_, _, future), articles in zip(batch, results):
+                if not future.done():
+                    future.set_result(articles)
+
+    def _search(self, batch) -> list:
+        # Search every query with the largest top_k of the batch, then cut each to its own.
+        top_k = max(request[1] for request in batch)
+        chunk_lists = self.searcher.query_legal_code_batch([request[0] for request in batch], top_k)
+        chunk_lists = [chunks[:request[1]] for request, chunks in zip(batch, chunk_lists)]
+        texts = self.searcher.fetch_articles({
+            (chunk["metadata"].get("law_name"), chunk["metadata"].get("article_number"))
+            for chunks in chunk_lists for chunk in chunks
+        })
+        return [group_by_article(chunks, texts) for chunks in chunk_lists]
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "rejected": self.rejected,
+        }
+
+
+class SearchServer:
+    """
+    SearchServer is a small asyncio HTTP/1.1 server (standard library only, keep-alive
+    supported) answering legal queries through a MicroBatcher.
+
+    Endpoints:
+        GET  /search?q=...&top_k=10    or    POST /search {"query": ..., "top_k": 10}
+             -> {"query": ..., "articles": [...]}, see group_by_article
+        GET  /health                   -> {"status": "ok"}
+        GET  /stats                    -> batching counters and the searcher's cache_stats()
+        GET  /metrics                  -> stage timings and counters in Prometheus text format
+    """
+    def __init__(self, searcher, host: str = "127.0.0.1", port: int = 8000, max_top_k: int = 50, **batcher_args):
+        """
+        Args:
+            searcher: A VectorDB or a ReadOnlyIndex, with its retriever or encoder loaded.
+            host (str): Interface to listen on.
+            port (int): Port to listen on.
+            max_top_k (int): Largest top_k a request may ask for.
+            batcher_args: max_batch_size, max_wait_ms and max_pending of the MicroBatcher.
+        """
+        self.searcher = searcher
+        self.host = host
+        self.port = port
+        self.max_top_k = max_top_k
+        self.batcher = MicroBatcher(searcher, **batcher_args)
+        self.metrics = getattr(searcher, "metrics", default_metrics)
+
+    async def serve_forever(self):
+        self.batcher.start()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logging.info(f"Search server listening on http://{self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._route(method, target, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and version.strip() == "HTTP/1.1"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, target: str, body: bytes):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok"}
+        if url.path == "/stats":
+            stats = {"batcher": self.batcher.stats()}
+            if hasattr(self.searcher, "cache_stats"):
+                stats["caches"] = self.searcher.cache_stats()
+            return 200, stats
+        if url.path == "/metrics":
+            return 200, self.metrics.to_prometheus()
+        if url.path != "/search":
+            return 404, {"error": f"unknown path {url.path}"}
+
+        try:
+            if method == "POST":
+                request = json.loads(body or b"{}")
+            else:
+                request = {name: values[0] for name, values in parse_qs(url.query).items()}
+                request["query"] = request.pop("q", request.get("query"))
+            query = request.get("query")
+            top_k = int(request.get("top_k", 10))
+        except (TypeError, ValueError, AttributeError):
+            return 400, {"error": "invalid request"}
+        if not query or not isinstance(query, str) or not 1 <= top_k <= self.max_top_k:
+            return 400, {"error": f"a non-empty query and 1 <= top_k <= {self.max_top_k} are required"}
+
+        start = time.perf_counter()
+        try:
+            articles = await self.batcher.submit(query, top_k)
+        except Overloaded:
+            self.metrics.count("requests_rejected")
+            return 503, {"error": "server overloaded, retry later"}
+        except Exception:
+            logging.exception(f"Search failed for query {query!r}")
+            self.metrics.count("requests_failed")
+            return 500, {"error": "search failed"}
+        seconds = time.perf_counter() - start
+        # The whole request as clients see it: queueing, batching, search and article texts.
+        self.metrics.observe("http_search", seconds, 1)
+        return 200, {"query": query, "articles": articles, "took_ms": seconds * 1000}
+
+    @staticmethod
+    async def _respond(writer, status: int, payload, keep_alive: bool):
+        # Text payloads (the Prometheus exposition) are sent as is, anything else as JSON.
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        headers = [
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
@@ -0,0 +1,249 @@
+import heapq
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from haystack.document_stores import FAISSDocumentStore
+from modules.query_cache import EmbeddingCache, embed_queries_cached
+from modules.search_filters import is_codice_civile, no_codice_civile_message
+from modules.vector_db import VectorDB
+
+
+class ShardManager:
+    """
+    ShardManager searches several law codes at once, keeping one VectorDB per law_name
+    (its own SQLite database and FAISS index) listed in a JSON registry.
+
+    A query is encoded once, searched on the selected shards in parallel threads (FAISS
+    releases the GIL while searching) and the hits are merged by score into one top-k.
+    Shards are loaded on first use, each with the VectorDB settings it was registered
+    with, and can be added or removed without touching the others; shards filtered out by
+    law_names are neither loaded nor searched.
+    """
+    def __init__(self,
+                 registry_path: str = os.getenv("SHARD_REGISTRY", "data/shards.json"),
+                 max_workers: int = None,
+                 query_cache_size: int = int(os.getenv("QUERY_CACHE_SIZE", 4096)),
+                 query_cache_path: str = os.getenv("QUERY_CACHE_PATH")):
+        """
+        Args:
+            registry_path (str): JSON file listing the shards, created on the first add_shard.
+            max_workers (int, optional): Threads searching shards; defaults to one per
+                                         registered shard, following add_shard and remove_shard.
+            query_cache_size (int): Number of query embeddings kept in the LRU cache.
+            query_cache_path (str, optional): File the query embedding cache is loaded from and saved to.
+        """
+        self.registry_path = registry_path
+        self.registry = {}
+        if os.path.exists(registry_path):
+            with open(registry_path, encoding="utf-8") as f:
+                self.registry = json.load(f)
+        self.shards = {}  # law_name -> loaded VectorDB
+        self.retriever = None  # shared by every shard, the embedding model is loaded once
+        self.encoder_key = None
+        self.query_embedding_cache = EmbeddingCache(query_cache_size, query_cache_path)
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_size = 0
+        self._executor_lock = threading.Lock()
+
+    @property
+    def law_names(self) -> list:
+        return list(self.registry)
+
+    def _save_registry(self):
+        directory = os.path.dirname(self.registry_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.registry_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.registry, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.registry_path)
+
+    def add_shard(self, law_name: str, sql_path: str, faiss_path: str, index_path: str, vector_db: VectorDB = None,
+                  **settings):
+        """
+        Register (or replace) the shard of a law code.
+
+        Args:
+            law_name (str): The law code the shard holds.
+            sql_path (str): Its SQLite database with the articles.
+            faiss_path (str): SQL URL of its FAISS document store.
+            index_path (str): File its FAISS document store is saved to (VectorDB.save_document_store).
+            vector_db (VectorDB, optional): The shard, if it is already loaded.
+            **settings: VectorDB arguments the shard is loaded with (index_type, nprobe,
+                        cache sizes, reranker_model, ...). Only JSON values are kept in the
+                        registry; objects such as metrics are not.
+        """
+        entry = {"sql_path": sql_path, "faiss_path": faiss_path, "index_path": index_path}
+        settings = {name: value for name, value in settings.items()
+                    if isinstance(value, (str, int, float, bool, type(None)))}
+        if settings:
+            entry["settings"] = settings
+        self.registry[law_name] = entry
+        self._save_registry()
+        self.shards.pop(law_name, None)
+        if vector_db is not None:
+            self._attach(vector_db)
+            self.shards[law_name] = vector_db
+
+    def build_shard(self, law_name: str, json_file_path: str, sql_path: str, faiss_path: str, index_path: str, **vector_db_args):
+        """
+        Index the articles of a law code (see VectorDB.vectorize) and register the shard.
+        """
+        vector_db = VectorDB(sql_path=sql_path, faiss_path=faiss_path, law_name=law_name, **vector_db_args)
+        vector_db.vectorize(json_file_path, index_path)
+        self.add_shard(law_name, sql_path, faiss_path, index_path, vector_db, **vector_db_args)
+
+    def remove_shard(self, law_name: str):
+        """
+        Unregister the shard of a law code. Its files are left on disk.
+        """
+        self.registry.pop(law_name)
+        self._save_registry()
+        shard = self.shards.pop(law_name, None)
+        if shard is not None:
+            shard.close()
+
+    def _attach(self, vector_db: VectorDB):
+        # The first shard loads the embedding model, the others reuse it.
+        if self.retriever is None:
+            if vector_db.retriever is None:
+                vector_db.initialize_retriever()
+            self.retriever = vector_db.retriever
+            self.encoder_key = vector_db.encoder_key
+        else:
+            vector_db.retriever = self.retriever
+
+    def get_shard(self, law_name: str) -> VectorDB:
+        """
+        Return the VectorDB of a law code, loading it on first use.
+        """
+        if law_name not in self.shards:
+            entry = self.registry[law_name]
+            logging.info(f"Loading shard {law_name} from {entry['index_path']}.")
+            vector_db = VectorDB(
+                **entry.get("settings", {}),
+                sql_path=entry["sql_path"],
+                faiss_path=entry["faiss_path"],
+                law_name=law_name,
+                document_store=FAISSDocumentStore.load(entry["index_path"]),
+            )
+            vector_db.initialize_document_store()
+            self._attach(vector_db)
+            self.shards[law_name] = vector_db
+        return self.shards[law_name]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Sized for the shards registered now: a new pool replaces the old one when shards
+        # are added or removed, and searches already submitted to the old one still finish.
+        size = self.max_workers or max(len(self.registry), 1)
+        with self._executor_lock:
+            if self._executor is None or self._executor_size != size:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(max_workers=size)
+                self._executor_size = size
+            return self._executor
+
+    def _select(self, law_names=None) -> list:
+        if law_names is None:
+            return self.law_names
+        unknown = [law_name for law_name in law_names if law_name not in self.registry]
+        if unknown:
+            raise ValueError(f"Unknown law codes {unknown}, registered: {self.law_names}")
+        return list(dict.fromkeys(law_names))
+
+    def query_legal_code_batch(self, queries, top_k=10, law_names=None, filters=None) -> list:
+        """
+        Retrieve the chunks most relevant to each query across the selected law codes.
+
+        Args:
+            queries (list): The query strings.
+            top_k (int): The number of chunks to return per query, over all shards.
+            law_names (list, optional): Law codes to search; all registered ones by default.
+            filters (dict, optional): Filters applied inside each shard's search, see
+                                      VectorDB.search_by_embeddings. A "law_name" filter
+                                      also skips the shards of other laws, and a "libro"
+                                      filter every shard but the codice civile.
+
+        Raises:
+            ValueError: If a "libro" filter is given and no selected shard is the codice civile.
+
+        Returns:
+            list: For each query, up to top_k chunk dictionaries (as VectorDB.query_legal_code
+                  returns them) ordered by score; metadata["law_name"] tells the shard.
+        """
+        if not queries:
+            return []
+        selected = self._select(law_names)
+        if filters and "law_name" in filters:
+            wanted = filters["law_name"]
+            wanted = {wanted} if isinstance(wanted, str) else set(wanted)
+            selected = [law_name for law_name in selected if law_name in wanted]
+        if filters and "libro" in filters:
+            codice_civile = [law_name for law_name in selected if is_codice_civile(law_name)]
+            if selected and not codice_civile:
+                raise ValueError(no_codice_civile_message(selected))
+            selected = codice_civile
+        shards = [self.get_shard(law_name) for law_name in selected]
+        if not shards:
+            return [[] for _ in queries]
+        embeddings = embed_queries_cached(self.retriever, self.query_embedding_cache, self.encoder_key, queries)
+        if len(shards) == 1:
+            per_shard = [shards[0].search_by_embeddings(embeddings, top_k, filters)]
+        else:
+            executor = self._get_executor()
+            futures = [executor.submit(shard.search_by_embeddings, embeddings, top_k, filters) for shard in shards]
+            per_shard = [future.result() for future in futures]
+        results = []
+        for i in range(len(queries)):
+            hits = heapq.nlargest(top_k, (hit for shard_hits in per_shard for hit in shard_hits[i]),
+                                  key=lambda hit: hit.score)
+            results.append([VectorDB._to_response(hit) for hit in hits])
+        return results
+
+    def query_legal_code(self, query, top_k=10, law_names=None, filters=None) -> list:
+        """
+        Retrieve the chunks most relevant to the query across the selected law codes.
+        """
+        return self.query_legal_code_batch([query], top_k, law_names, filters)[0]
+
+    def fetch_articles(self, keys) -> dict:
+        """
+        Retrieve the full text of articles of several law codes, one round trip per shard.
+
+        Args:
+            keys (iterable): (law_name, article_number) pairs.
+
+        Returns:
+            dict: (law_name, article_number) -> text, or None if the article is not found.
+        """
+        by_law = {}
+        for law_name, article_number in keys:
+            by_law.setdefault(law_name, []).append(article_number)
+        texts = {}
+        for law_name, article_numbers in by_law.items():
+            if law_name not in self.registry:
+                texts.update({(law_name, number): None for number in article_numbers})
+                continue
+            texts.update(self.get_shard(law_name).fetch_articles([(law_name, number) for number in article_numbers]))
+        return texts
+
+    def save_query_cache(self):
+        """
+        Persist the query embedding cache to query_cache_path, if one is configured.
+        """
+        self.query_embedding_cache.save()
+
+    def close(self):
+        """
+        Stop the search threads and close the SQLite connections of the calling thread.
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        for shard in self.shards.values():
+            shard.close()
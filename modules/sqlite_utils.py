@@ -0,0 +1,106 @@
+import sqlite3
+from modules.metrics import default_metrics
+
+# Bound parameters per statement, below SQLite's limit (999 before SQLite 3.32).
+MAX_SQL_PARAMETERS = 500
+
+
+def execute_in_batches(conn, sql: str, values, params=()):
+    """
+    Run a query with an IN list of any length, in as many statements as needed to stay
+    within MAX_SQL_PARAMETERS bound parameters.
+
+    Args:
+        conn (sqlite3.Connection): The connection to run the query on.
+        sql (str): The query, with "{placeholders}" where the IN list goes, e.g.
+                   "SELECT text FROM articles WHERE law_name = ? AND article_number IN ({placeholders})".
+        values (iterable): The values of the IN list.
+        params (tuple): The other parameters of the query, bound before the IN list.
+
+    Yields:
+        tuple: The rows of every statement.
+    """
+    values = list(values)
+    batch_size = MAX_SQL_PARAMETERS - len(params)
+    for start in range(0, len(values), batch_size):
+        batch = values[start:start + batch_size]
+        yield from conn.execute(sql.format(placeholders=",".join("?" * len(batch))), [*params, *batch])
+
+
+def article_key(article_number):
+    """
+    Article number as stored in SQLite: chunk metadata carries article numbers as strings
+    ("7"), the articles table as integers.
+    """
+    try:
+        return int(article_number)
+    except (TypeError, ValueError):
+        return article_number
+
+
+def fetch_articles(connect, cache, keys, default_law=None, namespace=None, metrics=None) -> dict:
+    """
+    Retrieve the full text of several articles from the articles table, serving recently
+    fetched ones from an LRU cache and resolving the others with an indexed
+    "law_name = ? AND article_number IN (...)" query per law.
+
+    Args:
+        connect (callable): Returns the connection to query; only called on cache misses.
+        cache (LRUCache): (namespace, law_name, article_number) -> text.
+        keys (iterable): (law_name, article_number) pairs to look up. A bare article number
+                         stands for (default_law, number).
+        default_law (str, optional): The law of bare article numbers; they are rejected
+                                     without one.
+        namespace (optional): Told apart in the cache keys, e.g. the database path.
+        metrics (Metrics, optional): Where cache hits and the fetch are recorded; defaults
+                                     to modules.metrics.default_metrics.
+
+    Returns:
+        dict: Mapping from each requested key (as given) to its text, or None if the
+              article is not in the database.
+    """
+    metrics = metrics or default_metrics
+    requested = {}  # key as given -> (law_name, normalized article number)
+    for key in keys:
+        if isinstance(key, tuple):
+            law_name, number = key
+        elif default_law is not None:
+            law_name, number = default_law, key
+        else:
+            raise ValueError(f"No default law for article {key!r}, look articles up by (law_name, article_number)")
+        requested.setdefault(key, (law_name, article_key(number)))
+    texts = {}
+    missing = []
+    for key, article in requested.items():
+        text = cache.get((namespace, *article))
+        if text is None:
+            missing.append(key)
+        else:
+            texts[key] = text
+    metrics.count("article_cache_hits", len(requested) - len(missing))
+    if not missing:
+        return texts
+
+    by_law = {}
+    for key in missing:
+        law_name, number = requested[key]
+        by_law.setdefault(law_name, set()).add(number)
+    found = {}
+    try:
+        with metrics.stage("fetch_articles", sum(len(numbers) for numbers in by_law.values())):
+            conn = connect()
+            for law_name, numbers in by_law.items():
+                rows = execute_in_batches(
+                    conn,
+                    "SELECT article_number, text FROM articles WHERE law_name = ? AND article_number IN ({placeholders})",
+                    numbers, (law_name,)
+                )
+                found.update(((law_name, number), text) for number, text in rows)
+    except sqlite3.Error as e:
+        print(f"SQLite error: {e}")
+    for key in missing:
+        article = requested[key]
+        texts[key] = found.get(article)
+        if article in found:
+            cache.put((namespace, *article), found[article])
+    return texts
@@ -3,12 +3,127 @@ from haystack.document_stores import FAISSDocumentStore # to manage and store th
 from dotenv import load_dotenv
 import json # imported to handle the JSON file with the articles
 import sqlite3 # imported to manage the simple SQLite database
+import copy
 import logging
 import os
+import random
+import threading
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import numpy as np
+from modules.ann_index import filtered_search, resolve_factory_string, set_search_params
+from modules.article_io import iter_articles_file
+from modules.chunk_index import ChunkIndex, content_hash
+from modules.lexical_index import LexicalIndex, find_article_references, is_reference_query, reciprocal_rank_fusion
+from modules.metrics import Metrics, default_metrics
+from modules.parallel import default_workers, iter_results_in_order
+from modules.query_cache import EmbeddingCache, LRUCache, embed_queries_cached, normalize_query
+from modules.read_only_index import export_read_only_index
+from modules.search_filters import article_number_value, filter_key, select_vector_ids
+from modules.sqlite_utils import article_key, execute_in_batches, fetch_articles
 logging.basicConfig(level=logging.INFO)
 
 load_dotenv()  # This will read the .env file and set the environment variables accordingly.
 
+EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+
+def build_preprocessor(split_length: int, split_overlap: int) -> PreProcessor:
+    """
+    Create the text preprocessor that splits articles into chunks of split_length tokens.
+    """
+    return PreProcessor(
+        split_by="token",
+        split_length=split_length,  # Each chunk is ~200 tokens
+        split_overlap=split_overlap,  # Keep 20 tokens overlapping for context retention
+        clean_whitespace=True
+    )
+
+
+def chunk_articles(preprocessor, articles, law_name: str) -> list:
+    """
+    Split a batch of articles into chunks with a single PreProcessor call.
+
+    The chunks carry exactly the metadata produced by processing the articles one at a
+    time: article_number, law_name and chunk_number (numbered from 1 within each article).
+
+    Args:
+        preprocessor (PreProcessor): The preprocessor to split with.
+        articles (list): Dictionaries with "article_number" and "text".
+        law_name (str): Law the articles belong to.
+
+    Returns:
+        list: The chunks of all the articles, in article order.
+    """
+    chunks = preprocessor.process([
+        {
+            "content": article["text"],
+            # _article_index tells which article a chunk comes from; it is removed below.
+            "meta": {"article_number": article["article_number"], "law_name": law_name, "_article_index": i},
+        }
+        for i, article in enumerate(articles)
+    ])
+    chunk_counts = {}
+    for chunk in chunks:
+        article_index = chunk.meta.pop("_article_index")
+        chunk_counts[article_index] = chunk_counts.get(article_index, 0) + 1
+        chunk.meta["chunk_number"] = chunk_counts[article_index]  # Starts numbering at 1
+    return chunks
+
+
+# Preprocessor of a chunking worker process, created once by _init_chunk_worker.
+_worker_preprocessor = None
+
+
+def _init_chunk_worker(split_length: int, split_overlap: int):
+    global _worker_preprocessor
+    _worker_preprocessor = build_preprocessor(split_length, split_overlap)
+
+
+def _chunk_articles_in_worker(articles, law_name: str) -> list:
+    return chunk_articles(_worker_preprocessor, articles, law_name)
+
+
+def reservoir_sample(items, size: int, seed: int = 0) -> list:
+    """
+    Draw a uniform random sample of up to size items from a stream of unknown length in
+    one pass (reservoir sampling). Chunks come in article order, so taking the first ones
+    would cover the first books of the code only.
+
+    Args:
+        items (iterable): The stream to sample.
+        size (int): The number of items to keep.
+        seed (int): Seed of the random generator, so that builds are reproducible.
+
+    Returns:
+        list: The sampled items.
+    """
+    rng = random.Random(seed)
+    sample = []
+    for seen, item in enumerate(items):
+        if len(sample) < size:
+            sample.append(item)
+        else:
+            slot = rng.randint(0, seen)
+            if slot < size:
+                sample[slot] = item
+    return sample
+
+
+class _ResolvingEncoder:
+    """
+    Encoder restoring the text of compact chunks before embedding them, for document
+    store methods that read chunks back from the store (update_embeddings).
+    """
+    def __init__(self, encoder, resolve_documents):
+        self.encoder = encoder
+        self.resolve_documents = resolve_documents
+
+    def embed_documents(self, documents):
+        self.resolve_documents(documents)
+        return self.encoder.embed_documents(documents)
+
 class VectorDB:
     """
     VectorDB is a class that manages a vector-based document store using SQLite for
@@ -19,8 +134,33 @@ class VectorDB:
                  faiss_path: str = os.getenv("FAISS_PATH", "sqlite:///data/document_store.db"), # connection string for the FAISS document store, if not found it uses the default value of "sqlite:///document_store.db"
                  split_length: int = int(os.getenv("SPLIT_LENGTH", 200)),
                  split_overlap: int = int(os.getenv("SPLIT_OVERLAP", 20)),
-                 law_name: str = os.getenv("LAW_NAME", "Example Legal Code"),
-                 document_store = None):
+                 law_name: str = os.getenv("LAW_NAME", "Example Legal Code"), # for the codice civile, "Codice Civile" or the CODICE_CIVILE_LAW_NAME variable's value
+                 document_store = None,
+                 article_cache_size: int = int(os.getenv("ARTICLE_CACHE_SIZE", 1024)),
+                 index_type: str = os.getenv("INDEX_TYPE", "flat"), # "flat", "hnsw", "ivf_flat", "ivf_sq8", "ivf_pq" or a FAISS factory string
+                 embedding_dim: int = int(os.getenv("EMBEDDING_DIM", 384)),
+                 nlist: int = int(os.getenv("IVF_NLIST", 256)),
+                 nprobe: int = int(os.getenv("IVF_NPROBE", 16)),
+                 ef_search: int = int(os.getenv("HNSW_EF_SEARCH", 64)),
+                 train_sample_size: int = int(os.getenv("TRAIN_SAMPLE_SIZE", 20000)),
+                 query_cache_size: int = int(os.getenv("QUERY_CACHE_SIZE", 4096)),
+                 query_cache_path: str = os.getenv("QUERY_CACHE_PATH"), # .npz file to persist query embeddings across restarts
+                 result_cache_size: int = int(os.getenv("RESULT_CACHE_SIZE", 1024)),
+                 chunk_workers: int = int(os.getenv("CHUNK_WORKERS", 0)), # 0 means one per CPU core
+                 chunk_batch_size: int = int(os.getenv("CHUNK_BATCH_SIZE", 256)),
+                 write_batch_size: int = int(os.getenv("WRITE_BATCH_SIZE", 2000)),
+                 encoder_backend: str = os.getenv("ENCODER_BACKEND", "dpr"), # "dpr" (haystack, PyTorch) or "onnx" (ONNX Runtime)
+                 encoder_quantize: bool = os.getenv("ENCODER_QUANTIZE", "false").lower() == "true",
+                 encoder_threads: int = int(os.getenv("ENCODER_THREADS", 0)), # 0 lets ONNX Runtime decide
+                 hybrid_candidates: int = int(os.getenv("HYBRID_CANDIDATES", 50)),
+                 rrf_k: int = int(os.getenv("RRF_K", 60)),
+                 filter_brute_force_max: int = int(os.getenv("FILTER_BRUTE_FORCE_MAX", 4096)),
+                 article_overfetch: int = int(os.getenv("ARTICLE_OVERFETCH", 3)),
+                 refine_k_factor: float = float(os.getenv("REFINE_K_FACTOR", 4)),
+                 return_embedding: bool = os.getenv("RETURN_EMBEDDING", "false").lower() == "true",
+                 compact_chunks: bool = os.getenv("COMPACT_CHUNKS", "false").lower() == "true",
+                 reranker_model: str = os.getenv("RERANKER_MODEL"), # cross-encoder reranking query results, off when unset
+                 metrics: Metrics = None):
         
         """
         Initialize the VectorDB instance with database paths.
@@ -28,7 +168,44 @@ class VectorDB:
         Args:
             db_path (str): Path to the SQLite database file.
             faiss_path (str): SQL URL for the FAISS document store.
+            law_name (str): Name the ingested articles are stored under. "libro" filters only
+                            match the codice civile: index it as "Codice Civile" (or another
+                            name of modules.search_filters.CODICE_CIVILE_NAMES), or set the
+                            CODICE_CIVILE_LAW_NAME environment variable to the law_name used.
              document_store (FAISSDocumentStore, optional): An existing FAISS document store.
+            article_cache_size (int): Number of full article texts kept in the in-memory LRU cache.
+            index_type (str): FAISS index type, see modules.ann_index.INDEX_PRESETS.
+            embedding_dim (int): Output dimension of the embedding model.
+            nlist (int): Number of cells of IVF indexes.
+            nprobe (int): Number of IVF cells visited per query.
+            ef_search (int): Size of the HNSW candidate list at query time.
+            train_sample_size (int): Number of chunks embedded to train IVF/PQ indexes.
+            query_cache_size (int): Number of query embeddings kept in the LRU cache (0 disables it).
+            query_cache_path (str, optional): File the query embedding cache is loaded from and saved to.
+            result_cache_size (int): Number of top-k result lists kept in the LRU cache (0 disables it).
+            chunk_workers (int): Processes used to split articles into chunks (0: one per core, 1: no pool).
+            chunk_batch_size (int): Articles split per preprocessor call.
+            write_batch_size (int): Chunks written to the document store at a time.
+            encoder_backend (str): "dpr" to embed with haystack's DensePassageRetriever, "onnx"
+                                   to embed with modules.encoders.OnnxEncoder.
+            encoder_quantize (bool): With the "onnx" backend, use int8 quantized weights.
+            encoder_threads (int): With the "onnx" backend, number of intra-op threads.
+            hybrid_candidates (int): Candidates taken from each retriever before fusing them in search_articles.
+            rrf_k (int): Damping constant of reciprocal rank fusion.
+            filter_brute_force_max (int): Filtered searches allowing at most this many chunks
+                                          are exact searches over just those chunks.
+            article_overfetch (int): Chunks first searched per requested article by query_articles.
+            refine_k_factor (float): With the "sq8_refine" and "ivf_pq_refine" index types,
+                                     candidates rescored on the finer vectors per hit.
+            return_embedding (bool): Load the embedding of every retrieved chunk. Searches never
+                                     need it, and FAISS decodes each one from the index.
+            compact_chunks (bool): Store chunk texts as their position in the articles table
+                                   instead of a copy of the text (see compact_documents).
+            reranker_model (str, optional): Cross-encoder reranking the chunks of
+                                            query_legal_code (see modules.reranker); the
+                                            dense order is kept when unset.
+            metrics (Metrics, optional): Where stage timings and counters are recorded;
+                                         defaults to modules.metrics.default_metrics.
         """
         
         self.sql_path = sql_path # location for the sqlite database file
@@ -39,24 +216,92 @@ class VectorDB:
         self.document_store = document_store # Optionally an existing FAISS document store
         self.preprocessor = None 
         self.retriever = None
+        self.article_cache_size = article_cache_size
+        self._article_cache = LRUCache(article_cache_size)  # (sql_path, law_name, article_number) -> text
+        self._article_text_cache = LRUCache(article_cache_size)  # articles.id -> text, for compact chunks
+        self._local = threading.local()  # per-thread SQLite connections, keyed by database path
+        self.index_type = index_type
+        self.embedding_dim = embedding_dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.train_sample_size = train_sample_size
+        self.query_embedding_model = EMBEDDING_MODEL
+        self.query_embedding_cache = EmbeddingCache(query_cache_size, query_cache_path)
+        self.result_cache = LRUCache(result_cache_size)
+        self.index_version = 0  # bumped whenever the indexed documents or embeddings change
+        self.chunk_index = None
+        self.chunk_workers = chunk_workers or default_workers()
+        self.chunk_batch_size = chunk_batch_size
+        self.write_batch_size = write_batch_size
+        self.encoder_backend = encoder_backend
+        self.encoder_quantize = encoder_quantize
+        self.encoder_threads = encoder_threads
+        self.hybrid_candidates = hybrid_candidates
+        self.rrf_k = rrf_k
+        self.lexical_index = None
+        self.filter_brute_force_max = filter_brute_force_max
+        self._vector_metadata = None  # (article numbers, law codes, law names) per vector id
+        self.article_overfetch = article_overfetch
+        self.refine_k_factor = refine_k_factor
+        self.return_embedding = return_embedding
+        self.compact_chunks = compact_chunks
+        self.reranker_model = reranker_model
+        self.reranker = None
+        self.metrics = metrics or default_metrics
+
+    def _apply_pragmas(self, conn):
+        """
+        Tune a SQLite connection for bulk loading: write-ahead logging (readers are not
+        blocked by the writer), fewer fsyncs, and temporary data and a larger page cache in memory.
+        """
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")  # 64 MB
 
     def initialize_sqlite(self):
 
         """
         Connect to SQLite, and create the articles table if it does not exist.
+
+        Articles are unique per (law_name, article_number). Tables created before the
+        law_name column existed are migrated: the column is added and filled with this
+        instance's law_name, and duplicated articles are collapsed to their latest version.
         """
 
         try:
             with sqlite3.connect(self.sql_path) as conn:
+                self._apply_pragmas(conn)
                 cursor = conn.cursor()
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS articles (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         article_number INTEGER,
-                        text TEXT
+                        text TEXT,
+                        law_name TEXT
                     )
                 """)
+                columns = [row[1] for row in cursor.execute("PRAGMA table_info(articles)")]
+                if "law_name" not in columns:
+                    cursor.execute("ALTER TABLE articles ADD COLUMN law_name TEXT")
+                cursor.execute("UPDATE articles SET law_name = ? WHERE law_name IS NULL", (self.law_name,))
+                cursor.execute("""
+                    DELETE FROM articles WHERE id NOT IN (
+                        SELECT MAX(id) FROM articles GROUP BY law_name, article_number
+                    )
+                """)
+                cursor.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_articles_law_article
+                    ON articles (law_name, article_number)
+                """)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_articles_article_number
+                    ON articles (article_number)
+                """)
                 conn.commit()  # Explicit commit if needed
+            # Created after the table, so that its triggers index every article loaded from now on.
+            self.lexical_index = LexicalIndex(self.sql_path)
         except sqlite3.Error as e:
             # Handle or log the error as needed
             print(f"SQLite error: {e}")
@@ -68,81 +313,224 @@ class VectorDB:
         if self.document_store is None:
             self.document_store = FAISSDocumentStore(
                 sql_url=self.faiss_path,  
-                faiss_index_factory_str="Flat",  # use a flat (brute-force) index
-                return_embedding=True,
-                embedding_dim=384  # Set this to match your model's output dimension
+                faiss_index_factory_str=resolve_factory_string(self.index_type, nlist=self.nlist),
+                return_embedding=self.return_embedding,
+                embedding_dim=self.embedding_dim  # Set this to match your model's output dimension
             )
         else:
             logging.info("Document store already initialized.")
+            # Stores saved before return_embedding was configurable load with it on.
+            self.document_store.return_embedding = self.return_embedding
+        self.configure_search()
+
+    def _faiss_index(self):
+        """
+        Return the raw FAISS index behind the document store.
+        """
+        return self.document_store.faiss_indexes[self.document_store.index]
+
+    def configure_search(self, nprobe=None, ef_search=None, k_factor=None):
+        """
+        Set the query-time accuracy/speed trade-off of the FAISS index. Only the parameters
+        matching the index type are used (nprobe for IVF, ef_search for HNSW, k_factor for Refine).
+
+        Args:
+            nprobe (int, optional): IVF cells visited per query; defaults to self.nprobe.
+            ef_search (int, optional): HNSW candidate list size; defaults to self.ef_search.
+            k_factor (float, optional): Candidates rescored per hit; defaults to self.refine_k_factor.
+        """
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        if k_factor is not None:
+            self.refine_k_factor = k_factor
+        set_search_params(self._faiss_index(), nprobe=self.nprobe, ef_search=self.ef_search, k_factor=self.refine_k_factor)
+
+    def train_index(self):
+        """
+        Train the FAISS index on a random sample of the stored chunks if its type requires
+        training (IVF, PQ, SQ). Does nothing for Flat and HNSW indexes or if the index is
+        already trained.
+        """
+        if self._faiss_index().is_trained:
+            return
+
+        documents = self.document_store.get_all_documents_generator(return_embedding=False)
+        sample = reservoir_sample(documents, self.train_sample_size)
+
+        logging.info(f"Training the {self.index_type} index on {len(sample)} chunks.")
+        self.resolve_documents(sample)
+        embeddings = np.asarray(self.retriever.embed_documents(sample), dtype=np.float32)
+        self.document_store.train_index(embeddings=embeddings)
 
     def initialize_preprocessor(self):
         """
         Initialize the text preprocessor to split articles into chunks (around 200 tokens each).
         """
-        self.preprocessor = PreProcessor(
-            split_by="token",
-            split_length=self.split_length,  # Each chunk is ~200 tokens
-            split_overlap=self.split_overlap,  # Keep 20 tokens overlapping for context retention
-            clean_whitespace=True
-        )
+        self.preprocessor = build_preprocessor(self.split_length, self.split_overlap)
+
+    def _upsert_articles(self, conn, articles) -> int:
+        """
+        Upsert articles with an open connection, without committing.
+
+        Returns:
+            int: The number of articles written.
+        """
+        count = 0
+
+        def rows():
+            nonlocal count
+            for article in articles:
+                count += 1
+                yield (self.law_name, article.get("article_number"), article.get("text"))
+
+        # executemany consumes the generator lazily, inside the connection's implicit transaction.
+        conn.executemany("""
+            INSERT INTO articles (law_name, article_number, text) VALUES (?, ?, ?)
+            ON CONFLICT (law_name, article_number) DO UPDATE SET text = excluded.text
+        """, rows())
+        return count
+
+    def populate_sqlite(self, articles) -> int:
+        """
+        Insert or update articles in the SQLite database in a single transaction.
+
+        Articles are upserted on (law_name, article_number), so loading the same articles
+        again updates their text instead of duplicating them.
+
+        Args:
+            articles (iterable): Dictionaries with "article_number" and "text". Any iterable
+                                 works, so articles can be streamed from disk.
+
+        Returns:
+            int: The number of articles written.
+        """
+        with self.metrics.stage("populate_sqlite") as stage, closing(sqlite3.connect(self.sql_path)) as conn:
+            self._apply_pragmas(conn)
+            stage.items = self._upsert_articles(conn, articles)
+            conn.commit()
+        self.clear_article_cache()
+        return stage.items
+
     def populate_sqlite_from_json(self, json_file_path: str):
         """
-        Read articles from a JSON file and insert them into the SQLite database.
+        Read articles from a JSON or JSON Lines file and insert them into the SQLite database.
+
+        The file is streamed, so it is never held in memory as a whole.
         
         Args:
-            json_file_path (str): Path to the JSON file containing articles.
+            json_file_path (str): Path to the file containing articles (see iter_articles_file).
         """
         try:
-            # Open and load the JSON file
-            with open(json_file_path, "r", encoding="utf-8") as f:
-                articles = json.load(f)
-            
-            # Connect to SQLite and insert articles
-            with sqlite3.connect(self.sql_path) as conn:
-                cursor = conn.cursor()
-                for article in articles:
-                    cursor.execute(
-                        "INSERT INTO articles (article_number, text) VALUES (?, ?)",
-                        (article.get("article_number"), article.get("text"))
-                    )
-                conn.commit()
-            print("Articles have been successfully inserted into the SQLite database.")
+            count = self.populate_sqlite(iter_articles_file(json_file_path))
+            print(f"{count} articles have been successfully inserted into the SQLite database.")
         except Exception as e:
             print(f"An error occurred while populating the SQLite DB: {e}")
       
       
-    def preprocess_articles(self, json_file_path: str):
+    def iter_loaded_articles(self, articles):
+        """
+        Pass a stream of articles through, upserting them into SQLite on the way in
+        batches of chunk_batch_size, so a single read of the articles file feeds both
+        SQLite and the chunker.
+
+        The whole stream is loaded through one connection in one transaction, committed
+        when the stream ends (or its consumer stops early) and then closed. While the
+        stream runs, the connection stands in for this thread's own (see _get_connection):
+        every article is visible there before it is yielded, so its chunks can be located
+        in it (compact_chunks) as soon as they exist.
+
+        Args:
+            articles (iterable): Dictionaries with "article_number" and "text".
+
+        Yields:
+            dict: The same articles, in order.
+        """
+        articles = iter(articles)
+        count = 0
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        previous = connections.get(self.sql_path)
+        conn = connections[self.sql_path] = sqlite3.connect(self.sql_path)
+        try:
+            self._apply_pragmas(conn)
+            for batch in iter(lambda: list(islice(articles, self.chunk_batch_size)), []):
+                with self.metrics.stage("populate_sqlite", len(batch)):
+                    count += self._upsert_articles(conn, batch)
+                yield from batch
+        finally:
+            conn.commit()
+            conn.close()
+            if previous is None:
+                connections.pop(self.sql_path, None)
+            else:
+                connections[self.sql_path] = previous
+            self.clear_article_cache()
+        print(f"{count} articles have been successfully inserted into the SQLite database.")
+
+    def iter_chunk_batches(self, articles):
+        """
+        Split a stream of articles into chunks, chunk_batch_size articles per preprocessor
+        call, on a pool of chunk_workers processes.
+
+        Batches are yielded in article order and at most two batches per worker are in
+        flight, so memory stays flat however many articles are streamed in.
+
+        Args:
+            articles (iterable): Dictionaries with "article_number" and "text".
+
+        Yields:
+            list: The chunks of each batch of articles.
+        """
+        articles = iter(articles)
+        batches = iter(lambda: list(islice(articles, self.chunk_batch_size)), [])
+
+        if self.chunk_workers == 1:
+            if self.preprocessor is None:
+                self.initialize_preprocessor()
+            for batch in batches:
+                yield chunk_articles(self.preprocessor, batch, self.law_name)
+            return
+
+        executor = ProcessPoolExecutor(
+            max_workers=self.chunk_workers,
+            initializer=_init_chunk_worker,
+            initargs=(self.split_length, self.split_overlap),
+        )
+        try:
+            futures = (executor.submit(_chunk_articles_in_worker, batch, self.law_name) for batch in batches)
+            yield from iter_results_in_order(futures, max_pending=2 * self.chunk_workers)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def preprocess_articles(self, json_file_path: str, load_sqlite: bool = False):
         """
         Preprocess the articles by reading from a JSON file and splitting them into smaller text chunks using the preprocessor.
 
-        The JSON file should contain a list of dictionaries, each with keys "article_number" and "text".
+        The file should hold dictionaries with keys "article_number" and "text", either as
+        a JSON array or one per line (.jsonl), see iter_articles_file.
 
         Args:
-            json_file_path (str): Path to the JSON file with the articles.
+            json_file_path (str): Path to the file with the articles.
+            load_sqlite (bool): Also upsert the articles into SQLite while they are read,
+                                instead of a separate populate_sqlite_from_json pass.
         
         Returns:
             list: List of processed document chunks with metadata.
         """
         try:
-            # Open and load the JSON file containing the articles
-            with open(json_file_path, "r", encoding="utf-8") as file:
-                articles = json.load(file)
-        except Exception as e:
+            articles = iter_articles_file(json_file_path)
+            if load_sqlite:
+                articles = self.iter_loaded_articles(articles)
+            with self.metrics.stage("preprocess_articles") as stage:
+                chunks = [chunk for batch in self.iter_chunk_batches(articles) for chunk in batch]
+                stage.items = len(chunks)
+            return chunks
+        except (OSError, ValueError) as e:
             raise Exception(f"Error reading JSON file: {e}")
 
-        split_documents = []
-        for article in articles:
-            # Process each article by splitting the text into chunks
-            chunks = self.preprocessor.process([{
-                "content": article["text"],
-                "meta": {"article_number": article["article_number"], "law_name": self.law_name}
-            }])
-            # Add chunk numbering to metadata and append each chunk to the list
-            for i, chunk in enumerate(chunks):
-                chunk.meta["chunk_number"] = i + 1  # Starts numbering at 1
-                split_documents.append(chunk)
-        return split_documents
-
     def write_documents(self, documents):
         
         """
@@ -152,20 +540,172 @@ class VectorDB:
             documents (list): List of document chunks to write.
         """
 
-        self.document_store.write_documents(documents)
+        with self.metrics.stage("write_documents", len(documents)):
+            if self.compact_chunks:
+                self.compact_documents(documents)
+            self.document_store.write_documents(documents)
+        self._index_changed()
+
+    def _text_spans(self, documents) -> list:
+        """
+        Locate each chunk in the text of its article in SQLite.
+
+        Returns:
+            list: For each chunk, "article_id:start:end" (character offsets in the article
+                  text), or None if the chunk is not a verbatim slice of its article.
+        """
+        wanted = {}
+        for doc in documents:
+            wanted.setdefault(doc.meta.get("law_name"), set()).add(article_key(doc.meta.get("article_number")))
+        articles = {}
+        try:
+            conn = self._get_connection()
+            for law_name, numbers in wanted.items():
+                for article_id, number, text in execute_in_batches(
+                    conn,
+                    "SELECT id, article_number, text FROM articles WHERE law_name = ? AND article_number IN ({placeholders})",
+                    numbers, (law_name,)
+                ):
+                    articles[(law_name, number)] = (article_id, text or "")
+        except sqlite3.Error as e:
+            print(f"SQLite error: {e}")
+
+        spans = [None] * len(documents)
+        # Chunks overlap, so each chunk is searched from just after the start of the previous one.
+        cursors = {}
+        order = sorted(range(len(documents)), key=lambda i: int(documents[i].meta.get("chunk_number") or 0))
+        for i in order:
+            doc = documents[i]
+            key = (doc.meta.get("law_name"), article_key(doc.meta.get("article_number")))
+            if key not in articles or not doc.content:
+                continue
+            article_id, text = articles[key]
+            start = text.find(doc.content, cursors.get(key, 0))
+            if start < 0:
+                continue
+            spans[i] = f"{article_id}:{start}:{start + len(doc.content)}"
+            cursors[key] = start + 1
+        return spans
+
+    def compact_documents(self, documents, spans=None) -> int:
+        """
+        Replace the text of chunks by their position in the articles table, so the document
+        store does not keep a second copy of every article.
+
+        The text of a compacted chunk is emptied and meta["text_span"] holds
+        "article_id:start:end"; resolve_documents restores it. The preprocessor's _split_*
+        bookkeeping is dropped as well: the SQL store keeps one row per metadata field and
+        chunk, which adds up to more than short chunk texts. Chunks that are not verbatim
+        slices of their article keep their text. The articles must be in SQLite already, and
+        ids must be set before, since the default ids are derived from the text.
+
+        Args:
+            documents (list): The chunks, modified in place.
+            spans (list, optional): Spans computed by _text_spans for these chunks.
+
+        Returns:
+            int: The number of chunks compacted.
+        """
+        if spans is None:
+            spans = self._text_spans(documents)
+        compacted = 0
+        for doc, span in zip(documents, spans):
+            if span is not None:
+                for name in ("_split_id", "_split_overlap"):
+                    doc.meta.pop(name, None)
+                doc.meta["text_span"] = span
+                doc.content = ""
+                compacted += 1
+        logging.info(f"Compacted {compacted} of {len(documents)} chunks into article offsets.")
+        return compacted
+
+    def resolve_documents(self, documents):
+        """
+        Restore in place the text of compact chunks (see compact_documents), reading all
+        the articles they come from in one SQLite query.
+
+        Args:
+            documents (list): Documents read from the document store.
+        """
+        spans = {}
+        for doc in documents:
+            span = doc.meta.get("text_span")
+            if span and not doc.content:
+                article_id, start, end = (int(part) for part in span.split(":"))
+                spans[id(doc)] = (article_id, start, end)
+        if not spans:
+            return
+
+        texts = {}
+        missing = []
+        for article_id in {span[0] for span in spans.values()}:
+            text = self._article_text_cache.get(article_id)
+            if text is None:
+                missing.append(article_id)
+            else:
+                texts[article_id] = text
+        try:
+            conn = self._get_connection()
+            for article_id, text in execute_in_batches(conn, "SELECT id, text FROM articles WHERE id IN ({placeholders})", missing):
+                texts[article_id] = text or ""
+                self._article_text_cache.put(article_id, texts[article_id])
+        except sqlite3.Error as e:
+            print(f"SQLite error: {e}")
+
+        for doc in documents:
+            if id(doc) in spans:
+                article_id, start, end = spans[id(doc)]
+                doc.content = texts.get(article_id, "")[start:end]
+
+    def _index_changed(self):
+        """
+        Record that the content of the index changed, so cached results are not served anymore.
+        """
+        self.index_version += 1
+        self.result_cache.clear()
+        self._vector_metadata = None
 
     def initialize_retriever(self):
         
         """
-        Initialize the Dense Passage Retriever used for querying the document store.
+        Initialize the encoder used to embed queries and chunks: the Dense Passage Retriever,
+        or an OnnxEncoder of the same model when encoder_backend is "onnx".
         """
 
-        self.retriever = DensePassageRetriever(
-            document_store=self.document_store,
-            query_embedding_model="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-            passage_embedding_model="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-            use_gpu=False  # Set to True if you have a GPU
+        if self.encoder_backend == "onnx":
+            from modules.encoders import OnnxEncoder  # needs onnxruntime, only imported when used
+            self.retriever = OnnxEncoder(
+                EMBEDDING_MODEL,
+                quantize=self.encoder_quantize,
+                num_threads=self.encoder_threads
             )
+        elif self.encoder_backend == "dpr":
+            self.retriever = DensePassageRetriever(
+                document_store=self.document_store,
+                query_embedding_model=self.query_embedding_model,
+                passage_embedding_model=EMBEDDING_MODEL,
+                use_gpu=False  # Set to True if you have a GPU
+                )
+        else:
+            raise ValueError(f"Unknown encoder backend '{self.encoder_backend}', use 'dpr' or 'onnx'")
+
+    def initialize_reranker(self):
+        """
+        Load the cross-encoder reranker of reranker_model (modules.reranker.CrossEncoderReranker),
+        or of modules.reranker.RERANKER_MODEL when reranking is asked for without one.
+        """
+        from modules.reranker import CrossEncoderReranker, RERANKER_MODEL  # loads PyTorch, only imported when used
+        self.reranker = CrossEncoderReranker(self.reranker_model or RERANKER_MODEL, metrics=self.metrics)
+
+    @property
+    def encoder_key(self) -> str:
+        """
+        Name of the model and backend computing the embeddings. Cached embeddings are stored
+        under this name, since the ONNX (and int8) backends give slightly different vectors.
+        """
+        if self.encoder_backend == "dpr":
+            return EMBEDDING_MODEL
+        return f"{EMBEDDING_MODEL}|{self.encoder_backend}{'-int8' if self.encoder_quantize else ''}"
 
     def update_embeddings(self):
         
@@ -173,7 +713,10 @@ class VectorDB:
         Update the document store with embeddings computed by the retriever.
         """
 
-        self.document_store.update_embeddings(self.retriever)
+        encoder = _ResolvingEncoder(self.retriever, self.resolve_documents) if self.compact_chunks else self.retriever
+        with self.metrics.stage("update_embeddings", self.document_store.get_document_count()):
+            self.document_store.update_embeddings(encoder)
+        self._index_changed()
     
 
     def save_document_store(self, faiss_path):
@@ -185,10 +728,74 @@ class VectorDB:
         """
         self.document_store.save(faiss_path)
 
+    def export_read_only_index(self, out_dir):
+        """
+        Write the document store as a read-only index folder for serving processes, see
+        modules.read_only_index.ReadOnlyIndex.
+
+        Args:
+            out_dir (str): Folder to write.
+        """
+        export_read_only_index(self.document_store, out_dir, EMBEDDING_MODEL, resolve_documents=self.resolve_documents)
     
+    def _get_connection(self, sql_path=None):
+        """
+        Return this thread's persistent connection to the SQLite database, opening it on first use.
+
+        Args:
+            sql_path (str, optional): Database file; defaults to self.sql_path.
+        """
+        sql_path = sql_path or self.sql_path
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        if sql_path not in connections:
+            connections[sql_path] = sqlite3.connect(sql_path)
+        return connections[sql_path]
+
+    def close(self):
+        """
+        Close the SQLite connections opened by the calling thread, and write the metrics
+        to their export_path if one is set.
+        """
+        for conn in getattr(self._local, "connections", {}).values():
+            conn.close()
+        self._local.connections = {}
+        if self.lexical_index is not None:
+            self.lexical_index.close()
+        if self.reranker is not None:
+            self.reranker.close()
+        self.metrics.export()
+
+    def clear_article_cache(self):
+        """
+        Drop every article from the in-memory article cache.
+        """
+        self._article_cache.clear()
+        self._article_text_cache.clear()
+
+    def fetch_articles(self, keys, sql_path=None) -> dict:
+        """
+        Retrieve the full text of several articles in one round trip to the SQLite database
+        (see modules.sqlite_utils.fetch_articles).
+
+        Args:
+            keys (iterable): (law_name, article_number) pairs to look up. A bare article
+                             number (int or str) stands for (self.law_name, number).
+            sql_path (str, optional): The SQLite database file; defaults to self.sql_path.
+
+        Returns:
+            dict: Mapping from each requested key (as given) to its text, or None if the
+                  article is not in the database.
+        """
+        sql_path = sql_path or self.sql_path
+        return fetch_articles(lambda: self._get_connection(sql_path), self._article_cache, keys,
+                              default_law=self.law_name, namespace=sql_path, metrics=self.metrics)
+
     def fetch_article_by_number(self, sql_path, article_number):
         """
-        Retrieve the full article text from the SQLite database for the given article number.
+        Retrieve the full article text from the SQLite database for the given article number
+        of this law code (law_name).
 
         Args:
             db_path (str): The path to your SQLite database file.
@@ -197,28 +804,132 @@ class VectorDB:
         Returns:
             str or None: The article text if found, otherwise None.
         """
-        try:
-            with sqlite3.connect(sql_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT text FROM articles WHERE article_number = ?", (article_number,))
-                row = cursor.fetchone()
-                if row:
-                    return row[0]
-                else:
-                    return None
-        except sqlite3.Error as e:
-            print(f"SQLite error: {e}")
-            return None
+        return self.fetch_articles([(self.law_name, article_number)], sql_path).get((self.law_name, article_number))
+
     def setup(self):
         self.initialize_sqlite()
         self.initialize_document_store()
         self.initialize_preprocessor()
+        self.chunk_index = ChunkIndex(self.sql_path)
 
     def process_articles(self, json_file_path):
-        self.populate_sqlite_from_json(json_file_path)
-        processed_docs = self.preprocess_articles(json_file_path)
-        self.write_documents(processed_docs)
-        return processed_docs
+        """
+        Load the articles of a JSON or JSON Lines file into SQLite and write their chunks to the document store.
+
+        The file is read once: articles are upserted into SQLite as they are streamed to
+        the chunking pool, and chunks are streamed on to the document store in batches of
+        write_batch_size, so neither is ever all held in memory.
+
+        Returns:
+            int: The number of chunks written.
+        """
+        written = 0
+        pending = []
+        for chunks in self.iter_chunk_batches(self.iter_loaded_articles(iter_articles_file(json_file_path))):
+            pending.extend(chunks)
+            if len(pending) >= self.write_batch_size:
+                self.write_documents(pending)
+                written += len(pending)
+                pending = []
+        if pending:
+            self.write_documents(pending)
+            written += len(pending)
+        # These chunks bypass sync_documents: forget the manifest so the next sync rebuilds the index.
+        self.chunk_index.replace_manifest(self.law_name, {})
+        return written
+
+    def _embed_chunks(self, documents, batch_size=256) -> tuple:
+        """
+        Return the embedding of each distinct chunk text, computing only the ones that are
+        not stored in the chunk index yet.
+
+        Returns:
+            tuple: (content hash -> float32 vector, number of chunks that were embedded)
+        """
+        by_hash = {content_hash(doc.content): doc for doc in documents}
+        embeddings = self.chunk_index.get_embeddings(self.encoder_key, by_hash.keys())
+        missing = [digest for digest in by_hash if digest not in embeddings]
+        logging.info(f"Embedding {len(missing)} new or changed chunks, {len(embeddings)} reused.")
+        self.metrics.count("embeddings_reused", len(embeddings))
+        with self.metrics.stage("update_embeddings", len(missing)):
+            for start in range(0, len(missing), batch_size):
+                batch = missing[start:start + batch_size]
+                vectors = self.retriever.embed_documents([by_hash[digest] for digest in batch])
+                computed = dict(zip(batch, np.asarray(vectors, dtype=np.float32)))
+                self.chunk_index.put_embeddings(self.encoder_key, computed)
+                embeddings.update(computed)
+        return embeddings, len(missing)
+
+    def sync_documents(self, documents) -> dict:
+        """
+        Bring the document store in line with a new set of chunks, embedding only chunks
+        whose text was never embedded before.
+
+        Chunks are identified by (article_number, chunk_number) and compared through the
+        hash of their text with the manifest of the previous sync. If chunks were only
+        added, they are appended to the index. If chunks were removed or changed, the index
+        is rebuilt from the stored embeddings, which takes seconds since no chunk goes
+        through the model again except the changed ones.
+
+        Args:
+            documents (list): Chunks as returned by preprocess_articles.
+
+        Returns:
+            dict: Number of added, removed, changed and unchanged chunks, and of chunks embedded.
+        """
+        # Compact chunks also change when their offsets move, e.g. after an edit earlier in the article.
+        spans = self._text_spans(documents) if self.compact_chunks else [None] * len(documents)
+        manifest = {}
+        for doc, span in zip(documents, spans):
+            key = (str(doc.meta["article_number"]), doc.meta["chunk_number"])
+            manifest[key] = content_hash(doc.content if span is None else f"{doc.content}|{span}")
+            # Stable id per chunk position: the default content-based id would merge chunks
+            # that share their text (e.g. every "(abrogato)" article).
+            doc.id = content_hash(f"{self.law_name}|{key[0]}|{key[1]}|{manifest[key]}")
+
+        previous = self.chunk_index.load_manifest(self.law_name)
+        added = [key for key in manifest if key not in previous]
+        removed = [key for key in previous if key not in manifest]
+        changed = [key for key in manifest if key in previous and previous[key] != manifest[key]]
+        summary = {
+            "added": len(added),
+            "removed": len(removed),
+            "changed": len(changed),
+            "unchanged": len(manifest) - len(added) - len(changed),
+            "embedded": 0,
+        }
+        # A store that does not hold exactly the manifested chunks (first sync, or chunks
+        # written by process_articles) cannot be patched: rebuild it.
+        in_sync = self.document_store.get_document_count() == len(previous)
+        if in_sync and not (added or removed or changed):
+            logging.info("Index already up to date.")
+            return summary
+
+        embeddings, summary["embedded"] = self._embed_chunks(documents)
+        for doc in documents:
+            doc.embedding = embeddings[content_hash(doc.content)]
+
+        if not self._faiss_index().is_trained:
+            sample = reservoir_sample(documents, self.train_sample_size)
+            logging.info(f"Training the {self.index_type} index on {len(sample)} chunks.")
+            self.document_store.train_index(embeddings=np.stack([doc.embedding for doc in sample]))
+        if self.compact_chunks:
+            self.compact_documents(documents, spans)
+
+        if in_sync and not (removed or changed):
+            added_keys = set(added)
+            new_docs = [doc for doc in documents
+                        if (str(doc.meta["article_number"]), doc.meta["chunk_number"]) in added_keys]
+            logging.info(f"Appending {len(new_docs)} chunks to the index.")
+            self.document_store.write_documents(new_docs)
+        else:
+            logging.info(f"Rebuilding the index with {len(documents)} chunks.")
+            self.document_store.delete_documents()
+            self.document_store.write_documents(documents)
+
+        self.chunk_index.replace_manifest(self.law_name, manifest)
+        self._index_changed()
+        return summary
 
     def build_retriever_and_index(self, faiss_path):
         """
@@ -226,17 +937,432 @@ class VectorDB:
 
         """
         self.initialize_retriever()
+        self.train_index()
         self.update_embeddings()
         self.save_document_store(faiss_path)
 
-    def vectorize(self, json_file_path, db_path):
+    def vectorize(self, json_file_path, db_path, incremental=True):
+        """
+        Load the articles of a JSON or JSON Lines file, index their chunks and save the index.
+
+        Args:
+            json_file_path (str): Path to the file with the articles.
+            db_path (str): Path the FAISS index is saved to.
+            incremental (bool): Only embed chunks that are new or changed since the last
+                                run (see sync_documents). If False, every chunk is
+                                written and embedded again.
+        """
+        if not incremental:
+            self.setup()
+            self.process_articles(json_file_path)
+            self.build_retriever_and_index(db_path)
+            return
+
+        if self.document_store is None and os.path.exists(db_path):
+            # Start from the index saved by the previous run, so it can be patched.
+            self.document_store = FAISSDocumentStore.load(db_path)
         self.setup()
-        self.process_articles(json_file_path)
-        self.build_retriever_and_index(db_path)
+        # Chunk before loading the model, so the chunking pool does not fork a process holding it.
+        documents = self.preprocess_articles(json_file_path, load_sqlite=True)
+        self.initialize_retriever()
+        summary = self.sync_documents(documents)
+        logging.info(f"Index sync: {summary}")
+        self.save_document_store(db_path)
 
-        
+    def vector_metadata(self):
+        """
+        Article number and law of every vector id, as arrays for filtering. They are read
+        from the document store once and rebuilt after the index changes.
+
+        Returns:
+            tuple: (article numbers as int64, -1 if not numeric; law codes as int16, -1 for
+                   ids without a document; list of law names the codes index)
+        """
+        if self._vector_metadata is None:
+            num_vectors = self._faiss_index().ntotal
+            article_numbers = np.full(num_vectors, -1, dtype=np.int64)
+            law_codes = np.full(num_vectors, -1, dtype=np.int16)
+            laws = {}
+            for document in self.document_store.get_all_documents_generator(return_embedding=False, batch_size=10000):
+                vector_id = document.meta.get("vector_id")
+                if vector_id is None or int(vector_id) >= num_vectors:
+                    continue
+                article_numbers[int(vector_id)] = article_number_value(document.meta.get("article_number"))
+                law_codes[int(vector_id)] = laws.setdefault(document.meta.get("law_name"), len(laws))
+            self._vector_metadata = (article_numbers, law_codes, list(laws))
+        return self._vector_metadata
+
+    def search_by_embeddings(self, query_embeddings, top_k=10, filters=None) -> list:
+        """
+        Search the FAISS index for several query embeddings at once.
+
+        All queries go through a single FAISS search call, and the documents of all hits
+        are loaded from the document store in a single round trip.
+
+        With filters, only the matching chunks are candidates: FAISS is searched with an ID
+        selector, or, when few chunks match, just those chunks are compared exactly (see
+        modules.ann_index.filtered_search), so narrower filters make the search faster.
 
-    def query_legal_code(self, query, top_k= 10):
+        Args:
+            query_embeddings (np.ndarray): Query embeddings, shape (num_queries, embedding_dim).
+            top_k (int): The number of chunks to return per query.
+            filters (dict, optional): Article range, Libro, article numbers or law name,
+                                      see modules.search_filters.select_vector_ids.
+
+        Returns:
+            list: For each query, the retrieved Documents ordered by score, with their score set.
+        """
+        scores, vector_ids = self._search_index(self._prepare_queries(query_embeddings), top_k, filters)
+        return self._hydrate(scores, vector_ids)
+
+    def _prepare_queries(self, query_embeddings) -> np.ndarray:
+        embeddings = np.ascontiguousarray(query_embeddings, dtype=np.float32).reshape(-1, self.embedding_dim)
+        if self.document_store.similarity == "cosine":
+            self.document_store.normalize_embedding(embeddings)
+        return embeddings
+
+    def _search_index(self, embeddings, top_k, filters=None):
+        """
+        Search FAISS only, returning (scores, vector_ids) as index.search does.
+        """
+        with self.metrics.stage("query_search", len(embeddings)):
+            if filters:
+                allowed = select_vector_ids(filters, *self.vector_metadata())
+                return filtered_search(
+                    self._faiss_index(), embeddings, top_k, allowed,
+                    brute_force_max=self.filter_brute_force_max, nprobe=self.nprobe, ef_search=self.ef_search
+                )
+            return self._faiss_index().search(embeddings, top_k)
+
+    def _hydrate(self, scores, vector_ids) -> list:
+        """
+        Turn FAISS hits into Documents, loading all of them in one document store round trip.
+        """
+        with self.metrics.stage("query_hydrate", len(vector_ids)):
+            return self._hydrate_documents(scores, vector_ids)
+
+    def _hydrate_documents(self, scores, vector_ids) -> list:
+        hit_ids = {str(vector_id) for row_ids in vector_ids for vector_id in row_ids if vector_id != -1}
+        documents = self.document_store.get_documents_by_vector_ids(list(hit_ids), index=self.document_store.index)
+        self.resolve_documents(documents)
+        by_vector_id = {document.meta["vector_id"]: document for document in documents}
+
+        results = []
+        for row_scores, row_ids in zip(scores, vector_ids):
+            hits = []
+            for score, vector_id in zip(row_scores, row_ids):
+                document = by_vector_id.get(str(vector_id))
+                if document is None:
+                    continue
+                # The same chunk can be a hit of several queries with different scores.
+                hit = copy.copy(document)
+                hit.score = self.document_store.scale_to_unit_interval(float(score), self.document_store.similarity)
+                hits.append(hit)
+            results.append(hits)
+        return results
+
+    @staticmethod
+    def _to_response(doc):
+        return {
+            "chunk_content": doc.content,   # The text chunk
+            "metadata": doc.meta,           # Contains article_number, chunk_number, etc.
+            "score": doc.score              # Similarity scaled to [0, 1], comparable across indexes
+        }
+
+    def embed_queries(self, queries):
+        """
+        Encode queries, serving repeated queries from the query embedding cache.
+
+        Queries are normalized (see modules.query_cache.normalize_query) and all cache
+        misses are encoded together in one batched forward pass.
+
+        Args:
+            queries (list): The query strings.
+
+        Returns:
+            np.ndarray: The query embeddings, shape (len(queries), embedding_dim).
+        """
+        with self.metrics.stage("query_encode", len(queries)):
+            return embed_queries_cached(self.retriever, self.query_embedding_cache, self.encoder_key, queries)
+
+    def query_legal_code_batch(self, queries, top_k=10, filters=None, rerank=None):
+        """
+        Retrieve document chunks relevant to each of several queries.
+
+        The queries are encoded in one batched forward pass and searched with a single
+        FAISS call, which is much faster than calling query_legal_code in a loop. Results
+        of repeated queries are served from the result cache until the index changes.
+
+        Args:
+            queries (list): The query strings.
+            top_k (int): The number of top results to return per query.
+            filters (dict, optional): Restrict the results, see search_by_embeddings.
+            rerank (bool, optional): Rerank the top reranker.candidates dense hits with the
+                                     cross-encoder; by default when a reranker is set up.
+                                     Without a reranker_model, the default cross-encoder is loaded.
+
+        Returns:
+            list: For each query, the list query_legal_code would return for it.
+        """
+        if not queries:
+            return []
+        if rerank is None:
+            rerank = self.reranker is not None or bool(self.reranker_model)
+        if rerank:
+            if self.reranker is None:
+                self.initialize_reranker()
+            hits = self.query_legal_code_batch(queries, max(top_k, self.reranker.candidates), filters, rerank=False)
+            return self.reranker.rerank_batch(queries, hits, top_k)
+        keys = [
+            (self.encoder_key, self.index_version, top_k, filter_key(filters), normalize_query(query))
+            for query in queries
+        ]
+        responses = [self.result_cache.get(key) for key in keys]
+        # Queries that normalize to the same text are searched only once.
+        pending = {}
+        for i, response in enumerate(responses):
+            if response is None:
+                pending.setdefault(keys[i], []).append(i)
+        self.metrics.count("queries", len(queries))
+        self.metrics.count("result_cache_hits", len(queries) - sum(len(positions) for positions in pending.values()))
+        if pending:
+            query_embeddings = self.embed_queries([queries[positions[0]] for positions in pending.values()])
+            results = self.search_by_embeddings(query_embeddings, top_k, filters)
+            for (key, positions), hits in zip(pending.items(), results):
+                response = [self._to_response(doc) for doc in hits]
+                self.result_cache.put(key, response)
+                for i in positions:
+                    responses[i] = response
+        # Hand out copies, so callers cannot alter what is stored in the cache.
+        return [list(response) for response in responses]
+
+    def cache_stats(self) -> dict:
+        """
+        Returns:
+            dict: Size, hits, misses and hit rate of the query embedding and result caches.
+        """
+        return {
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "results": self.result_cache.stats(),
+        }
+
+    def save_query_cache(self):
+        """
+        Persist the query embedding cache to query_cache_path, if one is configured.
+        """
+        self.query_embedding_cache.save()
+
+    def _get_lexical_index(self):
+        if self.lexical_index is None:
+            self.lexical_index = LexicalIndex(self.sql_path)
+        return self.lexical_index
+
+    def search_articles_batch(self, queries, top_k=10, mode="hybrid"):
+        """
+        Retrieve the articles relevant to each of several queries.
+
+        - "dense" ranks articles by their best chunk in the FAISS index;
+        - "lexical" ranks them with BM25 over the full article texts (SQLite FTS5);
+        - "hybrid" merges both rankings with reciprocal rank fusion, which catches the
+          exact legal phrasing the embedding model misses.
+
+        Only articles of this instance's law_name are returned, like the chunks of its
+        document store, even when the SQLite database holds other laws too.
+
+        Explicit references ("art. 2043") are resolved by article number. A query made of
+        references only ("art. 2043 c.c.") is answered from SQLite alone, without running
+        the encoder; otherwise the referenced articles are fused in as a third ranking.
+        Dense queries are encoded and searched together (see query_legal_code_batch).
+
+        Args:
+            queries (list): The query strings.
+            top_k (int): The number of articles to return per query.
+            mode (str): "hybrid", "dense" or "lexical".
+
+        Returns:
+            list: For each query, up to top_k dictionaries, best first, with the
+                  article_number, law_name, full text, fused score and the matching
+                  chunks of the dense search (as returned by query_legal_code).
+        """
+        if mode not in ("hybrid", "dense", "lexical"):
+            raise ValueError(f"Unknown search mode '{mode}', use 'hybrid', 'dense' or 'lexical'")
+        lexical_index = self._get_lexical_index()
+        rankings = [[] for _ in queries]  # per query, ranked lists of (law_name, article_number)
+        chunks = [{} for _ in queries]  # per query, (law_name, article_number) -> dense chunk hits
+        dense_positions = []
+        for i, query in enumerate(queries):
+            references = find_article_references(query)
+            if references and mode != "dense":
+                rankings[i].append([
+                    (law_name, article_key(number))
+                    for law_name, number in lexical_index.lookup(references, self.law_name)
+                ])
+                if is_reference_query(query):
+                    continue
+            if mode != "dense":
+                rankings[i].append([
+                    (law_name, article_key(number))
+                    for law_name, number, _ in lexical_index.search(query, self.hybrid_candidates, self.law_name)
+                ])
+            if mode != "lexical":
+                dense_positions.append(i)
+
+        if dense_positions:
+            # Several chunks of one article can be hits, so fetch more chunks than articles.
+            candidates = max(self.hybrid_candidates, 4 * top_k)
+            dense_results = self.query_legal_code_batch([queries[i] for i in dense_positions], candidates, rerank=False)
+            for i, responses in zip(dense_positions, dense_results):
+                ranking = []
+                for response in responses:
+                    key = (response["metadata"].get("law_name"), article_key(response["metadata"].get("article_number")))
+                    if key not in chunks[i]:
+                        chunks[i][key] = []
+                        ranking.append(key)
+                    chunks[i][key].append(response)
+                rankings[i].append(ranking)
+
+        fused = [reciprocal_rank_fusion(ranking, self.rrf_k)[:top_k] for ranking in rankings]
+        texts = self.fetch_articles({article for hits in fused for article, _ in hits})
+        return [
+            [
+                {
+                    "article_number": number,
+                    "law_name": law_name,
+                    "text": texts.get((law_name, number)),
+                    "score": score,
+                    "chunks": chunks[i].get((law_name, number), []),
+                }
+                for (law_name, number), score in hits
+            ]
+            for i, hits in enumerate(fused)
+        ]
+
+    def search_articles(self, query, top_k=10, mode="hybrid"):
+        """
+        Retrieve the articles relevant to the input query, see search_articles_batch.
+        """
+        return self.search_articles_batch([query], top_k, mode)[0]
+
+    def _article_hits(self, scores, vector_ids, top_k, aggregation):
+        """
+        Group the chunk hits of one query by article and keep the top_k best articles.
+
+        Returns:
+            tuple: (list of ((law code, article number), score, [(vector_id, chunk score)]),
+                    number of distinct articles among the hits)
+        """
+        article_numbers, law_codes, _ = self.vector_metadata()
+        similarity = self.document_store.similarity
+        articles = {}
+        for score, vector_id in zip(scores, vector_ids):
+            if vector_id == -1:
+                continue
+            # Chunks without a numeric article number are their own article.
+            number = article_numbers[vector_id]
+            key = (int(law_codes[vector_id]), int(number)) if number >= 0 else ("vector", int(vector_id))
+            chunk_score = self.document_store.scale_to_unit_interval(float(score), similarity)
+            articles.setdefault(key, []).append((int(vector_id), chunk_score))
+        ranked = sorted(
+            (
+                (key, max(s for _, s in chunks) if aggregation == "max" else sum(s for _, s in chunks), chunks)
+                for key, chunks in articles.items()
+            ),
+            key=lambda article: article[1], reverse=True
+        )
+        return ranked[:top_k], len(articles)
+
+    def query_articles_batch(self, queries, top_k=10, aggregation="max", filters=None):
+        """
+        Retrieve exactly top_k distinct articles for each query (fewer only if the index,
+        or the filter, holds fewer), instead of top_k chunks that often share articles.
+
+        Chunks are searched top_k * article_overfetch at a time; queries whose hits cover
+        fewer than top_k articles are searched again with twice as many chunks, reusing their
+        embeddings. Grouping uses the per-vector-id article numbers, so the document store
+        and SQLite are only read once, for the chunks and texts of the final articles.
+
+        Args:
+            queries (list): The query strings.
+            top_k (int): The number of articles to return per query.
+            aggregation (str): Article score from its chunk scores: "max" (best chunk) or
+                               "sum" (favours articles matching in several chunks).
+            filters (dict, optional): Restrict the results, see search_by_embeddings.
+
+        Returns:
+            list: For each query, dictionaries with article_number, law_name, full text,
+                  score and the matching chunks (as query_legal_code returns them), best first.
+        """
+        if aggregation not in ("max", "sum"):
+            raise ValueError(f"Unknown aggregation '{aggregation}', use 'max' or 'sum'")
+        if not queries:
+            return []
+        keys = [
+            (self.encoder_key, self.index_version, "articles", top_k, aggregation, filter_key(filters), normalize_query(query))
+            for query in queries
+        ]
+        responses = [self.result_cache.get(key) for key in keys]
+        pending = {}
+        for i, response in enumerate(responses):
+            if response is None:
+                pending.setdefault(keys[i], []).append(i)
+        if pending:
+            embeddings = self._prepare_queries(self.embed_queries([queries[positions[0]] for positions in pending.values()]))
+            num_vectors = self._faiss_index().ntotal
+            ranked = [None] * len(embeddings)
+            todo = list(range(len(embeddings)))
+            fetch = max(top_k * self.article_overfetch, 1)
+            while todo:
+                scores, vector_ids = self._search_index(embeddings[todo], min(fetch, num_vectors), filters)
+                still_short = []
+                for position, row_scores, row_ids in zip(todo, scores, vector_ids):
+                    ranked[position], found = self._article_hits(row_scores, row_ids, top_k, aggregation)
+                    # A -1 id means the search ran out of (allowed) chunks: there is nothing more to find.
+                    if found < top_k and fetch < num_vectors and -1 not in row_ids:
+                        still_short.append(position)
+                todo = still_short
+                fetch *= 2
+
+            # One document store round trip for every chunk and one SQLite query for every text.
+            chunk_ids = {str(vector_id) for articles in ranked for _, _, chunks in articles for vector_id, _ in chunks}
+            documents = self.document_store.get_documents_by_vector_ids(list(chunk_ids), index=self.document_store.index)
+            self.resolve_documents(documents)
+            documents = {document.meta["vector_id"]: document for document in documents}
+            texts = self.fetch_articles({
+                (document.meta.get("law_name"), document.meta.get("article_number")) for document in documents.values()
+            })
+            for (key, positions), articles in zip(pending.items(), ranked):
+                response = []
+                for _, score, chunks in articles:
+                    hits = []
+                    for vector_id, chunk_score in chunks:
+                        if str(vector_id) not in documents:
+                            continue
+                        hit = copy.copy(documents[str(vector_id)])
+                        hit.score = chunk_score
+                        hits.append(self._to_response(hit))
+                    if not hits:
+                        continue
+                    metadata = hits[0]["metadata"]
+                    response.append({
+                        "article_number": metadata.get("article_number"),
+                        "law_name": metadata.get("law_name"),
+                        "text": texts.get((metadata.get("law_name"), metadata.get("article_number"))),
+                        "score": score,
+                        "chunks": hits,
+                    })
+                self.result_cache.put(key, response)
+                for i in positions:
+                    responses[i] = response
+        return [list(response) for response in responses]
+
+    def query_articles(self, query, top_k=10, aggregation="max", filters=None):
+        """
+        Retrieve the top_k distinct articles most relevant to the input query, see
+        query_articles_batch.
+        """
+        return self.query_articles_batch([query], top_k, aggregation, filters)[0]
+
+    def query_legal_code(self, query, top_k= 10, filters=None, rerank=None):
 
         """
         Retrieve document chunks relevant to the input query.
@@ -244,19 +1370,14 @@ class VectorDB:
         Args:
             query (str): The query string.
             top_k (int): The number of top results to return.
+            filters (dict, optional): Restrict the results to some articles, e.g.
+                                      {"libro": "IV"} or {"article_range": "1173-2059"}.
+            rerank (bool, optional): Rerank the results with the cross-encoder, see
+                                     query_legal_code_batch.
         
         Returns:
             list: A list of dictionaries with the chunk content and associated metadata.
         """
 
-        results = self.retriever.retrieve(query=query, top_k=top_k)  # top_k is how many chunks you want back
-
-        response = []
-        for doc in results:
-            response.append({
-                "chunk_content": doc.content,   # The text chunk
-                "metadata": doc.meta            # Contains article_number, chunk_number, etc.
-            })
-        return response
-
+        return self.query_legal_code_batch([query], top_k, filters, rerank)[0]  # top_k is how many chunks you want back
 
@@ -1,36 +1,91 @@
-import json
 import os
 import argparse
+from modules.article_io import write_articles
 from modules.articles_split import ArticleSplitter
+from modules.ocr_cache import OCRCache
+from modules.pdf_split import PAGES_PER_SHARD, iter_articles_sharded
 
-# to give the output file a name run "poetry run python -m your_script.py --output custom_filename.json
+# to give the output file a name run "poetry run python -m your_script.py --output custom_filename.jsonl
+# (a .json name writes a JSON array instead of one article per line)
 
 def main():
     # Set up argument parsing to allow passing the output file name from the terminal
     parser = argparse.ArgumentParser(
-        description="Extract articles from a PDF and save them to a JSON file."
+        description="Extract articles from a PDF and save them to a JSON Lines file."
     )
     parser.add_argument(
         "--output",
         type=str,
-        default="articles.json",
-        help="Name of the output JSON file (default: articles.json)"
+        default="articles.jsonl",
+        help="Name of the output file, .jsonl or .json (default: articles.jsonl)"
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Add the articles to the end of an existing .jsonl file instead of replacing it"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of OCR worker processes (default: number of CPU cores)"
+    )
+    parser.add_argument(
+        "--ocr-cache",
+        type=str,
+        default=os.path.join("data", "ocr_cache.db"),
+        help="SQLite file caching the OCR text of each page (default: data/ocr_cache.db)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="OCR every page again instead of using the page cache"
+    )
+    parser.add_argument(
+        "--sharded",
+        action="store_true",
+        help="Split the PDF into page-range shards (on Libro boundaries) and extract and split each in its own worker"
+    )
+    parser.add_argument(
+        "--pages-per-shard",
+        type=int,
+        default=PAGES_PER_SHARD,
+        help=f"Maximum pages per shard with --sharded (default: {PAGES_PER_SHARD})"
     )
     args = parser.parse_args()
 
+    # Ensure the "data" folder exists
+    data_folder = "data"
+    os.makedirs(data_folder, exist_ok=True)
+
+    # Create the full output file path using the name provided via command line argument
+    output_file = os.path.join(data_folder, args.output)
+    preview = []
+
+    def found(articles):
+        # Articles are written as they are found; only the first 3 are kept for the preview.
+        for article in articles:
+            if len(preview) < 3:
+                preview.append(article)
+            yield article
+
     try:
-        splitter = ArticleSplitter()
+        ocr_cache = None if args.no_cache else OCRCache(args.ocr_cache)
+        splitter = ArticleSplitter(max_workers=args.workers, ocr_cache=ocr_cache)
         pdf_path = "codes\\cod_civ\\libri.pdf"
         
-        print("Starting PDF processing...")
-        raw_text = splitter.extract_text_from_pdf(pdf_path)
+        print("Starting PDF processing and splitting text into articles...")
+        # Pages are split into articles as they come out of the extraction pool, and each
+        # article is written to the output file as soon as it is complete.
+        if args.sharded:
+            articles = iter_articles_sharded(splitter, pdf_path, pages_per_shard=args.pages_per_shard)
+        else:
+            articles = splitter.iter_articles(splitter.iter_pages(pdf_path))
+        count = write_articles(output_file, found(articles), append=args.append)
         
-        print("Splitting text into articles...")
-        articles = splitter.split_articles(raw_text)
-        
-        print(f"Found {len(articles)} articles")
+        print(f"Found {count} articles")
         print("\nFirst 3 articles preview:")
-        for article in articles[:3]:
+        for article in preview:
             print(f"Article {article['article_number']}:")
             print(f"Preview: {article['text'][:200]}")
             print("-" * 40)
@@ -38,17 +93,6 @@ def main():
         print(f"Error occurred: {str(e)}")
         return
 
-    # Ensure the "data" folder exists
-    data_folder = "data"
-    os.makedirs(data_folder, exist_ok=True)
-
-    # Create the full output file path using the name provided via command line argument
-    output_file = os.path.join(data_folder, args.output)
-
-    # Write the articles to the JSON file
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(articles, f, ensure_ascii=False, indent=2)
-
     print(f"Articles have been saved to {output_file}")
 
 if __name__ == "__main__":
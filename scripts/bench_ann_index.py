@@ -0,0 +1,107 @@
+import argparse
+import time
+import faiss
+import numpy as np
+from modules.ann_index import index_memory_bytes, resolve_factory_string, set_search_params
+
+# run with "poetry run python -m scripts.bench_ann_index --index data/vector_db.faiss"
+# or without --index to use synthetic clustered vectors.
+
+# Query-time settings swept for each index type.
+SWEEPS = {
+    "flat": [{}],
+    "hnsw": [{"ef_search": ef} for ef in (16, 32, 64, 128, 256)],
+    "ivf_flat": [{"nprobe": n} for n in (1, 4, 8, 16, 32, 64)],
+    "ivf_sq8": [{"nprobe": n} for n in (1, 4, 8, 16, 32, 64)],
+    "ivf_pq": [{"nprobe": n} for n in (1, 4, 8, 16, 32, 64)],
+    "sq_fp16": [{}],
+    "sq8": [{}],
+    "sq8_refine": [{"k_factor": k} for k in (1, 2, 4, 8)],
+    "ivf_pq_refine": [{"nprobe": 16, "k_factor": k} for k in (1, 2, 4, 8)],
+}
+
+
+def load_vectors(index_path):
+    """
+    Read every vector back from a saved FAISS index (e.g. the one written by
+    VectorDB.save_document_store).
+    """
+    index = faiss.read_index(index_path)
+    return index.reconstruct_n(0, index.ntotal).astype(np.float32)
+
+
+def synthetic_vectors(num_vectors, dim, seed=0):
+    """
+    Gaussian clusters normalized to unit length, a rough stand-in for sentence embeddings.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(num_vectors // 50, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), num_vectors)] + 0.3 * rng.normal(size=(num_vectors, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def search_timed(index, queries, top_k):
+    """
+    Search the queries one at a time, as the query path does, and return (ids, mean ms per query).
+    """
+    ids = np.empty((len(queries), top_k), dtype=np.int64)
+    start = time.perf_counter()
+    for i in range(len(queries)):
+        _, ids[i] = index.search(queries[i:i + 1], top_k)
+    return ids, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def recall_at_k(ids, truth):
+    """
+    Share of the exact top-k neighbours that the approximate search also returned.
+    """
+    hits = sum(len(set(row) & set(exact)) for row, exact in zip(ids, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall-vs-latency report of the FAISS index types against Flat.")
+    parser.add_argument("--index", type=str, default=None, help="Saved FAISS index to take the vectors from")
+    parser.add_argument("--vectors", type=int, default=50000, help="Number of synthetic vectors (default: 50000)")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of the synthetic vectors (default: 384)")
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries (default: 500)")
+    parser.add_argument("--top-k", type=int, default=10, help="Neighbours per query (default: 10)")
+    parser.add_argument("--nlist", type=int, default=256, help="IVF cells (default: 256)")
+    parser.add_argument("--types", type=str, default=",".join(SWEEPS), help="Comma-separated index types")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.index) if args.index else synthetic_vectors(args.vectors, args.dim)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed corpus vectors, so they land where the real data is.
+    queries = vectors[rng.integers(0, len(vectors), args.queries)] + 0.05 * rng.normal(size=(args.queries, vectors.shape[1])).astype(np.float32)
+    queries = queries.astype(np.float32)
+    dim = vectors.shape[1]
+    print(f"{len(vectors)} vectors of dimension {dim}, {len(queries)} queries, top_k={args.top_k}")
+
+    flat = faiss.index_factory(dim, "Flat", faiss.METRIC_INNER_PRODUCT)
+    flat.add(vectors)
+    truth, _ = search_timed(flat, queries, args.top_k)
+
+    print(f"{'index':<22}{'params':<16}{'recall@k':>10}{'ms/query':>10}{'memory MB':>11}{'build s':>9}")
+    for index_type in args.types.split(","):
+        factory_string = resolve_factory_string(index_type, nlist=args.nlist)
+        start = time.perf_counter()
+        index = faiss.index_factory(dim, factory_string, faiss.METRIC_INNER_PRODUCT)
+        if not index.is_trained:
+            sample = vectors[rng.choice(len(vectors), min(len(vectors), 20000), replace=False)]
+            index.train(sample)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+        memory_mb = index_memory_bytes(index) / 1e6
+
+        for params in SWEEPS.get(index_type, [{}]):
+            set_search_params(index, **params)
+            ids, ms_per_query = search_timed(index, queries, args.top_k)
+            label = ",".join(f"{key}={value}" for key, value in params.items()) or "-"
+            print(f"{factory_string:<22}{label:<16}{recall_at_k(ids, truth):>10.3f}{ms_per_query:>10.3f}"
+                  f"{memory_mb:>11.1f}{build_seconds:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import re
+import time
+from modules.articles_split import ArticleSplitter
+from scripts.synthetic_code import generate_code_text, generate_pages
+
+# run with "poetry run python -m scripts.bench_article_splitter --articles 20000"
+
+
+def legacy_split_articles(splitter, text):
+    """
+    The line loop of ArticleSplitter.split_articles before the skip patterns were compiled
+    into a single alternation: one re.match per skip pattern on every line, each line
+    stripped twice. Kept here as the baseline of the benchmark.
+    """
+    articles = []
+    current_article_number = None
+    current_text_lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if any(re.match(pattern, line.strip()) for pattern in splitter.skip_patterns):
+            continue
+        match = splitter.article_pattern.match(line)
+        if match:
+            if current_article_number is not None:
+                articles.append({"article_number": current_article_number,
+                                 "text": " ".join(current_text_lines).strip()})
+                current_text_lines = []
+            current_article_number = match.group(1)
+            remaining_text = line[match.end():].strip()
+            if remaining_text:
+                current_text_lines.append(remaining_text)
+        elif current_article_number is not None:
+            current_text_lines.append(line)
+    if current_article_number is not None:
+        articles.append({"article_number": current_article_number,
+                         "text": " ".join(current_text_lines).strip()})
+    return articles
+
+
+def best_of(repeat, function, *args):
+    """
+    Run function(*args) repeat times and return (best wall-clock seconds, last result).
+    """
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the article splitter against the per-pattern baseline on a synthetic code."
+    )
+    parser.add_argument("--articles", type=int, default=20000, help="Number of synthetic articles (default: 20000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation, best is kept (default: 3)")
+    args = parser.parse_args()
+
+    splitter = ArticleSplitter()
+    text = generate_code_text(args.articles)
+    pages = generate_pages(args.articles)
+    num_lines = text.count("\n")
+    print(f"Synthetic code: {args.articles} articles, {num_lines} lines, {len(text.encode('utf-8')) / 1e6:.1f} MB")
+
+    legacy_time, legacy_articles = best_of(args.repeat, legacy_split_articles, splitter, text)
+    compiled_time, compiled_articles = best_of(args.repeat, splitter.split_articles, text)
+    streaming_time, streaming_articles = best_of(args.repeat, lambda: list(splitter.iter_articles(pages)))
+
+    if not (legacy_articles == compiled_articles == streaming_articles):
+        raise SystemExit("Implementations disagree on the split articles")
+
+    print(f"{'implementation':<28}{'seconds':>10}{'lines/sec':>14}{'speedup':>10}")
+    for name, seconds in [("per-pattern re.match", legacy_time),
+                          ("split_articles (compiled)", compiled_time),
+                          ("iter_articles over pages", streaming_time)]:
+        print(f"{name:<28}{seconds:>10.3f}{num_lines / seconds:>14,.0f}{legacy_time / seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import random
+import sqlite3
+import time
+from haystack.document_stores import FAISSDocumentStore
+from modules.vector_db import VectorDB
+
+# run with "poetry run python -m scripts.bench_batch_query --queries 200"
+
+
+def sample_queries(sql_path, num_queries, seed=0):
+    """
+    Build queries from short word spans of random articles, which is what users tend to
+    paste: a fragment of legal phrasing.
+    """
+    rng = random.Random(seed)
+    with sqlite3.connect(sql_path) as conn:
+        texts = [row[0] for row in conn.execute("SELECT text FROM articles WHERE text != ''")]
+    queries = []
+    for _ in range(num_queries):
+        words = rng.choice(texts).split()
+        length = rng.randint(6, 12)
+        start = rng.randint(0, max(len(words) - length, 0))
+        queries.append(" ".join(words[start:start + length]))
+    return queries
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare batched retrieval with a loop of single queries.")
+    parser.add_argument("--faiss-index", type=str, default="data/vector_db.faiss", help="Saved FAISS document store")
+    parser.add_argument("--sql-path", type=str, default="data/sqlite.db", help="SQLite database with the articles")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries (default: 200)")
+    parser.add_argument("--top-k", type=int, default=10, help="Chunks per query (default: 10)")
+    args = parser.parse_args()
+
+    document_store = FAISSDocumentStore.load(args.faiss_index)
+    # Without caches, so the batched pass does not just read back what the loop stored.
+    vector_db = VectorDB(sql_path=args.sql_path, document_store=document_store,
+                         query_cache_size=0, result_cache_size=0)
+    vector_db.initialize_document_store()
+    vector_db.initialize_retriever()
+    queries = sample_queries(args.sql_path, args.queries)
+    vector_db.query_legal_code_batch(queries[:4], args.top_k)  # warm up the model
+
+    retrieve_time, _ = timed(lambda: [vector_db.retriever.retrieve(query=query, top_k=args.top_k) for query in queries])
+    loop_time, loop_results = timed(lambda: [vector_db.query_legal_code(query, args.top_k) for query in queries])
+    batch_time, batch_results = timed(lambda: vector_db.query_legal_code_batch(queries, args.top_k))
+
+    same = sum(
+        [hit["metadata"]["vector_id"] for hit in single] == [hit["metadata"]["vector_id"] for hit in batched]
+        for single, batched in zip(loop_results, batch_results)
+    )
+    print(f"{len(queries)} queries, top_k={args.top_k}; identical rankings: {same}/{len(queries)}")
+    print(f"{'mode':<34}{'seconds':>10}{'queries/sec':>14}")
+    for name, seconds in [("retriever.retrieve loop", retrieve_time),
+                          ("query_legal_code loop", loop_time),
+                          ("query_legal_code_batch", batch_time)]:
+        print(f"{name:<34}{seconds:>10.2f}{len(queries) / seconds:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+# run with "poetry run python -m scripts.bench_cold_start --workers 2"
+
+QUERY = "risarcimento del danno da fatto illecito"
+
+
+def memory_kb() -> dict:
+    """
+    Resident memory of this process in kB, split into anonymous (private to the process)
+    and file-backed pages (memory-mapped files, shared through the page cache). Linux only.
+    """
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "RssAnon", "RssFile"):
+                fields[name] = int(value.split()[0])
+    return fields
+
+
+def memory_growth_kb(before: dict) -> dict:
+    """
+    How much each memory_kb field grew since before.
+    """
+    return {name: value - before.get(name, 0) for name, value in memory_kb().items()}
+
+
+# Each starter returns the searcher and the memory growth of loading the FAISS index alone,
+# so the private (anon) and shared (file) cost of the index is not hidden by the encoder's.
+def start_vector_db(args):
+    from haystack.document_stores import FAISSDocumentStore
+    from modules.vector_db import VectorDB
+
+    before = memory_kb()
+    document_store = FAISSDocumentStore.load(args["faiss_index"])
+    index_memory = memory_growth_kb(before)
+    vector_db = VectorDB(sql_path=args["sql_path"], document_store=document_store)
+    vector_db.initialize_document_store()
+    vector_db.initialize_retriever()
+    return vector_db, index_memory
+
+
+def start_read_only(args):
+    from modules.encoders import OnnxEncoder, TorchEncoder
+    from modules.read_only_index import MANIFEST_FILE, ReadOnlyIndex
+
+    # The encoder is loaded first, so that only the index is loaded in between the measurements.
+    with open(os.path.join(args["index_dir"], MANIFEST_FILE), encoding="utf-8") as f:
+        model_name = json.load(f)["model_name"]
+    encoder = OnnxEncoder(model_name) if args["encoder_backend"] == "onnx" else TorchEncoder(model_name)
+    before = memory_kb()
+    read_only_index = ReadOnlyIndex(args["index_dir"], sql_path=args["sql_path"], encoder=encoder,
+                                    encoder_backend=args["encoder_backend"])
+    index_memory = memory_growth_kb(before)
+    if not read_only_index.mmapped:
+        print(f"{args['index_dir']} is not memory-mapped: its pages are not shared between workers")
+    return read_only_index, index_memory
+
+
+STARTERS = {"vector_db": start_vector_db, "read_only": start_read_only}
+
+
+def cold_start(mode, args):
+    """
+    Runs in a fresh process: import, load the index and answer a first query.
+    """
+    start = time.perf_counter()
+    searcher, index_memory = STARTERS[mode](args)
+    loaded = time.perf_counter()
+    results = searcher.query_legal_code(QUERY, top_k=10)
+    searcher.fetch_articles({(result["metadata"]["law_name"], result["metadata"]["article_number"]) for result in results})
+    first_query = time.perf_counter()
+    return {
+        "load_s": loaded - start,
+        "first_query_s": first_query - start,
+        "index_anon": index_memory.get("RssAnon", 0),
+        "index_file": index_memory.get("RssFile", 0),
+        **memory_kb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold start of VectorDB and of the read-only serving index.")
+    parser.add_argument("--faiss-index", type=str, default="data/vector_db.faiss", help="Saved FAISS document store")
+    parser.add_argument("--sql-path", type=str, default="data/sqlite.db", help="SQLite database with the articles")
+    parser.add_argument("--index-dir", type=str, default="data/read_only_index", help="Read-only index folder")
+    parser.add_argument("--encoder-backend", type=str, default="torch", help="Query encoder of the read-only index: torch or onnx")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes started at the same time (default: 2)")
+    parser.add_argument("--export", action="store_true", help="(Re)export the read-only index first")
+    args = parser.parse_args()
+
+    if args.export or not os.path.exists(args.index_dir):
+        from haystack.document_stores import FAISSDocumentStore
+        from modules.vector_db import VectorDB
+
+        vector_db = VectorDB(sql_path=args.sql_path, document_store=FAISSDocumentStore.load(args.faiss_index))
+        vector_db.export_read_only_index(args.index_dir)
+
+    settings = {
+        "faiss_index": args.faiss_index,
+        "sql_path": args.sql_path,
+        "index_dir": args.index_dir,
+        "encoder_backend": args.encoder_backend,
+    }
+    # "spawn" starts every worker from scratch, like a freshly deployed server process.
+    context = multiprocessing.get_context("spawn")
+    # anon pages are private to each worker, file pages are shared through the page cache:
+    # a memory-mapped index should show up under "index file", not "index anon".
+    print(f"{args.workers} workers started together; memory is per worker, in MB")
+    print(f"{'mode':<12}{'load s':>9}{'first query s':>15}{'RSS':>9}{'anon':>9}{'file':>9}"
+          f"{'index anon':>12}{'index file':>12}")
+    for mode in STARTERS:
+        with context.Pool(args.workers) as pool:
+            runs = pool.starmap(cold_start, [(mode, settings)] * args.workers)
+        for run in runs:
+            print(f"{mode:<12}{run['load_s']:>9.2f}{run['first_query_s']:>15.2f}"
+                  f"{run.get('VmRSS', 0) / 1024:>9.1f}{run.get('RssAnon', 0) / 1024:>9.1f}{run.get('RssFile', 0) / 1024:>9.1f}"
+                  f"{run['index_anon'] / 1024:>12.1f}{run['index_file'] / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
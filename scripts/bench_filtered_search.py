@@ -0,0 +1,66 @@
+import argparse
+import time
+import numpy as np
+from haystack.document_stores import FAISSDocumentStore
+from modules.search_filters import select_vector_ids
+from modules.vector_db import VectorDB
+from scripts.bench_batch_query import sample_queries
+
+# run with "poetry run python -m scripts.bench_filtered_search --queries 100"
+
+FILTERS = [
+    {"libro": "IV"},
+    {"libro": "II"},
+    {"article_range": "1173-1320"},
+    {"article_range": "2043-2059"},
+    {"article_numbers": [1321, 1341, 1342, 2043, 2059]},
+]
+
+
+def post_filter(vector_db, embeddings, top_k, filters, overfetch):
+    """
+    The old way: search the whole index for top_k * overfetch chunks, keep the matching ones.
+    """
+    allowed = set(select_vector_ids(filters, *vector_db.vector_metadata()).tolist())
+    results = vector_db.search_by_embeddings(embeddings, top_k * overfetch)
+    return [[hit for hit in hits if int(hit.meta["vector_id"]) in allowed][:top_k] for hits in results]
+
+
+def timed_per_query(function, embeddings):
+    start = time.perf_counter()
+    results = [function(embeddings[i:i + 1])[0] for i in range(len(embeddings))]
+    return (time.perf_counter() - start) * 1000 / len(embeddings), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare filtered vector search with over-fetching and filtering afterwards.")
+    parser.add_argument("--faiss-index", type=str, default="data/vector_db.faiss", help="Saved FAISS document store")
+    parser.add_argument("--sql-path", type=str, default="data/sqlite.db", help="SQLite database with the articles")
+    parser.add_argument("--queries", type=int, default=100, help="Number of queries (default: 100)")
+    parser.add_argument("--top-k", type=int, default=10, help="Chunks per query (default: 10)")
+    parser.add_argument("--overfetch", type=int, default=10, help="Over-fetch factor of the post-filter baseline (default: 10)")
+    args = parser.parse_args()
+
+    document_store = FAISSDocumentStore.load(args.faiss_index)
+    vector_db = VectorDB(sql_path=args.sql_path, document_store=document_store)
+    vector_db.initialize_document_store()
+    vector_db.initialize_retriever()
+    embeddings = vector_db.embed_queries(sample_queries(args.sql_path, args.queries))
+    article_numbers, law_codes, laws = vector_db.vector_metadata()
+
+    timed_per_query(lambda e: vector_db.search_by_embeddings(e, args.top_k), embeddings)  # warm up
+    unfiltered_ms, _ = timed_per_query(lambda e: vector_db.search_by_embeddings(e, args.top_k), embeddings)
+    print(f"{len(law_codes)} chunks, {args.queries} queries, top_k={args.top_k}; unfiltered search {unfiltered_ms:.2f} ms/query")
+    print(f"{'filter':<54}{'chunks':>8}{'filtered ms':>13}{'post-filter ms':>16}{'hits filtered':>15}{'hits post':>11}")
+    for filters in FILTERS:
+        allowed = len(select_vector_ids(filters, article_numbers, law_codes, laws))
+        filtered_ms, filtered = timed_per_query(
+            lambda e: vector_db.search_by_embeddings(e, args.top_k, filters), embeddings)
+        post_ms, post = timed_per_query(
+            lambda e: post_filter(vector_db, e, args.top_k, filters, args.overfetch), embeddings)
+        print(f"{str(filters):<54}{allowed:>8}{filtered_ms:>13.2f}{post_ms:>16.2f}"
+              f"{np.mean([len(hits) for hits in filtered]):>15.1f}{np.mean([len(hits) for hits in post]):>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
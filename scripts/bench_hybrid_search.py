@@ -0,0 +1,77 @@
+import argparse
+import random
+import sqlite3
+import time
+import numpy as np
+from haystack.document_stores import FAISSDocumentStore
+from modules.vector_db import VectorDB
+
+# run with "poetry run python -m scripts.bench_hybrid_search --queries 200"
+
+
+def sample_labelled_queries(sql_path, num_queries, seed=0):
+    """
+    Build (query, article_number) pairs: phrase queries are short word spans of an
+    article, reference queries name an article ("art. 2043 c.c.").
+    """
+    rng = random.Random(seed)
+    with sqlite3.connect(sql_path) as conn:
+        rows = conn.execute("SELECT article_number, text FROM articles WHERE text != ''").fetchall()
+    phrases = []
+    references = []
+    for _ in range(num_queries):
+        article_number, text = rng.choice(rows)
+        words = text.split()
+        length = rng.randint(6, 12)
+        start = rng.randint(0, max(len(words) - length, 0))
+        phrases.append((" ".join(words[start:start + length]), article_number))
+        references.append((rng.choice(["art. {} c.c.", "Art. {}", "articolo {}"]).format(article_number), article_number))
+    return {"phrase": phrases, "reference": references}
+
+
+def run(vector_db, labelled, top_k, mode):
+    """
+    Search the queries one at a time with empty caches.
+
+    Returns:
+        tuple: (hit rate at top_k, latencies in milliseconds)
+    """
+    vector_db.query_embedding_cache.clear()
+    vector_db.result_cache.clear()
+    vector_db.clear_article_cache()
+    hits = 0
+    latencies = []
+    for query, article_number in labelled:
+        start = time.perf_counter()
+        results = vector_db.search_articles(query, top_k, mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += any(result["article_number"] == article_number for result in results)
+    return hits / len(labelled), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dense, lexical (BM25) and hybrid article search.")
+    parser.add_argument("--faiss-index", type=str, default="data/vector_db.faiss", help="Saved FAISS document store")
+    parser.add_argument("--sql-path", type=str, default="data/sqlite.db", help="SQLite database with the articles")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries of each kind (default: 200)")
+    parser.add_argument("--top-k", type=int, default=5, help="Articles per query (default: 5)")
+    args = parser.parse_args()
+
+    document_store = FAISSDocumentStore.load(args.faiss_index)
+    vector_db = VectorDB(sql_path=args.sql_path, document_store=document_store)
+    vector_db.initialize_document_store()
+    vector_db.initialize_retriever()
+    queries = sample_labelled_queries(args.sql_path, args.queries)
+    vector_db.search_articles("riscaldamento del modello", args.top_k)  # warm up
+
+    print(f"{args.queries} queries of each kind, hit rate = source article in the top {args.top_k}")
+    print(f"{'queries':<11}{'mode':<9}{'hit rate':>10}{'mean ms':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for kind, labelled in queries.items():
+        for mode in ("dense", "lexical", "hybrid"):
+            hit_rate, latencies = run(vector_db, labelled, args.top_k, mode)
+            print(f"{kind:<11}{mode:<9}{hit_rate:>10.3f}{np.mean(latencies):>10.2f}"
+                  f"{np.percentile(latencies, 50):>9.2f}{np.percentile(latencies, 99):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import random
+import sqlite3
+import time
+import numpy as np
+from haystack import Document
+from haystack.nodes import DensePassageRetriever
+from modules.encoders import OnnxEncoder
+from modules.vector_db import EMBEDDING_MODEL
+from scripts.bench_batch_query import sample_queries
+
+# run with "poetry run python -m scripts.bench_onnx_encoder --passages 2000 --queries 200"
+
+
+def sample_passages(sql_path, num_passages, seed=0):
+    """
+    Take the first 200 words of random articles, about the size of an indexed chunk.
+    """
+    with sqlite3.connect(sql_path) as conn:
+        texts = [row[0] for row in conn.execute("SELECT text FROM articles WHERE text != ''")]
+    rng = random.Random(seed)
+    return [Document(content=" ".join(rng.choice(texts).split()[:200])) for _ in range(num_passages)]
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = np.asarray(function(), dtype=np.float32)
+    return time.perf_counter() - start, result
+
+
+def cosine(a, b):
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def top_k(query_embeddings, passage_embeddings, k):
+    scores = query_embeddings @ passage_embeddings.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ONNX encoder backends with the Dense Passage Retriever.")
+    parser.add_argument("--sql-path", type=str, default="data/sqlite.db", help="SQLite database with the articles")
+    parser.add_argument("--passages", type=int, default=2000, help="Number of passages to embed (default: 2000)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries to embed (default: 200)")
+    parser.add_argument("--top-k", type=int, default=10, help="k of the top-k overlap (default: 10)")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (default: automatic)")
+    args = parser.parse_args()
+
+    passages = sample_passages(args.sql_path, args.passages)
+    queries = sample_queries(args.sql_path, args.queries)
+
+    retriever = DensePassageRetriever(
+        document_store=None,
+        query_embedding_model=EMBEDDING_MODEL,
+        passage_embedding_model=EMBEDDING_MODEL,
+        use_gpu=False
+    )
+    backends = [("dpr (pytorch)", retriever)]
+    for quantize in (False, True):
+        name = f"onnx {'int8' if quantize else 'fp32'}"
+        backends.append((name, OnnxEncoder(EMBEDDING_MODEL, quantize=quantize, num_threads=args.threads)))
+
+    results = {}
+    for name, encoder in backends:
+        encoder.embed_queries(queries[:8])  # warm up
+        passage_time, passage_embeddings = timed(lambda: encoder.embed_documents(passages))
+        query_time, query_embeddings = timed(lambda: encoder.embed_queries(queries))
+        results[name] = (passage_time, query_time, passage_embeddings, query_embeddings)
+
+    _, _, reference_passages, reference_queries = results["dpr (pytorch)"]
+    reference_top_k = top_k(reference_queries, reference_passages, args.top_k)
+    print(f"{len(passages)} passages, {len(queries)} queries; agreement measured against dpr (pytorch)")
+    print(f"{'backend':<16}{'passages/sec':>14}{'queries/sec':>13}{'min cos':>10}{'mean cos':>10}{f'top-{args.top_k} overlap':>16}")
+    for name, (passage_time, query_time, passage_embeddings, query_embeddings) in results.items():
+        similarities = np.concatenate([cosine(passage_embeddings, reference_passages),
+                                       cosine(query_embeddings, reference_queries)])
+        found = top_k(query_embeddings, passage_embeddings, args.top_k)
+        overlap = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(found, reference_top_k)])
+        print(f"{name:<16}{len(passages) / passage_time:>14.1f}{len(queries) / query_time:>13.1f}"
+              f"{similarities.min():>10.4f}{similarities.mean():>10.4f}{overlap:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
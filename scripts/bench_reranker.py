@@ -0,0 +1,84 @@
+import argparse
+import time
+import numpy as np
+from haystack.document_stores import FAISSDocumentStore
+from modules.reranker import CrossEncoderReranker, RERANKER_MODEL
+from modules.vector_db import VectorDB
+from scripts.bench_hybrid_search import sample_labelled_queries
+
+# run with "poetry run python -m scripts.bench_reranker --queries 200 --candidates 10,20,50,100"
+
+
+def evaluate(vector_db, labelled, top_k, rerank):
+    """
+    Search the queries one at a time with empty caches. A chunk is relevant when it belongs
+    to the article the query was taken from. With reranking, latencies include fetching
+    the N dense candidates, which grows with N as well; the budget only bounds scoring.
+
+    Returns:
+        dict: precision@top_k, hit rate@1, MRR@top_k and latencies in milliseconds.
+    """
+    vector_db.query_embedding_cache.clear()
+    vector_db.result_cache.clear()
+    if vector_db.reranker is not None:
+        vector_db.reranker.score_cache.clear()
+    precisions, hits_at_1, reciprocal_ranks, latencies = [], [], [], []
+    for query, article_number in labelled:
+        start = time.perf_counter()
+        results = vector_db.query_legal_code(query, top_k, rerank=rerank)
+        latencies.append((time.perf_counter() - start) * 1000)
+        relevant = [str(result["metadata"].get("article_number")) == str(article_number) for result in results]
+        precisions.append(sum(relevant) / top_k)
+        hits_at_1.append(bool(relevant) and relevant[0])
+        reciprocal_ranks.append(next((1 / rank for rank, hit in enumerate(relevant, start=1) if hit), 0.0))
+    return {
+        "precision": np.mean(precisions),
+        "hit_at_1": np.mean(hits_at_1),
+        "mrr": np.mean(reciprocal_ranks),
+        "latencies": latencies,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure precision@k of cross-encoder reranking against the latency it adds.")
+    parser.add_argument("--faiss-index", type=str, default="data/vector_db.faiss", help="Saved FAISS document store")
+    parser.add_argument("--sql-path", type=str, default="data/sqlite.db", help="SQLite database with the articles")
+    parser.add_argument("--model", type=str, default=RERANKER_MODEL, help=f"Cross-encoder (default: {RERANKER_MODEL})")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries (default: 200)")
+    parser.add_argument("--top-k", type=int, default=5, help="Chunks per query (default: 5)")
+    parser.add_argument("--candidates", type=str, default="10,20,50,100", help="Values of N (dense hits reranked) to compare")
+    parser.add_argument("--budget-ms", type=float, default=0, help="Reranking budget per query, 0 for none (default: 0)")
+    parser.add_argument("--workers", type=int, default=2, help="Scoring threads (default: 2)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Pairs per forward pass (default: 8)")
+    args = parser.parse_args()
+
+    document_store = FAISSDocumentStore.load(args.faiss_index)
+    vector_db = VectorDB(sql_path=args.sql_path, document_store=document_store)
+    vector_db.initialize_document_store()
+    vector_db.initialize_retriever()
+    vector_db.reranker = CrossEncoderReranker(args.model, budget_ms=args.budget_ms, max_workers=args.workers,
+                                              batch_size=args.batch_size, metrics=vector_db.metrics)
+    # Phrase queries are spans of an article's text, so the article they come from is the relevant one.
+    labelled = sample_labelled_queries(args.sql_path, args.queries)["phrase"]
+    vector_db.query_legal_code("riscaldamento del modello", args.top_k)  # warm up
+
+    dense = evaluate(vector_db, labelled, args.top_k, rerank=False)
+    dense_ms = np.mean(dense["latencies"])
+    print(f"{args.queries} queries, top_k={args.top_k}, budget {args.budget_ms or 'none'} ms, "
+          f"relevant = chunks of the article the query was taken from")
+    print(f"{'N':>6}{'P@k':>8}{'hit@1':>8}{'MRR':>8}{'mean ms':>10}{'p95 ms':>9}{'added ms':>10}{'timeouts':>10}")
+    print(f"{'dense':>6}{dense['precision']:>8.3f}{dense['hit_at_1']:>8.3f}{dense['mrr']:>8.3f}"
+          f"{dense_ms:>10.2f}{np.percentile(dense['latencies'], 95):>9.2f}{0:>10.2f}{0:>10}")
+    for candidates in [int(value) for value in args.candidates.split(",")]:
+        vector_db.reranker.candidates = candidates
+        timeouts = vector_db.metrics.snapshot()["counters"].get("rerank_timeouts", 0)
+        result = evaluate(vector_db, labelled, args.top_k, rerank=True)
+        timeouts = vector_db.metrics.snapshot()["counters"].get("rerank_timeouts", 0) - timeouts
+        mean_ms = np.mean(result["latencies"])
+        print(f"{candidates:>6}{result['precision']:>8.3f}{result['hit_at_1']:>8.3f}{result['mrr']:>8.3f}"
+              f"{mean_ms:>10.2f}{np.percentile(result['latencies'], 95):>9.2f}{mean_ms - dense_ms:>10.2f}{timeouts:>10}")
+    vector_db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from modules.article_io import write_articles
+from modules.articles_split import ArticleSplitter
+from modules.vector_db import VectorDB
+from scripts.bench_batch_query import sample_queries
+from scripts.synthetic_code import generate_code_text
+
+# run with "poetry run python -m scripts.benchmark_suite --sizes 500,2000,8000"
+# then, once the numbers look right, "... --repeat 3 --save-baseline" to record them, and later
+# "... --baseline data/benchmarks/baseline.json" to flag regressions (exit code 1).
+
+# Stages measured at every corpus size, in pipeline order.
+STAGES = ("split_articles", "populate_sqlite", "preprocess_articles", "write_documents",
+          "update_embeddings", "query_legal_code", "fetch_article_by_number")
+
+
+class HashingEncoder:
+    """
+    Stand-in for the embedding model: a bag of hashed words, normalized. It needs no
+    download and costs next to nothing, so the benchmark measures the pipeline around the
+    model. It offers the embed_queries / embed_documents methods VectorDB uses.
+    """
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little") % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_queries(self, queries) -> np.ndarray:
+        return np.stack([self._embed(query) for query in queries])
+
+    def embed_documents(self, documents) -> np.ndarray:
+        return np.stack([self._embed(document.content) for document in documents])
+
+
+def create_encoder(name: str, model: str):
+    """
+    The encoder to benchmark with: "hashing" (offline stub), or "torch" / "onnx" running
+    a local model (a small one keeps the run short, e.g. a 2-layer BERT).
+    """
+    if name == "hashing":
+        return HashingEncoder()
+    if name == "torch":
+        from modules.encoders import TorchEncoder
+        return TorchEncoder(model)
+    if name == "onnx":
+        from modules.encoders import OnnxEncoder
+        return OnnxEncoder(model)
+    raise ValueError(f"Unknown encoder '{name}', use 'hashing', 'torch' or 'onnx'")
+
+
+def measure(function, items=None, trace_memory=False):
+    """
+    Run function once, timing it and, optionally, tracking the peak of the Python
+    allocations it makes.
+
+    Args:
+        function (callable): The stage to run.
+        items (int or callable, optional): Units processed (pages, articles, chunks,
+                                           queries), or a function of the result giving them.
+        trace_memory (bool): Track allocations with tracemalloc. It slows allocation-heavy
+                             stages down tenfold or more, so its timings are not comparable.
+
+    Returns:
+        tuple: (result of function, record with seconds, items, items_per_sec and, when
+               traced, peak_mb)
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = function()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    count = items(result) if callable(items) else items
+    record = {"seconds": round(seconds, 4)}
+    if trace_memory:
+        record["peak_mb"] = round(peak / 1e6, 2)
+    if count is not None:
+        record["items"] = count
+        record["items_per_sec"] = round(count / seconds, 1) if seconds > 0 else None
+    return result, record
+
+
+def run_size(num_articles, encoder, args, trace=False) -> dict:
+    """
+    Run every stage on a synthetic code of num_articles articles, in a scratch folder.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        text = generate_code_text(num_articles, seed=args.seed)
+        splitter = ArticleSplitter(max_workers=1)
+        articles, results["split_articles"] = measure(lambda: splitter.split_articles(text), len, trace)
+
+        json_path = os.path.join(work_dir, "articles.jsonl")
+        write_articles(json_path, articles)
+        del text, articles
+
+        sql_path = os.path.join(work_dir, "sqlite.db")
+        vector_db = VectorDB(
+            sql_path=sql_path,
+            faiss_path=f"sqlite:///{os.path.join(work_dir, 'document_store.db')}",
+            law_name="Benchmark",
+            embedding_dim=encoder.embed_queries(["dimensione"]).shape[1],
+            index_type=args.index_type,
+            chunk_workers=args.chunk_workers,
+            # Caches would serve the repeated lookups and hide the cost being measured.
+            article_cache_size=0,
+            query_cache_size=0,
+            result_cache_size=0,
+        )
+        vector_db.setup()
+        vector_db.retriever = encoder
+        _, results["populate_sqlite"] = measure(lambda: vector_db.populate_sqlite_from_json(json_path), num_articles, trace)
+        documents, results["preprocess_articles"] = measure(lambda: vector_db.preprocess_articles(json_path), len, trace)
+        _, results["write_documents"] = measure(lambda: vector_db.write_documents(documents), len(documents), trace)
+        del documents
+        vector_db.train_index()
+        _, results["update_embeddings"] = measure(
+            vector_db.update_embeddings, vector_db.document_store.get_document_count(), trace)
+
+        queries = sample_queries(sql_path, args.queries, seed=args.seed)
+        vector_db.query_legal_code(queries[0], args.top_k)  # warm up
+        latencies = []
+
+        def run_queries():
+            for query in queries:
+                start = time.perf_counter()
+                vector_db.query_legal_code(query, args.top_k)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        _, results["query_legal_code"] = measure(run_queries, len(queries), trace)
+        results["query_legal_code"]["p50_ms"] = round(float(np.percentile(latencies, 50)), 3)
+        results["query_legal_code"]["p95_ms"] = round(float(np.percentile(latencies, 95)), 3)
+
+        rng = random.Random(args.seed)
+        numbers = [str(rng.randint(1, num_articles)) for _ in range(args.queries)]
+        _, results["fetch_article_by_number"] = measure(
+            lambda: [vector_db.fetch_article_by_number(sql_path, number) for number in numbers], len(numbers), trace)
+        vector_db.close()
+    return results
+
+
+def run_pdf(pdf_path, args) -> dict:
+    """
+    Time text extraction (text layer, OCR for scanned pages) and splitting of a real PDF.
+    Extraction runs in worker processes, which tracemalloc does not see: only time it.
+    """
+    splitter = ArticleSplitter(max_workers=args.workers)
+    pages, extract = measure(lambda: list(splitter.iter_pages(pdf_path)), len)
+    articles, split = measure(lambda: list(splitter.iter_articles(pages)), len)
+    return {"extract_text_from_pdf": extract, "split_articles": split, "articles": len(articles)}
+
+
+def find_regressions(results, baseline, threshold, min_seconds=0.05, min_mb=1.0) -> list:
+    """
+    Compare the stages with a baseline run of the same sizes.
+
+    A stage regresses if it got more than threshold (e.g. 0.2 = 20%) slower or more
+    memory hungry. Differences under min_seconds / min_mb are timing and allocator noise.
+
+    Returns:
+        list: One message per regression.
+    """
+    regressions = []
+    for size, stages in results["sizes"].items():
+        for stage, record in stages.items():
+            base = baseline.get("sizes", {}).get(size, {}).get(stage)
+            if not base:
+                continue
+            for field, noise, unit in (("seconds", min_seconds, "s"), ("peak_mb", min_mb, "MB")):
+                before, after = base.get(field), record.get(field)
+                if not before or after is None:
+                    continue
+                if after > before * (1 + threshold) and after - before > noise:
+                    regressions.append(f"{size} articles, {stage}: {field} {before}{unit} -> {after}{unit} "
+                                       f"(+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and memory-profile every ingestion and query stage on synthetic legal codes.")
+    parser.add_argument("--sizes", type=str, default="500,2000,8000", help="Comma-separated numbers of articles (default: 500,2000,8000)")
+    parser.add_argument("--encoder", type=str, default="hashing", help="'hashing' (offline stub), 'torch' or 'onnx' (default: hashing)")
+    parser.add_argument("--model", type=str, default=None, help="Local model for the torch/onnx encoders")
+    parser.add_argument("--index-type", type=str, default="flat", help="FAISS index type (default: flat)")
+    parser.add_argument("--chunk-workers", type=int, default=1, help="Chunking processes, 1 for stable numbers (default: 1)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries and article lookups per size (default: 200)")
+    parser.add_argument("--top-k", type=int, default=10, help="Chunks per query (default: 10)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic code and queries (default: 0)")
+    parser.add_argument("--pdf", type=str, default=None, help="Also time extraction of this PDF")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes for --pdf (default: one per core)")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed passes per size, the fastest is kept (default: 1)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the second, memory-profiled pass of each size")
+    parser.add_argument("--output", type=str, default="data/benchmarks/latest.json", help="Results file (default: data/benchmarks/latest.json)")
+    parser.add_argument("--baseline", type=str, default="data/benchmarks/baseline.json", help="Baseline to compare with, if it exists")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown flagged as a regression (default: 0.2)")
+    args = parser.parse_args()
+    if args.encoder != "hashing" and not args.model:
+        parser.error("--model is required with the torch and onnx encoders")
+
+    encoder = create_encoder(args.encoder, args.model)
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "encoder": args.encoder if args.encoder == "hashing" else f"{args.encoder}:{args.model}",
+            "index_type": args.index_type,
+            "chunk_workers": args.chunk_workers,
+            "queries": args.queries,
+            "top_k": args.top_k,
+            "repeat": args.repeat,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "sizes": {},
+    }
+    print(f"{'articles':>9}  {'stage':<24}{'seconds':>10}{'items/sec':>12}{'peak MB':>10}")
+    for size in [int(size) for size in args.sizes.split(",")]:
+        # Timings come from untraced passes (the fastest of --repeat), peak memory from a traced one.
+        stages = run_size(size, encoder, args)
+        for _ in range(args.repeat - 1):
+            for stage, record in run_size(size, encoder, args).items():
+                if record["seconds"] < stages[stage]["seconds"]:
+                    stages[stage] = record
+        if not args.no_memory:
+            traced = run_size(size, encoder, args, trace=True)
+            for stage, record in stages.items():
+                record["peak_mb"] = traced[stage]["peak_mb"]
+        results["sizes"][str(size)] = stages
+        for stage in STAGES:
+            record = stages[stage]
+            peak = f"{record['peak_mb']:>10.1f}" if "peak_mb" in record else f"{'-':>10}"
+            print(f"{size:>9}  {stage:<24}{record['seconds']:>10.3f}{record.get('items_per_sec') or 0:>12,.0f}{peak}")
+    if args.pdf:
+        results["pdf"] = run_pdf(args.pdf, args)
+        print(f"PDF: {results['pdf']}")
+    # Peak resident memory of the whole run, including what tracemalloc does not see (FAISS, SQLite).
+    results["meta"]["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("encoder") != results["meta"]["encoder"]:
+            print(f"Baseline was run with encoder {baseline['meta'].get('encoder')}, not comparing.")
+            return
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
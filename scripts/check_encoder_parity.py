@@ -0,0 +1,70 @@
+import argparse
+import sys
+import numpy as np
+from haystack import Document
+from haystack.nodes import DensePassageRetriever
+from modules.encoders import OnnxEncoder, TorchEncoder
+from modules.vector_db import EMBEDDING_MODEL
+from scripts.bench_batch_query import sample_queries
+from scripts.bench_onnx_encoder import cosine, sample_passages
+
+# run with "poetry run python -m scripts.check_encoder_parity --passages 200 --queries 100"
+
+
+def parity_inputs(sql_path, num_passages, num_queries):
+    """
+    Queries with and without a trailing "?", and passages with and without a title
+    (meta["name"]), so that both preprocessing steps of DensePassageRetriever are covered.
+    """
+    queries = sample_queries(sql_path, num_queries)
+    queries = [query + "?" if i % 2 else query for i, query in enumerate(queries)]
+    passages = sample_passages(sql_path, num_passages)
+    passages = [
+        Document(content=passage.content, meta={"name": f"Art. {i}"}) if i % 2 else passage
+        for i, passage in enumerate(passages)
+    ]
+    return queries, passages
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that the torch and ONNX encoders give the embeddings of DensePassageRetriever."
+    )
+    parser.add_argument("--sql-path", type=str, default="data/sqlite.db", help="SQLite database with the articles")
+    parser.add_argument("--passages", type=int, default=200, help="Number of passages (default: 200)")
+    parser.add_argument("--queries", type=int, default=100, help="Number of queries (default: 100)")
+    parser.add_argument("--min-cosine", type=float, default=0.9999,
+                        help="Lowest accepted cosine similarity to the DPR embedding (default: 0.9999)")
+    parser.add_argument("--onnx", action="store_true", help="Also check the fp32 ONNX encoder")
+    args = parser.parse_args()
+
+    queries, passages = parity_inputs(args.sql_path, args.passages, args.queries)
+    retriever = DensePassageRetriever(
+        document_store=None,
+        query_embedding_model=EMBEDDING_MODEL,
+        passage_embedding_model=EMBEDDING_MODEL,
+        use_gpu=False
+    )
+    reference = (np.asarray(retriever.embed_queries(queries), dtype=np.float32),
+                 np.asarray(retriever.embed_documents(passages), dtype=np.float32))
+
+    encoders = [("torch", TorchEncoder(EMBEDDING_MODEL))]
+    if args.onnx:
+        encoders.append(("onnx fp32", OnnxEncoder(EMBEDDING_MODEL)))
+
+    failed = False
+    print(f"{len(queries)} queries, {len(passages)} passages; compared with DensePassageRetriever")
+    print(f"{'encoder':<12}{'kind':<10}{'min cos':>10}{'max abs diff':>14}")
+    for name, encoder in encoders:
+        embeddings = (encoder.embed_queries(queries), encoder.embed_documents(passages))
+        for kind, found, expected in zip(("queries", "passages"), embeddings, reference):
+            similarity = cosine(found, expected).min()
+            print(f"{name:<12}{kind:<10}{similarity:>10.6f}{np.abs(found - expected).max():>14.6f}")
+            failed |= similarity < args.min_cosine
+    if failed:
+        print(f"Embeddings differ from DensePassageRetriever (cosine below {args.min_cosine}).")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+import numpy as np
+from scripts.bench_batch_query import sample_queries
+
+# start the server (scripts.serve), then run with
+# "poetry run python -m scripts.load_test --concurrency 32 --requests 2000"
+
+
+async def request(reader, writer, host, query, top_k):
+    body = json.dumps({"query": query, "top_k": top_k}).encode("utf-8")
+    writer.write(
+        f"POST /search HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, queries, top_k, deadline, latencies, statuses):
+    """
+    One keep-alive connection sending requests back to back until deadline or until the
+    shared query list is used up.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while queries and time.perf_counter() < deadline:
+            query = queries.pop()
+            start = time.perf_counter()
+            status = await request(reader, writer, host, query, top_k)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        writer.close()
+
+
+async def run(args, queries):
+    latencies = []
+    statuses = {}
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(
+        client(args.host, args.port, queries, args.top_k, deadline, latencies, statuses)
+        for _ in range(args.concurrency)
+    ))
+    return time.perf_counter() - start, latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the search server with concurrent keep-alive clients.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Server host")
+    parser.add_argument("--port", type=int, default=8000, help="Server port (default: 8000)")
+    parser.add_argument("--sql-path", type=str, default="data/sqlite.db", help="SQLite database to draw queries from")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent connections (default: 32)")
+    parser.add_argument("--requests", type=int, default=2000, help="Total requests (default: 2000)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Stop after this many seconds (default: 60)")
+    parser.add_argument("--top-k", type=int, default=10, help="Chunks per query (default: 10)")
+    parser.add_argument("--repeat", type=float, default=0.0, help="Share of repeated queries, to exercise the caches (default: 0)")
+    args = parser.parse_args()
+
+    distinct = sample_queries(args.sql_path, args.requests)
+    rng = random.Random(1)
+    queries = [rng.choice(distinct[:max(1, len(distinct) // 10)]) if rng.random() < args.repeat else query
+               for query in distinct]
+
+    elapsed, latencies, statuses = asyncio.run(run(args, queries))
+    answered = sum(statuses.values())
+    print(f"{answered} requests in {elapsed:.2f}s with {args.concurrency} connections; status codes: {statuses}")
+    if latencies:
+        print(f"QPS (200s): {len(latencies) / elapsed:.1f}")
+        print(f"latency ms: p50 {np.percentile(latencies, 50):.1f}  p90 {np.percentile(latencies, 90):.1f}"
+              f"  p99 {np.percentile(latencies, 99):.1f}  max {max(latencies):.1f}")
+
+
+if __name__ == "__main__":
+    main()
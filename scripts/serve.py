@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+
+# run with "poetry run python -m scripts.serve --read-only-index data/read_only_index"
+# then query with "curl 'http://127.0.0.1:8000/search?q=risarcimento+del+danno&top_k=5'"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve legal search over HTTP with request micro-batching.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument("--faiss-index", type=str, default="data/vector_db.faiss", help="Saved FAISS document store")
+    parser.add_argument("--sql-path", type=str, default="data/sqlite.db", help="SQLite database with the articles")
+    parser.add_argument("--read-only-index", type=str, help="Serve from a read-only index folder instead of the document store")
+    parser.add_argument("--max-batch-size", type=int, default=32, help="Queries searched together (default: 32)")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long a batch waits to fill up (default: 5)")
+    parser.add_argument("--max-pending", type=int, default=256, help="Queued queries before answering 503 (default: 256)")
+    args = parser.parse_args()
+
+    if args.read_only_index:
+        from modules.read_only_index import ReadOnlyIndex
+
+        searcher = ReadOnlyIndex(args.read_only_index, sql_path=args.sql_path)
+    else:
+        from haystack.document_stores import FAISSDocumentStore
+        from modules.vector_db import VectorDB
+
+        searcher = VectorDB(sql_path=args.sql_path, document_store=FAISSDocumentStore.load(args.faiss_index))
+        searcher.initialize_document_store()
+        searcher.initialize_retriever()
+
+    from modules.search_server import SearchServer
+
+    server = SearchServer(
+        searcher,
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_pending=args.max_pending,
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
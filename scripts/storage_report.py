@@ -0,0 +1,76 @@
+import argparse
+import os
+import sqlite3
+import faiss
+import numpy as np
+from modules.ann_index import index_memory_bytes, reconstruct_vectors, resolve_factory_string
+
+# run with "poetry run python -m scripts.storage_report --faiss-index data/vector_db.faiss"
+
+# Vector encodings compared with the one of the saved index.
+COMPARED_TYPES = ("flat", "sq_fp16", "sq8", "sq8_refine", "ivf_pq_refine")
+
+
+def file_mb(path) -> float:
+    """
+    Size of a file in MB, with its SQLite write-ahead log if there is one.
+    """
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)) / 1e6
+
+
+def chunk_text_stats(document_store_path) -> dict:
+    """
+    Chunks in the haystack SQL store, bytes of chunk text it holds, and how many chunks
+    are compact (text stored as offsets into the articles table).
+    """
+    with sqlite3.connect(document_store_path) as conn:
+        chunks, text_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0) FROM document").fetchone()
+        compact = conn.execute("SELECT COUNT(*) FROM meta_document WHERE name = 'text_span'").fetchone()[0]
+    return {"chunks": chunks, "text_bytes": text_bytes, "compact": compact}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Disk and memory footprint of an index, and of the compact vector encodings.")
+    parser.add_argument("--faiss-index", type=str, default="data/vector_db.faiss", help="Saved FAISS index")
+    parser.add_argument("--document-store", type=str, default="data/document_store.db", help="SQLite file of the FAISS document store")
+    parser.add_argument("--sql-path", type=str, default="data/sqlite.db", help="SQLite database with the articles")
+    parser.add_argument("--sample", type=int, default=20000, help="Vectors used to size the other encodings (default: 20000)")
+    parser.add_argument("--nlist", type=int, default=256, help="IVF cells of the IVF encodings (default: 256)")
+    args = parser.parse_args()
+
+    print(f"{'file':<40}{'MB':>10}")
+    for path in (args.faiss_index, args.document_store, args.sql_path):
+        print(f"{path:<40}{file_mb(path):>10.1f}" if os.path.exists(path) else f"{path:<40}{'missing':>10}")
+
+    stats = chunk_text_stats(args.document_store)
+    print(f"\n{stats['chunks']} chunks, {stats['text_bytes'] / 1e6:.1f} MB of chunk text in the document store, "
+          f"{stats['compact']} compact chunks")
+
+    index = faiss.read_index(args.faiss_index)
+    num_vectors = index.ntotal
+    print(f"{num_vectors} vectors of dimension {index.d}, {index_memory_bytes(index) / max(num_vectors, 1):.0f} bytes "
+          f"per vector in the saved index ({index_memory_bytes(index) / 1e6:.1f} MB)")
+    if num_vectors == 0:
+        return
+
+    # Other encodings are built on a sample and scaled up: their size is linear in the vectors.
+    rng = np.random.default_rng(0)
+    sample_ids = np.sort(rng.choice(num_vectors, min(num_vectors, args.sample), replace=False)).astype(np.int64)
+    vectors = np.ascontiguousarray(reconstruct_vectors(index, sample_ids), dtype=np.float32)
+    print(f"\n{'index':<34}{'bytes/vector':>14}{'projected MB':>14}")
+    for index_type in COMPARED_TYPES:
+        factory_string = resolve_factory_string(index_type, nlist=min(args.nlist, max(len(vectors) // 39, 1)))
+        compared = faiss.index_factory(index.d, factory_string, index.metric_type)
+        if not compared.is_trained:
+            compared.train(vectors)
+        compared.add(vectors)
+        # The fixed part (quantizers, codebooks) is counted once, not per vector.
+        empty = faiss.clone_index(compared)
+        empty.reset()
+        fixed = index_memory_bytes(empty)
+        per_vector = (index_memory_bytes(compared) - fixed) / len(vectors)
+        print(f"{factory_string:<34}{per_vector:>14.0f}{(fixed + per_vector * num_vectors) / 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
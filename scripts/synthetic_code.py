@@ -0,0 +1,104 @@
+import random
+
+# Small Italian legal vocabulary used to build article texts that look like the codice civile.
+WORDS = (
+    "il la le lo gli un una del della dei delle al alla ai alle nel nella con per tra fra "
+    "contratto obbligazione debitore creditore diritto proprietà possesso successione erede "
+    "legato donazione matrimonio coniuge figli tutela curatore minore capacità persona "
+    "giuridica danno risarcimento responsabilità fatto illecito dolo colpa prestazione "
+    "adempimento inadempimento termine condizione nullità annullabilità rescissione "
+    "risoluzione garanzia pegno ipoteca privilegio servitù usufrutto enfiteusi comunione "
+    "società impresa lavoro imprenditore azienda ditta marchio brevetto trascrizione "
+    "prescrizione decadenza prova documento atto pubblico scrittura privata giudice "
+    "sentenza esecuzione forzata pignoramento espropriazione è sono deve può salvo che "
+    "quando se non ovvero oppure nonché secondo le norme disposizioni presente articolo "
+    "codice legge stabilito previsto comma precedente"
+).split()
+
+LIBRI = [
+    "Libro I - Delle persone e della famiglia",
+    "Libro II - Delle successioni",
+    "Libro III - Della proprietà",
+    "Libro IV - Delle obbligazioni",
+    "Libro V - Del lavoro",
+    "Libro VI - Della tutela dei diritti",
+]
+
+ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI", "XII"]
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 24))]
+    return " ".join(words).capitalize() + "."
+
+
+def generate_articles(num_articles: int, seed: int = 0) -> list:
+    """
+    Generate synthetic articles in the format produced by ArticleSplitter.
+
+    Args:
+        num_articles (int): Number of articles to generate.
+        seed (int): Seed of the random generator, so runs are reproducible.
+
+    Returns:
+        list: A list of dictionaries, each with "article_number" and "text".
+    """
+    rng = random.Random(seed)
+    articles = []
+    for number in range(1, num_articles + 1):
+        paragraphs = [" ".join(_sentence(rng) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 4))]
+        articles.append({"article_number": str(number), "text": " ".join(paragraphs)})
+    return articles
+
+
+def generate_pages(num_articles: int, seed: int = 0, lines_per_page: int = 45, line_width: int = 70) -> list:
+    """
+    Generate the pages of a synthetic legal code as they come out of text extraction:
+    publisher headers, page numbers, Libro/Titolo/Capo headings and "Art. N" headings
+    followed by wrapped article text.
+
+    Args:
+        num_articles (int): Number of articles in the code.
+        seed (int): Seed of the random generator, so runs are reproducible.
+        lines_per_page (int): Number of body lines on each page.
+        line_width (int): Maximum number of characters of a wrapped text line.
+
+    Returns:
+        list: The text of each page.
+    """
+    rng = random.Random(seed)
+    body = []
+    articles_per_libro = max(num_articles // len(LIBRI), 1)
+    for article in generate_articles(num_articles, seed):
+        number = int(article["article_number"])
+        if (number - 1) % articles_per_libro == 0 and (number - 1) // articles_per_libro < len(LIBRI):
+            body.append(LIBRI[(number - 1) // articles_per_libro])
+        if number % 40 == 1:
+            body.append(f"TITOLO {rng.choice(ROMAN)} - {_sentence(rng)[:40]}")
+        if number % 10 == 1:
+            body.append(f"Capo {rng.choice(ROMAN)} {_sentence(rng)[:30]}")
+        body.append(f"Art. {number}. {_sentence(rng)[:50]}")
+        line = []
+        for word in article["text"].split():
+            if sum(len(w) + 1 for w in line) + len(word) > line_width:
+                body.append(" ".join(line))
+                line = []
+            line.append(word)
+        if line:
+            body.append(" ".join(line))
+
+    pages = []
+    for page_number, start in enumerate(range(0, len(body), lines_per_page), start=1):
+        lines = ["Altalex eBook", "Collana Codici Altalex", "CODICE CIVILE", ""]
+        lines.extend(body[start:start + lines_per_page])
+        lines.extend(["", str(page_number)])
+        pages.append("\n".join(lines) + "\n")
+    return pages
+
+
+def generate_code_text(num_articles: int, seed: int = 0) -> str:
+    """
+    Generate the full text of a synthetic legal code, as returned by
+    ArticleSplitter.extract_text_from_pdf.
+    """
+    return "".join(page + "\n\n" for page in generate_pages(num_articles, seed))
@@ -0,0 +1,21 @@
+from modules.read_only_index import ReadOnlyIndex
+
+# Serving mode: memory-mapped index and chunk metadata, only the query encoder is loaded.
+# The folder is written once with VectorDB.export_read_only_index("data\\read_only_index").
+read_only_index = ReadOnlyIndex(index_dir="data\\read_only_index", sql_path="data\\sqlite.db")
+
+query = input("Enter your legal query: ")  # Prompt user for a query
+results = read_only_index.query_legal_code(query, top_k=10)
+
+# Collect the unique (law, article number) pairs from the returned chunks.
+unique_articles = {(result["metadata"].get("law_name"), result["metadata"].get("article_number")) for result in results}
+
+# Fetch the full text of all those articles from SQLite in one round trip.
+full_articles = read_only_index.fetch_articles(unique_articles)
+for (law_name, article_number), full_article in full_articles.items():
+    if full_article:
+        print("Article Number:", article_number)
+        print("Full Article Text:", full_article)
+        print("-----")
+    else:
+        print(f"Article with number {article_number} not found.")
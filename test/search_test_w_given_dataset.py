@@ -15,18 +15,12 @@ vector_db.initialize_retriever()
 
 # Now you can perform searches with your saved index without re-indexing the articles
 query = input("Enter your legal query: ")  # Prompt user for a query
-results = vector_db.query_legal_code(query, top_k=10)
-
-# Collect the unique article numbers from the returned chunks.
-unique_article_numbers = {result["metadata"].get("article_number") for result in results}
-
-# Loop over each unique article number and fetch the full article text from SQLite.
-for article_number in unique_article_numbers:
-    # Use the db_path stored in vector_db (ensure this is the correct path to your SQLite file)
-    full_article = vector_db.fetch_article_by_number(vector_db.sql_path, article_number)
-    if full_article:
-        print("Article Number:", article_number)
-        print("Full Article Text:", full_article)
+articles = vector_db.query_articles(query, top_k=10)  # 10 distinct articles, with their full text
+
+for article in articles:
+    if article["text"]:
+        print("Article Number:", article["article_number"])
+        print("Full Article Text:", article["text"])
         print("-----")
     else:
-        print(f"Article with number {article_number} not found.")
\ No newline at end of file
+        print(f"Article with number {article['article_number']} not found.")
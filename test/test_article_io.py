@@ -0,0 +1,27 @@
+import json
+import pytest
+from modules import article_io
+from modules.article_io import iter_json_array
+
+# run with "poetry run python -m pytest test/test_article_io.py"
+
+ELEMENTS = [2.5, -13, 1e3, 7, 0.125, {"article_number": 12, "text": "a, b] [c"}, True, None, "x", [1, 2.75]]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_small_chunks_with_numbers(tmp_path, monkeypatch, chunk_size, indent):
+    monkeypatch.setattr(article_io, "READ_CHUNK_SIZE", chunk_size)
+    path = tmp_path / "elements.json"
+    path.write_text(json.dumps(ELEMENTS, indent=indent), encoding="utf-8")
+    assert list(iter_json_array(str(path))) == ELEMENTS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+@pytest.mark.parametrize("content", ["[2.]", "[1 2]", "[1, 2", "{}"])
+def test_malformed(tmp_path, monkeypatch, chunk_size, content):
+    monkeypatch.setattr(article_io, "READ_CHUNK_SIZE", chunk_size)
+    path = tmp_path / "malformed.json"
+    path.write_text(content, encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_json_array(str(path)))
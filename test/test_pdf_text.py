@@ -0,0 +1,76 @@
+import io
+import PyPDF2
+from modules.pdf_text import extract_page_text
+
+# run with "poetry run python -m pytest test/test_pdf_text.py"
+
+ROWS = 12
+
+
+def make_page(content: str, font: str = "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"):
+    """
+    Build a one-page PDF around a content stream and return its page.
+    """
+    data = content.encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        font.encode("latin-1"),
+        b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream",
+    ]
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return PyPDF2.PdfReader(io.BytesIO(out)).pages[0]
+
+
+def two_columns(offset: float = 0.0) -> str:
+    """
+    A content stream drawing two columns line by line, alternating between them as
+    typesetting software often does; the right column's baselines are offset by offset points.
+    """
+    operations = []
+    for row in range(ROWS):
+        y = 780 - 14 * row
+        operations.append(f"BT /F1 10 Tf 1 0 0 1 50 {y} Tm (Sinistra riga {row} del testo) Tj ET")
+        operations.append(f"BT /F1 10 Tf 1 0 0 1 320 {y - offset} Tm (Destra riga {row} del testo) Tj ET")
+    return "\n".join(operations)
+
+
+def expected_lines() -> list:
+    return [f"Sinistra riga {row} del testo" for row in range(ROWS)] + [f"Destra riga {row} del testo" for row in range(ROWS)]
+
+
+def test_two_columns_aligned_baselines():
+    assert extract_page_text(make_page(two_columns())).splitlines() == expected_lines()
+
+
+def test_two_columns_offset_baselines():
+    assert extract_page_text(make_page(two_columns(offset=7))).splitlines() == expected_lines()
+
+
+def test_two_columns_split_operators():
+    # Each left line is drawn word by word (Tj after Tj, and a kerned TJ array), each right
+    # line with TD / T* line moves inside one text object.
+    font = ("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /FirstChar 32 /LastChar 126 "
+            f"/Widths [{' '.join(['500'] * 95)}] >>")
+    left = [f"BT /F1 10 Tf 50 {780 - 14 * row} Td (Sinistra ) Tj [(riga) -300 ({row})] TJ ( del testo) Tj ET"
+            for row in range(ROWS)]
+    right = ["BT /F1 10 Tf 320 780 Td 14 TL (Destra riga 0 del testo) Tj"]
+    right += [f"T* (Destra riga {row} del testo) Tj" for row in range(1, ROWS)]
+    right.append("ET")
+    page = make_page("\n".join(right + left), font)
+    assert extract_page_text(page).splitlines() == expected_lines()
+
+
+def test_single_column_is_left_to_pypdf2():
+    lines = " ".join(f"(Riga {row} di una sola colonna di testo) Tj T*" for row in range(ROWS))
+    page = make_page(f"BT /F1 10 Tf 14 TL 50 780 Td {lines} ET")
+    assert extract_page_text(page) == page.extract_text()
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+from modules.search_filters import select_vector_ids
+
+# run with "poetry run python -m pytest test/test_search_filters.py"
+
+ARTICLE_NUMBERS = np.array([1, 1200, 2043, 1200, 3000])
+LAW_CODES = np.array([0, 0, 0, 1, -1])
+
+
+def test_libro_selects_the_codice_civile_only():
+    laws = ["Codice Civile", "Codice Penale"]
+    assert select_vector_ids({"libro": "IV"}, ARTICLE_NUMBERS, LAW_CODES, laws).tolist() == [1, 2]
+
+
+def test_libro_without_codice_civile_raises():
+    with pytest.raises(ValueError, match="CODICE_CIVILE_LAW_NAME"):
+        select_vector_ids({"libro": "IV"}, ARTICLE_NUMBERS, LAW_CODES, ["Example Legal Code", "Codice Penale"])
@@ -0,0 +1,78 @@
+import asyncio
+import json
+from modules.metrics import Metrics
+from modules.search_server import SearchServer
+
+# run with "poetry run python -m pytest test/test_search_server.py"
+
+
+class FakeSearcher:
+    """
+    Answers every query with one chunk of article 1, or raises error if given.
+    """
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.metrics = Metrics(enabled=True)
+
+    def query_legal_code_batch(self, queries, top_k):
+        if self.error is not None:
+            raise self.error
+        return [[{"content": query, "metadata": {"law_name": "Codice Civile", "article_number": 1}}] for query in queries]
+
+    def fetch_articles(self, keys):
+        return {key: "Testo dell'articolo" for key in keys}
+
+
+def request(searcher, raw: bytes):
+    """
+    Send a raw HTTP request to a SearchServer around searcher and return the status and
+    JSON payload of its response; the status is None if the connection closed without one.
+    """
+    async def run():
+        server = SearchServer(searcher, max_wait_ms=1)
+        server.batcher.start()
+        listener = await asyncio.start_server(server._handle_connection, "127.0.0.1", 0)
+        try:
+            reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            await server.batcher.stop()
+        if not response:
+            return None, None
+        head, _, body = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(body)
+
+    return asyncio.run(run())
+
+
+def post(searcher, payload: dict):
+    body = json.dumps(payload).encode("utf-8")
+    return request(searcher, b"POST /search HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % len(body) + body)
+
+
+def test_search():
+    status, payload = post(FakeSearcher(), {"query": "danno", "top_k": 3})
+    assert status == 200
+    assert [article["article_number"] for article in payload["articles"]] == [1]
+
+
+def test_invalid_top_k_is_a_bad_request():
+    for top_k in (None, "dieci", [3], 0):
+        status, payload = post(FakeSearcher(), {"query": "danno", "top_k": top_k})
+        assert status == 400, top_k
+        assert "error" in payload
+    status, _ = request(FakeSearcher(), b"GET /search?q=danno&top_k=dieci HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert status == 400
+
+
+def test_failed_search_is_a_server_error():
+    searcher = FakeSearcher(RuntimeError("index not loaded"))
+    status, payload = post(searcher, {"query": "danno"})
+    assert status == 500
+    assert payload == {"error": "search failed"}
+    assert searcher.metrics.snapshot()["counters"]["requests_failed"] == 1
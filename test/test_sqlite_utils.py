@@ -0,0 +1,42 @@
+import sqlite3
+import pytest
+from modules.metrics import Metrics
+from modules.query_cache import LRUCache
+from modules.sqlite_utils import MAX_SQL_PARAMETERS, execute_in_batches, fetch_articles
+
+# run with "poetry run python -m pytest test/test_sqlite_utils.py"
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE articles (id INTEGER PRIMARY KEY, law_name TEXT, article_number INTEGER, text TEXT)")
+    conn.executemany(
+        "INSERT INTO articles (law_name, article_number, text) VALUES (?, ?, ?)",
+        [(law_name, number, f"{law_name} {number}") for law_name in ("civile", "penale") for number in range(1, 1201)]
+    )
+    yield conn
+    conn.close()
+
+
+def test_execute_in_batches_beyond_the_parameter_limit(conn):
+    numbers = list(range(1, 3 * MAX_SQL_PARAMETERS))
+    rows = execute_in_batches(
+        conn, "SELECT article_number FROM articles WHERE law_name = ? AND article_number IN ({placeholders})",
+        numbers, ("penale",)
+    )
+    assert sorted(number for number, in rows) == list(range(1, 1201))
+
+
+def test_fetch_articles_by_law_with_cache(conn):
+    cache = LRUCache(10)
+    keys = [("civile", "52"), ("penale", 52), 7, ("penale", 9999)]
+    texts = fetch_articles(lambda: conn, cache, keys, default_law="civile", metrics=Metrics())
+    assert texts == {("civile", "52"): "civile 52", ("penale", 52): "penale 52", 7: "civile 7", ("penale", 9999): None}
+    texts = fetch_articles(lambda: pytest.fail("cache hits need no connection"), cache, [("penale", "52")], metrics=Metrics())
+    assert texts == {("penale", "52"): "penale 52"}
+
+
+def test_fetch_articles_bare_number_needs_a_law(conn):
+    with pytest.raises(ValueError):
+        fetch_articles(lambda: conn, LRUCache(10), [52], metrics=Metrics())